@@ -0,0 +1,433 @@
+"""
+Filename: collect_uploads.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Host collector for recordings uploaded by the Picos' 'upload_recording'
+    command (see upload2pico/upload.py for the frame layout), so a session
+    is retrieved over the network instead of by pulling microSD cards.
+
+    Files are written to SESSION_DIR/<session>/<pico id>/<filename>. While
+    an upload is in progress the data lives in <filename>.part next to a
+    <filename>.part.json file recording the byte ranges received, so an
+    interrupted upload resumes from the first missing byte. A chunk whose
+    CRC does not match is discarded and shows up as a gap. Once every
+    byte has arrived the partial file is renamed to its final name.
+
+    Usage:
+        # TCP collector; the command goes out through the MQTT broker
+        python collect_uploads.py sessions --tcp 5050 \\
+            --mqtt broker.local:1883 --request forcedata.bin \\
+            --session route7 --transport tcp --advertise 192.168.1.20
+
+        # Uploads over MQTT, resuming from any partial files
+        python collect_uploads.py sessions --mqtt broker.local:8883 --tls \\
+            --user hub --password secret --request forcedata.bin \\
+            --session route7
+
+    MQTT needs the paho-mqtt package; the TCP collector does not.
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+
+# Must match upload2pico/upload.py
+BEGIN_MAGIC = b"OCUB"
+CHUNK_MAGIC = b"OCUC"
+END_MAGIC = b"OCUE"
+_BEGIN_FMT = "<4sI16sIIIBB"
+_BEGIN_SIZE = struct.calcsize(_BEGIN_FMT)
+_CHUNK_FMT = "<4sIIHI"
+_CHUNK_HEADER_SIZE = struct.calcsize(_CHUNK_FMT)
+_END_FMT = "<4sIII"
+_HEAD_BYTES = 512
+
+COMMAND_TOPIC = "pico/all/cmd"
+UPLOAD_TOPIC = "pico/+/upload"
+
+
+def _safe_name(name: str) -> str:
+    """Keeps a name sent by a Pico inside its directory"""
+    name = os.path.basename(name.replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise ValueError(f"invalid name {name!r}")
+    return name
+
+
+def add_range(ranges: list, start: int, end: int) -> list:
+    """Merges [start, end) into a sorted list of disjoint [start, end)
+    ranges"""
+    merged = []
+    for lo, hi in sorted(ranges + [[start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def first_missing(ranges: list) -> int:
+    """First byte not covered by ranges"""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+@dataclass
+class PartialFile:
+    """A file being received, with the byte ranges it holds"""
+    path: str
+    size: int
+    head_crc: int
+    upload_id: int = 0
+    ranges: list = field(default_factory=list)
+
+    @property
+    def part_path(self) -> str:
+        return self.path + ".part"
+
+    @property
+    def state_path(self) -> str:
+        return self.path + ".part.json"
+
+    @property
+    def received(self) -> int:
+        return sum(hi - lo for lo, hi in self.ranges)
+
+    @classmethod
+    def open(cls, path: str, size: int, head_crc: int) -> "PartialFile":
+        """Resumes the partial file at path if it is the same upload (size
+        and head CRC), otherwise starts over"""
+        part = cls(path, size, head_crc)
+        try:
+            with open(part.state_path) as f:
+                state = json.load(f)
+            if (state["size"] == size and state["head_crc"] == head_crc and
+                    os.path.exists(part.part_path)):
+                part.ranges = state["ranges"]
+        except (OSError, ValueError, KeyError):
+            pass
+        if not part.ranges:
+            with open(part.part_path, "wb") as f:
+                f.truncate(size)
+            part.save()
+        return part
+
+    def save(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"size": self.size, "head_crc": self.head_crc,
+                       "ranges": self.ranges}, f)
+        os.replace(tmp, self.state_path)
+
+    def write(self, offset: int, data: bytes):
+        with open(self.part_path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+        self.ranges = add_range(self.ranges, offset, offset + len(data))
+        self.save()
+
+    def complete(self) -> bool:
+        return self.ranges == [[0, self.size]] or self.size == 0
+
+    def finish(self):
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+
+
+class Collector:
+    """Places upload frames from any number of Picos into the session
+    directory. Thread safe, frames may arrive from the TCP handlers and
+    the MQTT client at once"""
+
+    def __init__(self, session_dir: str, verbose: bool = True):
+        self.session_dir = session_dir
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.uploads = {}  # pico id -> PartialFile of its current upload
+        self.completed = []
+        self.crc_errors = 0
+        self.last_frame = time.monotonic()
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(msg, flush=True)
+
+    def file_path(self, session: str, pico_id: str, filename: str) -> str:
+        return os.path.join(self.session_dir,
+                            _safe_name(session or "default"),
+                            _safe_name(pico_id), _safe_name(filename))
+
+    def resume_offset(self, session: str, pico_id: str,
+                      filename: str) -> int:
+        """Where an upload of filename should start (0 when nothing has
+        arrived, the size when it is complete)"""
+        path = self.file_path(session, pico_id, filename)
+        try:
+            with open(path + ".part.json") as f:
+                return first_missing(json.load(f)["ranges"])
+        except (OSError, ValueError, KeyError):
+            pass
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def begin(self, frame: bytes) -> int:
+        """Handles BEGIN; returns the offset the Pico should send from"""
+        (magic, upload_id, pico_id, size, offset, head_crc, session_len,
+         name_len) = struct.unpack_from(_BEGIN_FMT, frame)
+        pos = _BEGIN_SIZE
+        session = frame[pos:pos + session_len].decode()
+        filename = frame[pos + session_len:
+                         pos + session_len + name_len].decode()
+        pico_id = pico_id.rstrip(b"\0").decode()
+        path = self.file_path(session, pico_id, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self.lock:
+            if os.path.exists(path) and not os.path.exists(path + ".part"):
+                with open(path, "rb") as f:
+                    same = (os.path.getsize(path) == size and zlib.crc32(
+                        f.read(_HEAD_BYTES)) == head_crc)
+                if same:
+                    self._log(f"{pico_id}: {path} already complete")
+                    self.uploads.pop(pico_id, None)
+                    return size
+            part = PartialFile.open(path, size, head_crc)
+            part.upload_id = upload_id
+            self.uploads[pico_id] = part
+            resume = first_missing(part.ranges)
+        self._log(f"{pico_id}: receiving {path} ({size} bytes, "
+                  f"{resume} held, sending from {offset})")
+        return resume
+
+    def chunk(self, pico_id: str, frame: bytes) -> bool:
+        """Stores a CHUNK; returns False if it was rejected"""
+        magic, upload_id, offset, n, crc = struct.unpack_from(_CHUNK_FMT,
+                                                              frame)
+        data = frame[_CHUNK_HEADER_SIZE:_CHUNK_HEADER_SIZE + n]
+        with self.lock:
+            part = self.uploads.get(pico_id)
+            if part is None or part.upload_id != upload_id:
+                return False  # no BEGIN seen for this upload
+            if (len(data) != n or offset + n > part.size or
+                    crc != zlib.crc32(data, zlib.crc32(frame[:14]))):
+                self.crc_errors += 1
+                self._log(f"{pico_id}: bad chunk at {offset}, discarded")
+                return False
+            part.write(offset, data)
+        return True
+
+    def end(self, pico_id: str, frame: bytes) -> int:
+        """Handles END; returns the bytes held for the upload"""
+        magic, upload_id, size, chunks = struct.unpack_from(_END_FMT, frame)
+        with self.lock:
+            part = self.uploads.get(pico_id)
+            if part is None or part.upload_id != upload_id:
+                return size if part is None else 0
+            del self.uploads[pico_id]
+            received = part.received
+            if part.complete():
+                part.finish()
+                self.completed.append(part.path)
+                self._log(f"{pico_id}: {part.path} complete")
+            else:
+                self._log(f"{pico_id}: {part.path} incomplete, "
+                          f"{received} of {size} bytes, resume from "
+                          f"{first_missing(part.ranges)}")
+        return received
+
+    def handle(self, pico_id: str, frame: bytes):
+        """Dispatches one frame. Returns the reply for BEGIN and END
+        frames, None otherwise"""
+        self.last_frame = time.monotonic()
+        magic = frame[:4]
+        if magic == BEGIN_MAGIC:
+            return self.begin(frame)
+        if magic == CHUNK_MAGIC:
+            self.chunk(pico_id, frame)
+        elif magic == END_MAGIC:
+            return self.end(pico_id, frame)
+        return None
+
+
+def _read_exact(sock, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        data = sock.recv(n - len(buf))
+        if not data:
+            raise ConnectionError("connection closed")
+        buf += data
+    return bytes(buf)
+
+
+def serve_tcp(collector: Collector, host: str, port: int):
+    """Starts the TCP collector in a background thread; returns the
+    server"""
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            sock = self.request
+            pico_id = None
+            try:
+                while True:
+                    n, = struct.unpack("<H", _read_exact(sock, 2))
+                    frame = _read_exact(sock, n)
+                    if frame[:4] == BEGIN_MAGIC:
+                        pico_id = frame[8:24].rstrip(b"\0").decode()
+                    if pico_id is None:
+                        return
+                    reply = collector.handle(pico_id, frame)
+                    if reply is not None:
+                        sock.sendall(struct.pack("<I", reply))
+            except (ConnectionError, struct.error, ValueError) as e:
+                if pico_id is not None:
+                    collector._log(f"{pico_id}: connection ended ({e})")
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def mqtt_client(broker: str, user=None, password=None, tls=False,
+                client_id="omniclimb-collector"):
+    """Connected paho-mqtt client for a broker given as host[:port]"""
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise SystemExit("MQTT needs the paho-mqtt package "
+                         "(pip install paho-mqtt)")
+    host, _, port = broker.partition(":")
+    port = int(port or (8883 if tls else 1883))
+    if hasattr(mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                             client_id=client_id)
+    else:
+        client = mqtt.Client(client_id=client_id)
+    if user:
+        client.username_pw_set(user, password)
+    if tls:
+        client.tls_set()
+    client.connect(host, port)
+    return client
+
+
+def collect_mqtt(collector: Collector, client):
+    """Feeds upload frames published on pico/<id>/upload to collector"""
+
+    def on_message(client, userdata, msg):
+        pico_id = msg.topic.split("/")[1]
+        try:
+            collector.handle(pico_id, msg.payload)
+        except (struct.error, ValueError) as e:
+            collector._log(f"{pico_id}: bad upload frame ({e})")
+
+    def on_connect(client, *args):
+        client.subscribe(UPLOAD_TOPIC, qos=1)
+
+    client.on_message = on_message
+    client.on_connect = on_connect
+
+
+def request_command(collector: Collector, args) -> dict:
+    """Builds the upload_recording command. Over MQTT it carries the
+    resume offset of every Pico with a partial file in the session"""
+    command = {"command": "upload_recording", "filename": args.request,
+               "session": args.session, "transport": args.transport,
+               "rate": args.rate}
+    if args.transport == "tcp":
+        command["host"] = args.advertise
+        command["port"] = args.tcp
+    else:
+        offsets = {}
+        session_path = os.path.join(args.session_dir,
+                                    _safe_name(args.session))
+        if os.path.isdir(session_path):
+            for pico_id in sorted(os.listdir(session_path)):
+                offset = collector.resume_offset(args.session, pico_id,
+                                                 args.request)
+                if offset:
+                    offsets[pico_id] = offset
+        command["offsets"] = offsets
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Collect recordings uploaded by the OmniClimb Picos.")
+    parser.add_argument("session_dir", help="directory for the sessions")
+    parser.add_argument("--tcp", type=int, metavar="PORT",
+                        help="accept TCP uploads on this port")
+    parser.add_argument("--bind", default="0.0.0.0",
+                        help="TCP address to listen on")
+    parser.add_argument("--mqtt", metavar="HOST[:PORT]",
+                        help="MQTT broker for commands and MQTT uploads")
+    parser.add_argument("--user", help="MQTT user name")
+    parser.add_argument("--password", help="MQTT password")
+    parser.add_argument("--tls", action="store_true",
+                        help="connect to the broker over TLS")
+    parser.add_argument("--request", metavar="FILENAME",
+                        help="send upload_recording for this file on /sd")
+    parser.add_argument("--session", default="default",
+                        help="session name (subdirectory)")
+    parser.add_argument("--transport", choices=("mqtt", "tcp"),
+                        default="mqtt", help="how the Picos upload")
+    parser.add_argument("--advertise",
+                        help="collector address the Picos connect to "
+                             "(TCP transport)")
+    parser.add_argument("--rate", type=int, default=16384,
+                        help="upload rate per Pico in bytes per second")
+    parser.add_argument("--idle", type=float, default=0,
+                        help="exit after this many seconds without upload "
+                             "traffic (0 = run until Ctrl+C)")
+    args = parser.parse_args()
+
+    if not args.tcp and not args.mqtt:
+        parser.error("give --tcp, --mqtt or both")
+    if args.request and not args.mqtt:
+        parser.error("--request sends the command over MQTT, give --mqtt")
+    if args.request and args.transport == "tcp" and not (
+            args.tcp and args.advertise):
+        parser.error("--transport tcp needs --tcp and --advertise")
+
+    collector = Collector(args.session_dir)
+    os.makedirs(args.session_dir, exist_ok=True)
+    if args.tcp:
+        serve_tcp(collector, args.bind, args.tcp)
+        print(f"TCP collector on {args.bind}:{args.tcp}")
+
+    client = None
+    if args.mqtt:
+        client = mqtt_client(args.mqtt, args.user, args.password, args.tls)
+        collect_mqtt(collector, client)
+        client.loop_start()
+        if args.request:
+            time.sleep(1)  # let the upload subscription settle
+            command = request_command(collector, args)
+            client.publish(COMMAND_TOPIC, json.dumps(command), qos=1)
+            print(f"Requested {args.request} for session {args.session}")
+
+    try:
+        while not args.idle or (time.monotonic() - collector.last_frame <
+                                args.idle):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if client is not None:
+            client.loop_stop()
+            client.disconnect()
+    print(f"{len(collector.completed)} file(s) complete, "
+          f"{len(collector.uploads)} in progress, "
+          f"{collector.crc_errors} bad chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+"""
+Filename: decode_recording.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Host-side decoder for binary OmniClimb recordings written by
+    upload2pico/main.py (see upload2pico/recformat.py for the layout).
+
+    Usage:
+        python decode_recording.py forcedata.bin          # -> forcedata.csv
+        python decode_recording.py forcedata.bin -o out.csv
+        python decode_recording.py forcedata.bin --npy out.npy
+
+        python decode_recording.py forcedata.bin --epoch  # + epoch_ms
+
+    The returned/exported table has one row per sample: the Pico ticks_ms
+    timestamp (unwrapped) followed by one column per ADC channel. From
+    version 4 every chunk carries a (ticks, epoch ms) anchor; epoch_ms()
+    maps the timestamps of a synchronized recording to Unix epoch ms, the
+    common time axis of all holds. From version 5 the frames may be
+    delta/varint coded (upload2pico/framecodec.py) and from version 6 they
+    are compact 16-bit frames with one base timestamp each;
+    decode_frames() turns either into rows for all chunks at once.
+"""
+
+import argparse
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"OCLB"
+
+# Must match upload2pico/recformat.py. Version 1 headers end after the
+# Pico ID; version 2 adds the count of valid data bytes, version 3 the
+# recording ID, version 5 the frame encoding and version 6 the frame
+# layout
+_HEADER_FMT = "<4sBBHHHB1s16s"
+_HEADER_SIZE = struct.calcsize(_HEADER_FMT)
+_HEADER_V2_FMT = "<I"
+_HEADER_V3_FMT = "<I"
+_HEADER_V5_FMT = "<B"
+_HEADER_V6_FMT = "<B"
+
+ENCODING_RAW = 0
+ENCODING_DELTA = 1
+LAYOUT_ROWS = 0
+LAYOUT_COMPACT = 1
+LAYOUT_COMPACT_GRID = 2
+
+# Version 3 files are sector aligned: header in sector 0, CRC-checked
+# chunks from sector 1 and a checkpointed footer in the last sector.
+# Version 4 chunk headers add the time anchor before the CRC
+SECTOR = 512
+CHUNK_MAGIC = b"OCCK"
+_CHUNK_FMT = "<4sIIHHI"
+_CHUNK_V4_FMT = "<4sIIHHIqI"
+FOOTER_MAGIC = b"OCFT"
+_FOOTER_FMT = "<4sIIIIII"
+_FOOTER_CRC_OFFSET = 24
+
+# MicroPython ticks_ms() wraps at 2**30
+TICKS_PERIOD = 1 << 30
+
+# Sizes of the MicroPython array typecodes on the RP2040
+_TYPECODES = {
+    "h": np.dtype("<i2"),
+    "H": np.dtype("<u2"),
+    "i": np.dtype("<i4"),
+    "l": np.dtype("<i4"),
+    "I": np.dtype("<u4"),
+    "L": np.dtype("<u4"),
+}
+
+
+def read_header(f) -> dict:
+    """Reads the file header of a binary recording
+
+    Args:
+        f: A binary file object positioned at the start of the recording
+
+    Returns:
+        A dictionary describing the recording
+    """
+    raw = f.read(_HEADER_SIZE)
+    if len(raw) < _HEADER_SIZE:
+        raise ValueError("file too short for a recording header")
+    (magic, version, n_channels, header_size, sample_interval_ms,
+     samples_per_frame, gain, typecode, pico_id) = struct.unpack(_HEADER_FMT,
+                                                                 raw)
+    if magic != MAGIC:
+        raise ValueError("not an OmniClimb binary recording "
+                         f"(magic {magic!r})")
+    data_bytes = 0
+    recording_id = None
+    encoding = ENCODING_RAW
+    layout = LAYOUT_ROWS
+    if version >= 2:
+        data_bytes, = struct.unpack(_HEADER_V2_FMT,
+                                    f.read(struct.calcsize(_HEADER_V2_FMT)))
+    if version >= 3:
+        recording_id, = struct.unpack(_HEADER_V3_FMT,
+                                      f.read(struct.calcsize(_HEADER_V3_FMT)))
+    if version >= 5:
+        encoding, = struct.unpack(_HEADER_V5_FMT,
+                                  f.read(struct.calcsize(_HEADER_V5_FMT)))
+    if version >= 6:
+        layout, = struct.unpack(_HEADER_V6_FMT,
+                                f.read(struct.calcsize(_HEADER_V6_FMT)))
+    channel_map = f.read(n_channels)
+    # Skip any fields added by later header versions
+    f.seek(header_size)
+    return {
+        "version": version,
+        "channels": n_channels,
+        "header_size": header_size,
+        "sample_interval_ms": sample_interval_ms,
+        "samples_per_frame": samples_per_frame,
+        "gain": gain,
+        "typecode": typecode.decode(),
+        "pico_id": pico_id.rstrip(b"\0").decode(),
+        "channel_map": list(channel_map),
+        "data_bytes": data_bytes,
+        "recording_id": recording_id,
+        "encoding": encoding,
+        "layout": layout,
+    }
+
+
+def unwrap_ticks(ticks: np.ndarray) -> np.ndarray:
+    """Removes the ticks_ms() wrap-around from a timestamp column
+
+    Args:
+        ticks: Raw ticks_ms() values in recording order
+
+    Returns:
+        Monotonic timestamps in ms relative to the same origin as ticks[0]
+    """
+    ticks = ticks.astype(np.int64)
+    if ticks.size < 2:
+        return ticks
+    steps = np.diff(ticks) % TICKS_PERIOD
+    return np.concatenate(([ticks[0]], ticks[0] + np.cumsum(steps)))
+
+
+def read_footer(raw: bytes, recording_id: int):
+    """Parses the checkpoint footer from the last sector of a recording
+
+    Args:
+        raw: The file contents
+        recording_id: ID from the file header
+
+    Returns:
+        A dictionary with the footer fields, or None when the last sector
+        does not hold a valid footer of this recording
+    """
+    if len(raw) < 2 * SECTOR or len(raw) % SECTOR:
+        return None
+    sector = raw[-SECTOR:]
+    (magic, rec_id, chunks, samples, next_sector, closed,
+     crc) = struct.unpack_from(_FOOTER_FMT, sector)
+    if (magic != FOOTER_MAGIC or rec_id != recording_id
+            or crc != zlib.crc32(sector[:_FOOTER_CRC_OFFSET])):
+        return None
+    return {
+        "chunks": chunks,
+        "samples": samples,
+        "next_sector": next_sector,
+        "closed": bool(closed),
+    }
+
+
+def iter_chunks(raw, recording_id: int, version: int = 3):
+    """Yields the valid chunks of a version 3 or later recording in order
+
+    Chunks are read from sector 1 until one does not carry the chunk
+    magic, this recording's ID, the next sequence number or a matching
+    CRC. That is where the recording ended, cleanly or not. raw may be an
+    mmap, so a long recording is read one chunk at a time.
+
+    Args:
+        raw: The file contents
+        recording_id: ID from the file header
+        version: Format version from the file header
+
+    Yields:
+        (payload, anchor, samples) with the chunk's frame bytes, its
+        (ticks, epoch ms) anchor ((0, 0) for version 3) and the number
+        of samples it holds
+    """
+    fmt = _CHUNK_V4_FMT if version >= 4 else _CHUNK_FMT
+    header_size = struct.calcsize(fmt)
+    pos = SECTOR
+    sequence = 0
+    # The last sector holds the footer, never a chunk
+    end = len(raw) - SECTOR
+    while pos + header_size <= end:
+        fields = struct.unpack_from(fmt, raw, pos)
+        magic, rec_id, seq, nbytes = fields[:4]
+        crc = fields[-1]
+        if magic != CHUNK_MAGIC or rec_id != recording_id or seq != sequence:
+            return
+        start = pos + header_size
+        payload = raw[start:start + nbytes]
+        if (len(payload) < nbytes or crc != zlib.crc32(
+                payload, zlib.crc32(raw[pos:pos + header_size - 4]))):
+            return
+        yield payload, (fields[5:7] if version >= 4 else (0, 0)), fields[4]
+        sequence += 1
+        pos += -(-(header_size + nbytes) // SECTOR) * SECTOR
+
+
+def read_chunks(raw: bytes, recording_id: int, version: int = 3) -> tuple:
+    """Collects the payloads of the valid chunks of a version 3 or later
+    recording (see iter_chunks)
+
+    Args:
+        raw: The file contents
+        recording_id: ID from the file header
+        version: Format version from the file header
+
+    Returns:
+        (payloads, samples, anchors) with the frame bytes of each valid
+        chunk, the samples in each and an int64 array of their (ticks,
+        epoch ms) anchors, shape (chunks, 2); zeros for version 3
+    """
+    parts = []
+    samples = []
+    anchors = []
+    for payload, anchor, n in iter_chunks(raw, recording_id, version):
+        parts.append(payload)
+        samples.append(n)
+        anchors.append(anchor)
+    anchors = np.array(anchors, dtype=np.int64).reshape(-1, 2)
+    return parts, samples, anchors
+
+
+def _varints(payloads: list) -> np.ndarray:
+    # The zigzag varints of framecodec.py in the joined payloads, as int64
+    data = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+    last = data < 0x80
+    if not len(data) or not last[-1]:
+        raise ValueError("corrupt delta-encoded frame")
+    ends = np.flatnonzero(last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Varint each byte belongs to, and the byte's place within it
+    item = np.concatenate(([0], np.cumsum(last[:-1])))
+    shift = 7 * (np.arange(len(data)) - starts[item])
+    zigzag = np.add.reduceat((data & 0x7F).astype(np.int64) << shift,
+                             starts)
+    return (zigzag >> 1) ^ -(zigzag & 1)
+
+
+def _chunk_cumsum(values: np.ndarray, samples: np.ndarray) -> np.ndarray:
+    # Cumulative sum down the rows, restarting at each chunk's first row
+    first = np.cumsum(samples) - samples
+    total = np.cumsum(values, axis=0)
+    total -= np.repeat(total[first] - values[first], samples, axis=0)
+    return total
+
+
+def _sample_steps(samples: np.ndarray) -> np.ndarray:
+    # True for every row but the first of its chunk
+    steps = np.ones(int(samples.sum()), dtype=bool)
+    steps[np.cumsum(samples) - samples] = False
+    return steps
+
+
+def _rows_raw(payloads: list, samples: np.ndarray,
+              header: dict) -> np.ndarray:
+    dtype = _TYPECODES[header["typecode"]]
+    return np.frombuffer(b"".join(payloads), dtype=dtype).reshape(
+        -1, 1 + header["channels"]).astype(np.int64)
+
+
+def _rows_delta(payloads: list, samples: np.ndarray,
+                header: dict) -> np.ndarray:
+    # Version 5: the rows, timestamp first, each item coded against the
+    # one above it and the timestamps against the sample interval
+    columns = 1 + header["channels"]
+    values = _varints(payloads)
+    if len(values) != samples.sum() * columns:
+        raise ValueError("corrupt delta-encoded frame")
+    values = values.reshape(-1, columns)
+    values[_sample_steps(samples), 0] += header["sample_interval_ms"]
+    data = _chunk_cumsum(values, samples)
+    data[:, 0] %= TICKS_PERIOD
+    return data
+
+
+def _split_compact(items: np.ndarray, samples: np.ndarray, channels: int,
+                   base_items: int, offsets: bool) -> tuple:
+    # (index of each chunk's first item, mask of the tick offsets, mask
+    # of the values) in the items of consecutive compact frames
+    counts = base_items + samples * (channels + offsets)
+    if len(items) != counts.sum():
+        raise ValueError("corrupt compact frame")
+    first = np.cumsum(counts) - counts
+    place = np.arange(len(items)) - np.repeat(first, counts)
+    values_at = np.repeat(base_items + samples * offsets, counts)
+    return (first, (place >= base_items) & (place < values_at),
+            place >= values_at)
+
+
+def _compact_rows(base: np.ndarray, ticks: np.ndarray, values: np.ndarray,
+                  samples: np.ndarray, header: dict) -> np.ndarray:
+    # Rows of (ticks, values) from compact frames. ticks holds the tick
+    # offsets, or None for LAYOUT_COMPACT_GRID
+    if ticks is None:
+        first = np.cumsum(samples) - samples
+        ticks = ((np.arange(int(samples.sum())) - np.repeat(first, samples))
+                 * header["sample_interval_ms"])
+    ticks = (np.repeat(base, samples) + ticks) % TICKS_PERIOD
+    return np.column_stack((ticks, values.reshape(-1, header["channels"])))
+
+
+def _compact_raw(payloads: list, samples: np.ndarray,
+                 header: dict) -> np.ndarray:
+    # Version 6: the 'h' items of the frame, base ticks as two halves
+    items = np.frombuffer(b"".join(payloads), dtype="<u2").astype(np.int64)
+    offsets = header["layout"] == LAYOUT_COMPACT
+    first, at_offsets, at_values = _split_compact(
+        items, samples, header["channels"], 2, offsets)
+    base = items[first] | items[first + 1] << 16
+    values = items[at_values]
+    values -= (values & 0x8000) << 1
+    return _compact_rows(base, items[at_offsets] if offsets else None,
+                         values, samples, header)
+
+
+def _compact_delta(payloads: list, samples: np.ndarray,
+                   header: dict) -> np.ndarray:
+    # Version 6: the base ticks, the tick offsets against the sample
+    # interval and the values against the sample before
+    items = _varints(payloads)
+    offsets = header["layout"] == LAYOUT_COMPACT
+    first, at_offsets, at_values = _split_compact(
+        items, samples, header["channels"], 1, offsets)
+    values = _chunk_cumsum(items[at_values].reshape(-1, header["channels"]),
+                           samples)
+    ticks = None
+    if offsets:
+        ticks = items[at_offsets]
+        ticks[_sample_steps(samples)] += header["sample_interval_ms"]
+        ticks = _chunk_cumsum(ticks, samples)
+    return _compact_rows(items[first], ticks, values, samples, header)
+
+
+def decode_frames(payloads: list, samples: list, header: dict) -> np.ndarray:
+    """Decodes the chunk payloads of a version 3 or later recording
+
+    Handles both frame layouts, the 'i' rows up to version 5 and the
+    compact 'h' frames of version 6. With ENCODING_DELTA a chunk whose
+    payload is exactly the size of the raw frame was stored raw (see
+    upload2pico/framecodec.py); all other chunks are decoded together.
+
+    Args:
+        payloads: Frame bytes of each chunk, in recording order
+        samples: Samples in each chunk
+        header: Header returned by read_header
+
+    Returns:
+        An int64 array of shape (samples, 1 + channels) with the ticks_ms
+        timestamp (as recorded, wrapping) and ADC columns
+    """
+    channels = header["channels"]
+    encoding = header.get("encoding", ENCODING_RAW)
+    layout = header.get("layout", LAYOUT_ROWS)
+    if encoding not in (ENCODING_RAW, ENCODING_DELTA):
+        raise ValueError(f"unknown frame encoding {encoding}")
+    samples = np.asarray(samples, dtype=np.int64).reshape(-1)
+    if layout == LAYOUT_ROWS:
+        raw_bytes = samples * (1 + channels) * (
+            _TYPECODES[header["typecode"]].itemsize)
+        decoders = (_rows_raw, _rows_delta)
+    elif layout in (LAYOUT_COMPACT, LAYOUT_COMPACT_GRID):
+        offsets = layout == LAYOUT_COMPACT
+        raw_bytes = 2 * (2 + samples * (channels + offsets))
+        decoders = (_compact_raw, _compact_delta)
+    else:
+        raise ValueError(f"unknown frame layout {layout}")
+    raw = np.array([len(p) for p in payloads], dtype=np.int64) == raw_bytes
+    if encoding == ENCODING_RAW:
+        raw[:] = True
+    data = np.empty((int(samples.sum()), 1 + channels), dtype=np.int64)
+    raw_rows = np.repeat(raw, samples)
+    for chunks, rows, decode in ((raw, raw_rows, decoders[0]),
+                                 (~raw, ~raw_rows, decoders[1])):
+        if chunks.any():
+            data[rows] = decode([p for p, c in zip(payloads, chunks) if c],
+                                samples[chunks], header)
+    return data
+
+
+def read_recording(path: str) -> tuple:
+    """Decodes a binary recording into a NumPy table
+
+    Args:
+        path: Path of the recording file copied from the SD card
+
+    Returns:
+        (header, data) where data is an int64 array of shape
+        (samples, 1 + channels) holding the timestamp and ADC columns.
+        For version 3 files header also holds "chunks" (valid chunks
+        found), "anchors" (see read_chunks) and "footer" (see
+        read_footer)
+    """
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if header["version"] >= 3:
+            f.seek(0)
+            raw = f.read()
+            payloads, samples, header["anchors"] = read_chunks(
+                raw, header["recording_id"], header["version"])
+            header["chunks"] = len(payloads)
+            header["footer"] = read_footer(raw, header["recording_id"])
+            data = decode_frames(payloads, samples, header)
+            data[:, 0] = unwrap_ticks(data[:, 0])
+            return header, data
+        # Version 2 streamed recordings are preallocated; only data_bytes
+        # are valid
+        payload = f.read(header["data_bytes"] or -1)
+
+    dtype = _TYPECODES[header["typecode"]]
+    columns = 1 + header["channels"]
+    frame_items = header["samples_per_frame"] * columns
+
+    # A recording cut short (power loss, card pulled) may end in a partial
+    # frame; only whole frames are decoded
+    items = np.frombuffer(payload, dtype=dtype,
+                          count=len(payload) // dtype.itemsize)
+    items = items[:len(items) - len(items) % frame_items]
+
+    data = items.reshape(-1, columns).astype(np.int64)
+    data[:, 0] = unwrap_ticks(data[:, 0])
+    return header, data
+
+
+def epoch_ms(header: dict, data: np.ndarray):
+    """Maps the unwrapped timestamps of a recording to Unix epoch ms
+
+    Each frame's samples are placed relative to the anchor of the chunk
+    that holds it, so a resync of the Pico's time base between frames is
+    followed.
+
+    Args:
+        header: Header returned by read_recording
+        data: Table returned by read_recording
+
+    Returns:
+        An int64 array with one epoch time per row, or None when the
+        recording has no anchors (before version 4, or the Pico had no
+        time base)
+    """
+    anchors = header.get("anchors")
+    per_frame = header["samples_per_frame"]
+    frames = len(data) // per_frame
+    if anchors is None or len(anchors) < frames:
+        return None
+    anchors = anchors[:frames]
+    if not frames or not anchors[:, 1].all():
+        return None
+    start = data[::per_frame, 0][:frames]
+    # Anchor ticks relative to the frame's first sample, across the wrap
+    delta = ((anchors[:, 0] - start + TICKS_PERIOD // 2) % TICKS_PERIOD
+             - TICKS_PERIOD // 2)
+    offsets = anchors[:, 1] - (start + delta)
+    return data[:, 0] + np.repeat(offsets, per_frame)
+
+
+def to_csv(path: str, out_path: str, with_epoch: bool = False) -> int:
+    """Exports a binary recording to CSV
+
+    Args:
+        path: Path of the binary recording
+        out_path: Path of the CSV file to write
+        with_epoch: Add an epoch_ms column (see epoch_ms)
+
+    Returns:
+        The number of samples written
+    """
+    header, data = read_recording(path)
+    footer = header.get("footer")
+    if footer is not None and not footer["closed"]:
+        print(f"{path}: recording was not closed cleanly; "
+              f"{header['chunks']} chunks recovered "
+              f"({footer['chunks']} at the last checkpoint)")
+    names = ["timestamp_ms"] + [f"ain{c}" for c in header["channel_map"]]
+    if with_epoch:
+        data = with_epoch_column(path, header, data)
+        names.insert(1, "epoch_ms")
+    np.savetxt(out_path, data, fmt="%d", delimiter=",",
+               header=",".join(names), comments="")
+    return len(data)
+
+
+def with_epoch_column(path: str, header: dict,
+                      data: np.ndarray) -> np.ndarray:
+    """Inserts the epoch_ms column after the timestamp"""
+    epoch = epoch_ms(header, data)
+    if epoch is None:
+        raise SystemExit(f"{path}: no time anchors, cannot add epoch_ms")
+    return np.insert(data, 1, epoch, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Decode an OmniClimb binary recording.")
+    parser.add_argument("recording", help="binary recording from /sd")
+    parser.add_argument("-o", "--csv", help="CSV output path")
+    parser.add_argument("--npy", help="NumPy .npy output path")
+    parser.add_argument("--epoch", action="store_true",
+                        help="add an epoch_ms column after the timestamp")
+    args = parser.parse_args()
+
+    if args.npy:
+        header, data = read_recording(args.recording)
+        if args.epoch:
+            data = with_epoch_column(args.recording, header, data)
+        np.save(args.npy, data)
+        print(f"Wrote {len(data)} samples to {args.npy}")
+    if args.csv or not args.npy:
+        out_path = args.csv or os.path.splitext(args.recording)[0] + ".csv"
+        n = to_csv(args.recording, out_path, args.epoch)
+        print(f"Wrote {n} samples to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Filename: fsr_calibration.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Vectorized force calibration for the Tekscan A301-100 and A401-100
+    FSRs, the host-side counterpart of data-collection/fsr.py.
+
+    fsr.py converts one sample at a time:
+        Rfs = rf * (vref / vout)            resistance in ohms
+        F   = k * Rfs ** exponent           force in pounds
+    This module applies the same formulas to whole NumPy columns, so a
+    recording of millions of rows is converted in a single pass and the
+    results match the scalar methods (force2, ohm) to float64 rounding.
+
+    Calibration constants are versioned per sensor model. A new
+    characterization adds a new (model, version) entry to CALIBRATIONS
+    instead of editing an existing one, so older sessions can still be
+    reprocessed with the constants they were recorded under.
+
+    Usage:
+        python fsr_calibration.py forcedata.bin --vref ain0 \\
+            --sensor ain1=a301 --sensor ain2=a401      # -> forcedata_force.csv
+        python fsr_calibration.py forcedata.bin --vref ain0 \\
+            --sensor ain1=a301:1 -o out.csv
+
+    Zero output counts (no current through the FSR) map to an infinite
+    resistance and zero force instead of raising like the scalar methods.
+"""
+
+import argparse
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+import decode_recording
+
+
+@dataclass(frozen=True)
+class FsrCalibration:
+    model: str
+    version: int
+    rf: float           # feedback resistance in ohms
+    k: float            # force curve constant
+    exponent: float     # force curve exponent
+    bits: int = 12      # ADC bit resolution of the characterization
+    vfull: float = 3.3  # ADC full scale in volts
+
+    @property
+    def adc_scale(self) -> float:
+        """Volts per ADC count, as fsr.py's adc_scale"""
+        return self.vfull / (1 << self.bits)
+
+
+# (model, version) -> constants. Version 1 holds the values in fsr.py
+CALIBRATIONS = {
+    ("a301", 1): FsrCalibration("a301", 1, rf=1.302e6, k=2520438,
+                                exponent=-1.128),
+    ("a401", 1): FsrCalibration("a401", 1, rf=493e3, k=154875,
+                                exponent=-0.8125),
+}
+
+
+def get_calibration(model: str, version: int = None) -> FsrCalibration:
+    """Looks up the calibration of a sensor model
+
+    Args:
+        model: Sensor model, e.g. "a301"
+        version: Calibration version, or None for the latest
+
+    Returns:
+        The matching FsrCalibration
+    """
+    model = model.lower()
+    versions = [v for (m, v) in CALIBRATIONS if m == model]
+    if not versions:
+        raise KeyError(f"no calibration for sensor model {model!r}")
+    if version is None:
+        version = max(versions)
+    try:
+        return CALIBRATIONS[(model, version)]
+    except KeyError:
+        raise KeyError(f"no calibration version {version} for {model!r}, "
+                       f"have {sorted(versions)}") from None
+
+
+def ohm(cal: FsrCalibration, vref, vout) -> np.ndarray:
+    """Calculates the resistance (ohms) of an FSR for every sample
+
+    Args:
+        cal: Calibration of the sensor
+        vref: Raw ADC counts of the reference voltage (array or scalar)
+        vout: Raw ADC counts of the output voltage, same shape as vref
+
+    Returns:
+        float64 array of resistances, inf where vout is 0
+    """
+    with np.errstate(divide="ignore"):
+        # rf * (vref / vout), evaluated in the same order as fsr.py
+        rfs = np.asarray(vref, dtype=np.float64) / np.asarray(vout)
+    return np.multiply(cal.rf, rfs, out=rfs)
+
+
+# k * Rfs ** exponent, overwriting the float64 array of resistances
+def _force_in_place(cal, f):
+    with np.errstate(divide="ignore"):
+        np.power(f, cal.exponent, out=f)
+    return np.multiply(cal.k, f, out=f)
+
+
+def force_from_ohm(cal: FsrCalibration, rfs) -> np.ndarray:
+    """Calculates the force (lbs) of an FSR from its resistance
+
+    Args:
+        cal: Calibration of the sensor
+        rfs: Resistances in ohms
+
+    Returns:
+        float64 array of forces in pounds
+    """
+    return _force_in_place(cal, np.array(rfs, dtype=np.float64))
+
+
+def force(cal: FsrCalibration, vref, vout) -> np.ndarray:
+    """Calculates the force (lbs) of an FSR from raw ADC counts
+
+    Equivalent to fsr.<model>().force2(vref, vout) for every sample, with
+    a single float64 temporary for the whole column.
+
+    Args:
+        cal: Calibration of the sensor
+        vref: Raw ADC counts of the reference voltage
+        vout: Raw ADC counts of the output voltage
+
+    Returns:
+        float64 array of forces in pounds, 0 where vout is 0
+    """
+    return _force_in_place(cal, ohm(cal, vref, vout))
+
+
+def convert_recording(header: dict, data: np.ndarray, vref: str,
+                      sensors: dict) -> tuple:
+    """Converts the ADC columns of a decoded recording to force
+
+    Args:
+        header: Header returned by decode_recording.read_recording
+        data: Table returned by decode_recording.read_recording
+        vref: Column holding the reference voltage, e.g. "ain0"
+        sensors: Column name -> FsrCalibration, e.g. {"ain1": a301}
+
+    Returns:
+        (names, table) where table is float64 with the timestamp column
+        followed by one force column per sensor
+    """
+    columns = {f"ain{c}": i + 1 for i, c in enumerate(header["channel_map"])}
+    for name in [vref, *sensors]:
+        if name not in columns:
+            raise KeyError(f"recording has no column {name!r}, "
+                           f"have {sorted(columns)}")
+
+    table = np.empty((len(data), 1 + len(sensors)), dtype=np.float64)
+    table[:, 0] = data[:, 0]
+    names = ["timestamp_ms"]
+    ref = data[:, columns[vref]]
+    for i, (name, cal) in enumerate(sensors.items()):
+        table[:, i + 1] = force(cal, ref, data[:, columns[name]])
+        names.append(f"{name}_{cal.model}_lbs")
+    return names, table
+
+
+def _parse_sensor(spec: str) -> tuple:
+    # "ain1=a301" or "ain1=a301:2"
+    column, _, model = spec.partition("=")
+    model, _, version = model.partition(":")
+    if not column or not model:
+        raise argparse.ArgumentTypeError(f"expected COLUMN=MODEL[:VERSION], "
+                                         f"got {spec!r}")
+    try:
+        return column, get_calibration(model,
+                                       int(version) if version else None)
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(e.args[0]) from None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert an OmniClimb binary recording to FSR force.")
+    parser.add_argument("recording", help="binary recording from /sd")
+    parser.add_argument("--vref", required=True,
+                        help="column holding the reference voltage, e.g. ain0")
+    parser.add_argument("--sensor", action="append", required=True,
+                        type=_parse_sensor, metavar="COLUMN=MODEL[:VERSION]",
+                        help="FSR column and its calibration, e.g. ain1=a301")
+    parser.add_argument("-o", "--csv", help="CSV output path")
+    args = parser.parse_args()
+
+    header, data = decode_recording.read_recording(args.recording)
+    names, table = convert_recording(header, data, args.vref,
+                                     dict(args.sensor))
+    out_path = (args.csv or
+                os.path.splitext(args.recording)[0] + "_force.csv")
+    np.savetxt(out_path, table, fmt=["%d"] + ["%.6g"] * (len(names) - 1),
+               delimiter=",", header=",".join(names), comments="")
+    print(f"Wrote {len(table)} samples to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
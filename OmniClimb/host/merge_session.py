@@ -0,0 +1,470 @@
+"""
+Filename: merge_session.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Merges the recordings of a session, one or more files per hold, into
+    a single table on a common time grid.
+
+    Every Pico stamps its samples with its own ticks_ms(). The (ticks,
+    epoch ms) anchor of each frame (binary chunk headers from version 4,
+    '#anchor' lines in CSV recordings) maps them to Unix epoch ms, and
+    each hold is then interpolated linearly onto a grid of epoch times
+    shared by all holds. Grid points before a hold started, after it
+    stopped or inside a gap of more than --max-gap samples are NaN, so a
+    dropout is never bridged.
+
+    The session is processed a block of grid time (--block-s) at a time:
+    binary files are memory mapped and decoded chunk by chunk, CSV files
+    are read a batch of lines at a time, and each block is written out
+    before the next one is read. Memory use depends on the number of
+    holds and the block length, not on the session length.
+
+    Output columns are epoch_ms followed by "<hold>.ain<n>" for every
+    recorded channel, where the hold ID is the Pico ID from the binary
+    header. CSV recordings carry no header, so their hold ID is the name
+    of the directory holding them (collect_uploads.py stores files as
+    <session>/<pico id>/<filename>) and their columns are numbered in
+    file order. Several recordings of the same hold are chained in start
+    order.
+
+    Formats:
+        NPZ      a directory of part-NNNNN.npz files, one per block, plus
+                 session.json; load_npz() concatenates them
+        Parquet  one row group per block (needs pyarrow)
+
+    Usage:
+        python merge_session.py sessions/route7 -o route7       # NPZ parts
+        python merge_session.py sessions/route7 --parquet route7.parquet
+        python merge_session.py a.bin b.bin --interval-ms 10 --block-s 30
+"""
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import sys
+
+import numpy as np
+
+import decode_recording
+from decode_recording import TICKS_PERIOD
+
+_HALF_PERIOD = TICKS_PERIOD // 2
+_BLOCK_FRAMES = 64  # frames decoded per read
+_CSV_BATCH_LINES = 8192
+
+
+def _epoch(ticks: np.ndarray, anchor_ticks: np.ndarray,
+           anchor_epoch: np.ndarray) -> np.ndarray:
+    # Epoch ms of each sample from the anchor of its frame, across the
+    # ticks_ms wrap
+    delta = (ticks - anchor_ticks + _HALF_PERIOD) % TICKS_PERIOD
+    return anchor_epoch + delta - _HALF_PERIOD
+
+
+def recording_info(path: str, hold=None) -> dict:
+    """Reads what the merger needs to know about a recording up front
+
+    Args:
+        path: Binary or CSV recording
+        hold: Hold ID of a CSV recording (default: its directory name)
+
+    Returns:
+        A dictionary with the path, format, hold ID, channel names,
+        sample interval (ms) and the epoch ms of the first sample, which
+        is None when the recording has no time anchors
+    """
+    info = {"path": path, "first_epoch": None}
+    if path.lower().endswith(".csv"):
+        info["format"] = "csv"
+        info["hold"] = hold or os.path.basename(
+            os.path.dirname(os.path.abspath(path)))
+        block = next(_csv_blocks(path), None)
+        if block is None:
+            info["channels"] = []
+            info["sample_interval_ms"] = None
+            return info
+        ticks, epoch, values = block
+        info["channels"] = [f"ain{n}" for n in range(values.shape[1])]
+        info["sample_interval_ms"] = (int(np.median(np.diff(ticks)))
+                                      if len(ticks) > 1 else None)
+        if epoch is not None:
+            info["first_epoch"] = int(epoch[0])
+        return info
+
+    with open(path, "rb") as f:
+        header = decode_recording.read_header(f)
+    info["format"] = "bin"
+    info["header"] = header
+    info["hold"] = header["pico_id"]
+    info["channels"] = [f"ain{c}" for c in header["channel_map"]]
+    info["sample_interval_ms"] = header["sample_interval_ms"]
+    if header["version"] >= 4:
+        block = next(_bin_blocks(path, header), None)
+        if block is not None:
+            info["first_epoch"] = int(block[1][0])
+    return info
+
+
+def _bin_blocks(path: str, header: dict):
+    # (ticks, epoch ms, values) per _BLOCK_FRAMES chunks. Chunks without
+    # an anchor cannot be aligned and are left out
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ) as raw:
+        chunks = decode_recording.iter_chunks(raw, header["recording_id"],
+                                              header["version"])
+        while True:
+            parts = []
+            anchors = []
+            for payload, anchor, rows in chunks:
+                if not anchor[1] or not rows:
+                    continue
+                parts.append(payload)
+                anchors.append((anchor[0], anchor[1], rows))
+                if len(parts) == _BLOCK_FRAMES:
+                    break
+            if not parts:
+                return
+            anchors = np.array(anchors, dtype=np.int64)
+            data = decode_recording.decode_frames(parts, anchors[:, 2],
+                                                  header)
+            ticks = data[:, 0]
+            epoch = _epoch(ticks, np.repeat(anchors[:, 0], anchors[:, 2]),
+                           np.repeat(anchors[:, 1], anchors[:, 2]))
+            yield ticks, epoch, data[:, 1:]
+
+
+def _csv_blocks(path: str):
+    # (ticks, epoch ms, values) per batch of lines. Rows after an anchor
+    # with epoch 0 (no time base) get no epoch; a batch without any
+    # anchor yields epoch None
+    with open(path, "r") as f:
+        anchor = (0, 0)
+        while True:
+            rows = []
+            row_anchors = []
+            for line in f:
+                if line.startswith("#anchor,"):
+                    _, ticks, epoch = line.split(",")
+                    anchor = (int(ticks), int(epoch))
+                    continue
+                if line.startswith("#"):
+                    continue
+                fields = line.strip().split(",")
+                if len(fields) < 2:
+                    continue
+                if rows and len(fields) != len(rows[0]):
+                    continue  # cut short by a power loss
+                rows.append(fields)
+                row_anchors.append(anchor)
+                if len(rows) == _CSV_BATCH_LINES:
+                    break
+            if not rows:
+                return
+            data = np.array(rows, dtype=np.int64)
+            anchors = np.array(row_anchors, dtype=np.int64)
+            ticks = data[:, 0]
+            synced = anchors[:, 1] != 0
+            if not synced.any():
+                yield ticks, None, data[:, 1:]
+                continue
+            epoch = _epoch(ticks, anchors[:, 0], anchors[:, 1])
+            yield ticks[synced], epoch[synced], data[synced, 1:]
+
+
+def iter_aligned(info: dict):
+    """Yields (epoch ms, values) blocks of a recording's synced samples
+
+    Args:
+        info: Dictionary returned by recording_info
+
+    Yields:
+        An int64 array of epoch times and an array of shape (samples,
+        channels) with the ADC values
+    """
+    if info["format"] == "csv":
+        blocks = _csv_blocks(info["path"])
+    else:
+        blocks = _bin_blocks(info["path"], info["header"])
+    for _, epoch, values in blocks:
+        if epoch is not None and len(epoch):
+            yield epoch, values
+
+
+def interpolate(t: np.ndarray, values: np.ndarray, grid: np.ndarray,
+                max_gap_ms: float) -> np.ndarray:
+    """Linear interpolation of every channel onto grid
+
+    Args:
+        t: Increasing sample times (epoch ms)
+        values: Samples, shape (len(t), channels)
+        grid: Times to interpolate at
+        max_gap_ms: Longest interval between two samples that is
+            interpolated across
+
+    Returns:
+        A float32 array of shape (len(grid), channels), NaN outside the
+        samples and inside gaps
+    """
+    out = np.full((len(grid), values.shape[1]), np.nan, dtype=np.float32)
+    if len(t) < 2:
+        if len(t):
+            out[grid == t[0]] = values[0]
+        return out
+    right = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+    left = right - 1
+    span = t[right] - t[left]
+    valid = (grid >= t[0]) & (grid <= t[-1]) & (span <= max_gap_ms)
+    left = left[valid]
+    right = right[valid]
+    w = ((grid[valid] - t[left]) / np.maximum(span[valid], 1))[:, None]
+    out[valid] = values[left] * (1 - w) + values[right] * w
+    return out
+
+
+class HoldResampler:
+    """Resamples the recordings of one hold onto consecutive grid blocks,
+    reading only as far ahead as the current block needs"""
+
+    def __init__(self, hold: str, infos: list, max_gap_ms: float):
+        self.hold = hold
+        self.infos = sorted(infos, key=lambda i: i["first_epoch"])
+        self.channels = self.infos[0]["channels"]
+        self.max_gap_ms = max_gap_ms
+        self.sources = (block for info in self.infos
+                        for block in iter_aligned(info))
+        self.t = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, len(self.channels)))
+        self.done = False
+        self.samples = 0
+
+    @property
+    def first_epoch(self) -> int:
+        return self.infos[0]["first_epoch"]
+
+    @property
+    def last_epoch(self):
+        return int(self.t[-1]) if len(self.t) else None
+
+    def _read(self):
+        for epoch, values in self.sources:
+            if values.shape[1] != len(self.channels):
+                continue  # a recording with another channel map
+            if len(self.t):
+                # Chained recordings must not overlap
+                keep = epoch > self.t[-1]
+                epoch = epoch[keep]
+                values = values[keep]
+            if len(epoch):
+                self.t = np.concatenate((self.t, epoch))
+                self.values = np.concatenate((self.values, values))
+                self.samples += len(epoch)
+                return
+        self.done = True
+
+    def take(self, grid: np.ndarray) -> np.ndarray:
+        """Values at the grid times, shape (len(grid), channels)"""
+        end = grid[-1]
+        while not self.done and (not len(self.t) or self.t[-1] < end):
+            self._read()
+        out = interpolate(self.t, self.values, grid, self.max_gap_ms)
+        # The last sample at or before the block's end starts the next one
+        keep = max(int(np.searchsorted(self.t, end, side="right")) - 1, 0)
+        self.t = self.t[keep:]
+        self.values = self.values[keep:]
+        return out
+
+
+class NpzWriter:
+    """Writes each block as part-NNNNN.npz in a directory"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parts = 0
+        os.makedirs(path, exist_ok=True)
+        for old in glob.glob(os.path.join(path, "part-*.npz")):
+            os.remove(old)
+
+    def write(self, columns: dict):
+        np.savez(os.path.join(self.path, f"part-{self.parts:05d}.npz"),
+                 **columns)
+        self.parts += 1
+
+    def close(self, meta: dict):
+        with open(os.path.join(self.path, "session.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+class ParquetWriter:
+    """Writes each block as a row group of one Parquet file"""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs the pyarrow package "
+                             "(pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.writer = None
+
+    def write(self, columns: dict):
+        table = self.pa.table(columns)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self, meta: dict):
+        if self.writer is not None:
+            self.writer.close()
+        with open(self.path + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def load_npz(path: str, columns=None) -> dict:
+    """Reads an NPZ session written by merge_session
+
+    Args:
+        path: Directory of part files
+        columns: Names of the columns to load (default: all)
+
+    Returns:
+        A dictionary of concatenated columns
+    """
+    parts = sorted(glob.glob(os.path.join(path, "part-*.npz")))
+    loaded = {}
+    for part in parts:
+        with np.load(part) as npz:
+            for name in columns or npz.files:
+                loaded.setdefault(name, []).append(npz[name])
+    return {name: np.concatenate(arrays) for name, arrays in loaded.items()}
+
+
+def find_recordings(paths: list) -> list:
+    """Recording files given directly or found below session directories"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                found += [os.path.join(root, name) for name in sorted(files)
+                          if name.lower().endswith((".bin", ".csv"))]
+        else:
+            found.append(path)
+    return found
+
+
+def merge(paths: list, writer, interval_ms=None, max_gap=2.5,
+          block_s=60.0, verbose=True) -> dict:
+    """Aligns and resamples the recordings onto one grid
+
+    Args:
+        paths: Recording files or session directories
+        writer: NpzWriter or ParquetWriter taking the blocks
+        interval_ms: Grid interval (default: the shortest sample interval
+            of the recordings)
+        max_gap: Longest gap interpolated across, in sample intervals of
+            the hold
+        block_s: Grid time processed per block
+        verbose: Report skipped recordings on stderr
+
+    Returns:
+        The session description written next to the data
+    """
+    holds = {}
+    for path in find_recordings(paths):
+        try:
+            info = recording_info(path)
+        except (OSError, ValueError) as e:
+            print(f"{path}: skipped ({e})", file=sys.stderr)
+            continue
+        if info["first_epoch"] is None:
+            if verbose:
+                print(f"{path}: skipped, no time anchors", file=sys.stderr)
+            continue
+        holds.setdefault(info["hold"], []).append(info)
+    if not holds:
+        raise SystemExit("no recordings with time anchors found")
+
+    if interval_ms is None:
+        interval_ms = min(i["sample_interval_ms"] or 1
+                          for infos in holds.values() for i in infos)
+    resamplers = []
+    for hold, infos in sorted(holds.items()):
+        interval = max(i["sample_interval_ms"] or interval_ms for i in infos)
+        resamplers.append(HoldResampler(hold, infos, max_gap * interval))
+
+    start = min(r.first_epoch for r in resamplers)
+    start -= start % interval_ms
+    step = max(1, int(block_s * 1000 // interval_ms)) * interval_ms
+    rows = 0
+    while True:
+        grid = np.arange(start, start + step, interval_ms, dtype=np.int64)
+        columns = {"epoch_ms": grid}
+        for r in resamplers:
+            values = r.take(grid)
+            for n, channel in enumerate(r.channels):
+                columns[f"{r.hold}.{channel}"] = values[:, n]
+        last = all(r.done for r in resamplers)
+        if last:
+            end = max(r.last_epoch for r in resamplers
+                      if r.last_epoch is not None)
+            n = int(np.searchsorted(grid, end, side="right"))
+            columns = {name: column[:n] for name, column in columns.items()}
+        if len(columns["epoch_ms"]):
+            writer.write(columns)
+            rows += len(columns["epoch_ms"])
+        if last:
+            break
+        start += step
+
+    meta = {
+        "start_epoch_ms": int(min(r.first_epoch for r in resamplers)),
+        "interval_ms": interval_ms,
+        "rows": rows,
+        "holds": {
+            r.hold: {
+                "channels": r.channels,
+                "samples": r.samples,
+                "max_gap_ms": r.max_gap_ms,
+                "recordings": [i["path"] for i in r.infos],
+            } for r in resamplers
+        },
+    }
+    writer.close(meta)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge the OmniClimb recordings of a session onto a "
+                    "common time grid.")
+    parser.add_argument("paths", nargs="+",
+                        help="recordings or session directories")
+    parser.add_argument("-o", "--npz", help="NPZ output directory")
+    parser.add_argument("--parquet", help="Parquet output file")
+    parser.add_argument("--interval-ms", type=int,
+                        help="grid interval (default: shortest sample "
+                             "interval)")
+    parser.add_argument("--max-gap", type=float, default=2.5,
+                        help="longest gap interpolated across, in sample "
+                             "intervals")
+    parser.add_argument("--block-s", type=float, default=60.0,
+                        help="grid time processed at a time")
+    args = parser.parse_args()
+    if bool(args.npz) == bool(args.parquet):
+        parser.error("give exactly one of --npz and --parquet")
+
+    writer = (ParquetWriter(args.parquet) if args.parquet
+              else NpzWriter(args.npz))
+    meta = merge(args.paths, writer, args.interval_ms, args.max_gap,
+                 args.block_s)
+    print(f"Merged {len(meta['holds'])} holds into {meta['rows']} rows "
+          f"at {meta['interval_ms']} ms -> {args.parquet or args.npz}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Filename: time_server.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Minimal SNTP server for the gym LAN, the reference clock the Picos
+    synchronize to (see upload2pico/timebase.py and config_time.py).
+
+    The gym often has no internet, and only the alignment of the holds to
+    each other matters for force-transfer analysis, so one PC on the LAN
+    (the hub or the broker host) serves its own clock. Receive and
+    transmit times are taken with time.time_ns() right around the socket
+    calls; the Picos' filtering removes most of the Wi-Fi jitter.
+
+    Usage:
+        python time_server.py                 # port 123, needs admin rights
+        python time_server.py --port 12300    # match config_time.servers
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+
+NTP_DELTA_S = 2208988800  # 1900-01-01 to 1970-01-01
+_REFID = b"LOCL"
+
+
+def ntp_timestamp(ns: int) -> bytes:
+    """64-bit NTP timestamp of a Unix time in ns"""
+    secs, rem = divmod(ns, 1_000_000_000)
+    return struct.pack("!II", (secs + NTP_DELTA_S) & 0xFFFFFFFF,
+                       (rem << 32) // 1_000_000_000)
+
+
+def reply_packet(request: bytes, received_ns: int, stratum: int) -> bytes:
+    """Server reply to an SNTP client request; the transmit time is
+    stamped last"""
+    version = (request[0] >> 3) & 7
+    head = struct.pack("!BBbbII4s", version << 3 | 4, stratum,
+                       request[2], -20, 0, 0, _REFID)
+    rx = ntp_timestamp(received_ns)
+    # reference, originate (the client's transmit), receive, transmit
+    return (head + rx + request[40:48] + rx +
+            ntp_timestamp(time.time_ns()))
+
+
+class SntpServer:
+    """Answers SNTP client requests on a UDP port from a background
+    thread"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 123,
+                 stratum: int = 2):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.stratum = stratum
+        self.requests = 0
+        self.thread = None
+
+    def serve_forever(self):
+        while True:
+            try:
+                request, addr = self.sock.recvfrom(512)
+            except OSError:
+                return  # closed by stop()
+            received_ns = time.time_ns()
+            if len(request) < 48 or request[0] & 7 != 3:
+                continue  # not a client request
+            self.sock.sendto(reply_packet(request, received_ns,
+                                          self.stratum), addr)
+            self.requests += 1
+
+    def start(self) -> "SntpServer":
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       daemon=True, name="sntp")
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.sock.close()
+        if self.thread is not None:
+            self.thread.join(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve this PC's clock to the OmniClimb Picos (SNTP).")
+    parser.add_argument("--bind", default="0.0.0.0",
+                        help="address to listen on")
+    parser.add_argument("--port", type=int, default=123,
+                        help="UDP port (123 needs admin rights)")
+    parser.add_argument("--stratum", type=int, default=2,
+                        help="stratum reported to the clients")
+    args = parser.parse_args()
+
+    server = SntpServer(args.bind, args.port, args.stratum)
+    print(f"SNTP server on {args.bind}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{server.requests} requests answered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Filename: bench.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Acquisition throughput benchmark: sweeps sample interval, channel
+    count, ADS1115 data rate, frame size and recording format through the
+    simulator and tabulates what the firmware sustains at each point.
+
+    Every point is a separate run_sim.py process (main.py keeps module
+    state, so it runs once per process) with config_record.py overridden
+    through --set. A point is stable when no frames were dropped, the
+    stored rate is within 1% of the target and at most 1% of the sample
+    slots were missed (host scheduling costs the simulator the odd slot).
+    Rows carry the git commit so tables from different commits can be
+    compared; --baseline does that and exits 1 on a regression.
+
+    This sweeps the simulator. On a real Pico set the same parameters in
+    upload2pico/config_record.py and flash it.
+
+    Usage:
+        python bench.py --interval-ms 20,10,5 --channels 1,2,4 \\
+            --duration 20 -o bench.csv
+        python bench.py --interval-ms 20,10 --baseline bench.csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STABLE_RATE = 0.99  # fraction of the target rate a stable point reaches
+STABLE_MISSED = 0.01  # missed slots a stable point allows, per sample
+
+PARAMS = ("format", "sample_interval_ms", "channels", "adc_rate",
+          "samples_per_frame")
+RESULTS = ("samples_per_s", "target_samples_per_s", "samples_written",
+           "dropped_frames", "missed_samples", "queue_high_water",
+           "jitter_min_us", "jitter_mean_us", "jitter_max_us",
+           "sd_write_max_us", "sd_vfs_write_max_us", "adc_mode",
+           "host_gc_ms", "host_gc_max_ms", "stable")
+COLUMNS = ("commit",) + PARAMS + ("repeat",) + RESULTS
+
+
+def git_commit():
+    """Short hash of HEAD, with '+dirty' for uncommitted changes."""
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=SIM_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", ".."],
+                               cwd=SIM_DIR, capture_output=True, text=True,
+                               check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return head + "+dirty" if dirty else head
+
+
+def int_list(text):
+    try:
+        return [int(v) for v in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected integers, got {text!r}")
+
+
+def run_point(point, args):
+    """Run one simulation, returns the run_sim.py report."""
+    cmd = [sys.executable, os.path.join(SIM_DIR, "run_sim.py"), "--json",
+           "--duration", str(args.duration),
+           "--format", point["format"],
+           "--sd-stall-every", str(args.sd_stall_every),
+           "--sd-stall-us", str(args.sd_stall_us),
+           "--set", f"sample_interval_ms={point['sample_interval_ms']}",
+           "--set", f"channel_map={tuple(range(point['channels']))!r}",
+           "--set", f"adc_rate={point['adc_rate']}",
+           "--set", f"samples_per_frame={point['samples_per_frame']}"]
+    proc = subprocess.run(cmd, capture_output=True, text=True,
+                          timeout=args.duration + 120)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1]
+                           if proc.stderr.strip() else "run_sim.py failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def to_row(commit, point, repeat, report):
+    jitter = report["jitter_us"] or [None, None, None]
+    rate = report["samples_per_s"]
+    row = dict(point, commit=commit, repeat=repeat)
+    row.update({key: report.get(key) for key in RESULTS})
+    row.update(jitter_min_us=jitter[0], jitter_mean_us=jitter[1],
+               jitter_max_us=jitter[2])
+    row["stable"] = int(
+        rate is not None and
+        rate >= STABLE_RATE * report["target_samples_per_s"] and
+        report["dropped_frames"] == 0 and
+        report["missed_samples"] <=
+        STABLE_MISSED * (report["samples_written"] or 0))
+    return row
+
+
+def read_table(path):
+    """Rows of a table written by this script (.csv or .jsonl)."""
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for key, value in row.items():
+            try:
+                row[key] = float(value) if "." in value else int(value)
+            except (TypeError, ValueError):
+                row[key] = value if value != "" else None
+    return rows
+
+
+def write_table(path, rows):
+    with open(path, "w", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        else:
+            writer = csv.DictWriter(f, COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def _key(row):
+    return tuple(str(row[p]) for p in PARAMS)
+
+
+def _mean_by_point(rows):
+    # Points averaged over repeats: key -> (mean rate, all repeats stable)
+    points = {}
+    for row in rows:
+        rates, stable = points.setdefault(_key(row), ([], []))
+        rates.append(row["samples_per_s"] or 0.0)
+        stable.append(bool(row["stable"]))
+    return {k: (sum(r) / len(r), all(s)) for k, (r, s) in points.items()}
+
+
+def max_stable_rates(rows):
+    """Highest target rate per (format, channels) at which every repeat
+       was stable, or None."""
+    best = {}
+    for key, (_, stable) in _mean_by_point(rows).items():
+        point = dict(zip(PARAMS, key))
+        group = (point["format"], int(point["channels"]))
+        target = 1000 / int(point["sample_interval_ms"])
+        best.setdefault(group, None)
+        if stable and (best[group] is None or target > best[group]):
+            best[group] = target
+    return best
+
+
+def compare(rows, baseline, tolerance):
+    """Regressions of rows against a baseline table, as messages."""
+    now = _mean_by_point(rows)
+    before = _mean_by_point(baseline)
+    problems = []
+    for key, (rate, stable) in sorted(now.items()):
+        if key not in before:
+            continue
+        old_rate, old_stable = before[key]
+        label = ", ".join(f"{p}={v}" for p, v in zip(PARAMS, key))
+        if old_stable and not stable:
+            problems.append(f"{label}: no longer stable")
+        elif old_rate and rate < old_rate * (1 - tolerance):
+            problems.append(f"{label}: {rate:.2f} samples/s, "
+                            f"was {old_rate:.2f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep acquisition parameters through the simulator.")
+    parser.add_argument("--interval-ms", type=int_list, default=[20, 10, 5],
+                        help="comma list of sample intervals")
+    parser.add_argument("--channels", type=int_list, default=[1, 2, 4],
+                        help="comma list of channel counts (1-4)")
+    parser.add_argument("--adc-rate", type=int_list, default=[7],
+                        help="comma list of ADS1115 data rate indexes")
+    parser.add_argument("--samples-per-frame", type=int_list, default=[100])
+    parser.add_argument("--format", default="bin",
+                        help="comma list of recording formats")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="recording length of each run in seconds")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--sd-stall-every", type=int, default=0)
+    parser.add_argument("--sd-stall-us", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        help="write the table to a .csv or .jsonl file")
+    parser.add_argument("--baseline",
+                        help="table from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="allowed rate loss against the baseline")
+    args = parser.parse_args()
+
+    if any(not 1 <= n <= 4 for n in args.channels):
+        parser.error("--channels must be between 1 and 4")
+    commit = git_commit()
+    points = [dict(zip(PARAMS, values)) for values in itertools.product(
+        args.format.split(","), args.interval_ms, args.channels,
+        args.adc_rate, args.samples_per_frame)]
+
+    rows = []
+    for point in points:
+        for repeat in range(args.repeat):
+            label = ", ".join(f"{k}={v}" for k, v in point.items())
+            try:
+                report = run_point(point, args)
+            except (RuntimeError, subprocess.TimeoutExpired,
+                    ValueError) as e:
+                print(f"{label}: failed ({e})", file=sys.stderr)
+                continue
+            row = to_row(commit, point, repeat, report)
+            rows.append(row)
+            print(f"{label}: {row['samples_per_s']} samples/s "
+                  f"(target {row['target_samples_per_s']:g}), "
+                  f"dropped {row['dropped_frames']}, "
+                  f"missed {row['missed_samples']}"
+                  f"{'' if row['stable'] else ', UNSTABLE'}",
+                  file=sys.stderr)
+
+    if args.output:
+        write_table(args.output, rows)
+    else:
+        writer = csv.DictWriter(sys.stdout, COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print("\nMax stable rate:", file=sys.stderr)
+    for (fmt, channels), rate in sorted(max_stable_rates(rows).items()):
+        shown = f"{rate:g} samples/s" if rate else "none"
+        print(f"  {fmt}, {channels} channel(s): {shown}", file=sys.stderr)
+
+    if args.baseline:
+        problems = compare(rows, read_table(args.baseline), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print("No regressions against the baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
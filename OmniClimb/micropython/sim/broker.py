@@ -0,0 +1,337 @@
+"""
+Filename: broker.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Minimal local MQTT 3.1.1 broker and test client for the desktop
+    simulator, so main.py can talk to a real socket without the HiveMQ
+    cloud broker.
+
+    Supported: CONNECT (clean or persistent sessions), SUBSCRIBE and
+    UNSUBSCRIBE with + and # wildcards, PUBLISH at QoS 0 and 1 (PUBACK to
+    the publisher, delivery to subscribers at QoS 0), retained messages,
+    PINGREQ and DISCONNECT. Not supported: QoS 2, will messages, auth.
+
+    drop_client() closes a client's connection to exercise reconnects.
+    While 'silent' is set the broker accepts connections but answers
+    nothing, like a hung broker host with the network still up.
+
+    Usage:
+        python broker.py --port 1883
+"""
+
+import argparse
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter match with + and # wildcards."""
+    f_parts = topic_filter.split("/")
+    t_parts = topic.split("/")
+    for i, part in enumerate(f_parts):
+        if part == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if part != "+" and part != t_parts[i]:
+            return False
+    return len(f_parts) == len(t_parts)
+
+
+def _encode_len(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def _read_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_packet(sock):
+    """Read one MQTT control packet, returns (first byte, body)."""
+    first = _read_exact(sock, 1)[0]
+    n = 0
+    shift = 0
+    while True:
+        b = _read_exact(sock, 1)[0]
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            break
+        shift += 7
+    return first, _read_exact(sock, n)
+
+
+def _str(body, pos):
+    n, = struct.unpack_from("!H", body, pos)
+    return body[pos + 2:pos + 2 + n], pos + 2 + n
+
+
+def publish_packet(topic, payload, qos=0, retain=False, pid=0):
+    body = struct.pack("!H", len(topic)) + topic
+    if qos:
+        body += struct.pack("!H", pid)
+    body += payload
+    return bytes([0x30 | qos << 1 | retain]) + _encode_len(len(body)) + body
+
+
+class _Session:
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.subscriptions = {}  # filter -> qos
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        with self.lock:
+            if self.sock is not None:
+                self.sock.sendall(data)
+
+
+class Broker:
+    def __init__(self, host="127.0.0.1", port=0):
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._serve(self.request)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server((host, port), Handler)
+        self.host, self.port = self.server.server_address
+        self.sessions = {}
+        self.retained = {}
+        self.lock = threading.Lock()
+        # Counters: messages and payload bytes published per topic
+        self.published = {}
+        self.connects = 0
+        self.silent = False
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True,
+                         name="mqtt-broker").start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def drop_client(self, client_id):
+        """Close a client's connection as if the network had failed."""
+        with self.lock:
+            session = self.sessions.get(client_id)
+        if session is not None and session.sock is not None:
+            try:
+                session.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _route(self, topic, payload, retain):
+        name = topic.decode(errors="replace")
+        with self.lock:
+            count, nbytes = self.published.get(name, (0, 0))
+            self.published[name] = (count + 1, nbytes + len(payload))
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            targets = [s for s in self.sessions.values()
+                       if s.sock is not None and
+                       any(topic_matches(f, name) for f in s.subscriptions)]
+        packet = publish_packet(topic, payload)
+        for session in targets:
+            try:
+                session.send(packet)
+            except OSError:
+                pass
+
+    def _serve(self, sock):
+        session = None
+        try:
+            first, body = read_packet(sock)
+            if first >> 4 != 1:
+                return
+            if self.silent:
+                while self.silent:
+                    time.sleep(0.05)
+                return
+            flags = body[7]
+            client_id, _ = _str(body, 10)
+            client_id = client_id.decode(errors="replace")
+            clean = bool(flags & 0x02)
+            with self.lock:
+                self.connects += 1
+                session = self.sessions.get(client_id)
+                present = session is not None and not clean
+                if session is None or clean:
+                    session = _Session(client_id)
+                    self.sessions[client_id] = session
+                old = session.sock
+                session.sock = sock
+            if old is not None:
+                try:
+                    old.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            session.send(bytes([0x20, 2, 1 if present else 0, 0]))
+
+            while True:
+                first, body = read_packet(sock)
+                kind = first >> 4
+                if kind == 3:  # PUBLISH
+                    qos = (first >> 1) & 3
+                    topic, pos = _str(body, 0)
+                    if qos:
+                        pid = body[pos:pos + 2]
+                        pos += 2
+                        session.send(b"\x40\x02" + pid)
+                    self._route(topic, body[pos:], bool(first & 1))
+                elif kind == 8:  # SUBSCRIBE
+                    pid = body[:2]
+                    pos = 2
+                    granted = bytearray()
+                    new = []
+                    while pos < len(body):
+                        topic_filter, pos = _str(body, pos)
+                        qos = body[pos]
+                        pos += 1
+                        name = topic_filter.decode(errors="replace")
+                        session.subscriptions[name] = qos
+                        new.append(name)
+                        granted.append(0)
+                    session.send(bytes([0x90, 2 + len(granted)]) + pid +
+                                 bytes(granted))
+                    with self.lock:
+                        retained = list(self.retained.items())
+                    for topic, payload in retained:
+                        if any(topic_matches(f, topic.decode()) for f in new):
+                            session.send(publish_packet(topic, payload,
+                                                        retain=True))
+                elif kind == 10:  # UNSUBSCRIBE
+                    pid = body[:2]
+                    pos = 2
+                    while pos < len(body):
+                        topic_filter, pos = _str(body, pos)
+                        session.subscriptions.pop(
+                            topic_filter.decode(errors="replace"), None)
+                    session.send(b"\xb0\x02" + pid)
+                elif kind == 12:  # PINGREQ
+                    session.send(b"\xd0\x00")
+                elif kind == 14:  # DISCONNECT
+                    return
+                # PUBACK (4) from clients needs no answer
+        except (ConnectionError, OSError, IndexError, struct.error):
+            pass
+        finally:
+            if session is not None:
+                with self.lock:
+                    if session.sock is sock:
+                        session.sock = None
+                    if not session.subscriptions:
+                        self.sessions.pop(session.client_id, None)
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class Probe:
+    """Small blocking MQTT client that sends commands and collects
+       messages, for use by simulator scripts."""
+
+    def __init__(self, port, host="127.0.0.1", client_id="sim-probe"):
+        self.sock = socket.create_connection((host, port))
+        self.messages = queue.Queue()
+        self.pid = 0
+        cid = client_id.encode()
+        body = (b"\x00\x04MQTT\x04\x02\x00\x00" +
+                struct.pack("!H", len(cid)) + cid)
+        self.sock.sendall(b"\x10" + _encode_len(len(body)) + body)
+        first, _ = read_packet(self.sock)
+        assert first == 0x20, "no CONNACK"
+        self.thread = threading.Thread(target=self._reader, daemon=True,
+                                       name="mqtt-probe")
+        self.thread.start()
+
+    def _reader(self):
+        try:
+            while True:
+                first, body = read_packet(self.sock)
+                if first >> 4 == 3:
+                    topic, pos = _str(body, 0)
+                    if (first >> 1) & 3:
+                        pos += 2
+                    self.messages.put((time.monotonic(), topic.decode(),
+                                       body[pos:]))
+        except (ConnectionError, OSError):
+            pass
+
+    def subscribe(self, topic_filter):
+        self.pid += 1
+        t = topic_filter.encode()
+        body = struct.pack("!H", self.pid) + struct.pack("!H", len(t)) + t + \
+            b"\x00"
+        self.sock.sendall(b"\x82" + _encode_len(len(body)) + body)
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.sock.sendall(publish_packet(topic.encode(), payload))
+
+    def wait_for(self, predicate, timeout):
+        """Return the first (time, topic, payload) matching predicate."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                msg = self.messages.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if predicate(msg):
+                return msg
+
+    def close(self):
+        try:
+            self.sock.sendall(b"\xe0\x00")
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT broker.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    broker = Broker(args.host, args.port).start()
+    print(f"MQTT broker listening on {broker.host}:{broker.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
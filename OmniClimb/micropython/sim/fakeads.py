@@ -0,0 +1,187 @@
+"""
+Filename: fakeads.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Register-level model of the ADS1115 for the desktop simulator, driven
+    through the simulated machine.I2C bus by the unmodified
+    upload2pico/ads1x15.py driver.
+
+    Modelled behaviour:
+        - config, conversion and threshold registers (16 bit, big endian)
+        - single-shot conversions: the OS bit reads 0 until 1/SPS after
+          the config write that started the conversion
+        - continuous conversions every 1/SPS, restarted by a config write
+        - ALERT/RDY conversion-ready pulses (HI_THRESH MSB set, LO_THRESH
+          MSB clear, comparator enabled), delivered as a falling edge on
+          the simulated GPIO so Pin.irq handlers run
+        - PGA full scale, single-ended and differential inputs, clipping
+          and Gaussian noise in LSB
+
+    Input voltages come from signal(ain, t) with t in seconds since the
+    device was created. The default has a 0.2 V reference on AIN0 and
+    slow pull profiles on AIN1..AIN3; climb_signal() loads the hold only
+    now and then, like a route that is climbed in attempts.
+"""
+
+import math
+import random
+import threading
+import time
+
+import machine
+
+_SPS = (8, 16, 32, 64, 128, 250, 475, 860)
+_FULL_SCALE_V = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+
+# Mux field -> (positive input, negative input or None)
+_MUX = {
+    0: (0, 1), 1: (0, 3), 2: (1, 3), 3: (2, 3),
+    4: (0, None), 5: (1, None), 6: (2, None), 7: (3, None),
+}
+
+_REG_CONVERT = 0
+_REG_CONFIG = 1
+_REG_LO_THRESH = 2
+_REG_HI_THRESH = 3
+
+_OS = 0x8000
+_MODE_SINGLE = 0x0100
+_CQUE_NONE = 0x0003
+
+
+def default_signal(ain, t):
+    """0.2 V reference on AIN0; AIN1..AIN3 repeat a 4 s pull and release."""
+    if ain == 0:
+        return 0.2
+    pull = max(0.0, math.sin(2 * math.pi * t / 4 + ain))
+    return 0.2 + 2.0 * pull * pull
+
+
+def climb_signal(ain, t):
+    """0.2 V reference on AIN0; AIN1..AIN3 are loaded for 3 s every 20 s,
+       starting 5 s in, and rest at the reference otherwise."""
+    phase = (t - 5) % 20
+    if ain == 0 or t < 5 or phase >= 3:
+        return 0.2
+    return 0.2 + 1.5 * math.sin(math.pi * phase / 3)
+
+
+SIGNALS = {"pulls": default_signal, "climb": climb_signal}
+
+
+class FakeADS1115:
+    def __init__(self, alert_pin=None, signal=default_signal, noise_lsb=2.0,
+                 clock_error=0.0, seed=0):
+        self.alert_pin = alert_pin
+        self.signal = signal
+        self.noise_lsb = noise_lsb
+        # Internal oscillator error, e.g. 0.05 converts 5 % fast
+        self.clock_error = clock_error
+        self.rng = random.Random(seed)
+        self.t0 = time.monotonic()
+
+        self.config = 0x8583
+        self.lo_thresh = 0x8000
+        self.hi_thresh = 0x7FFF
+        self.conversion = 0
+        self.busy = False
+        self.conv_end = 0.0
+        self.conversions = 0
+        self.rdy_pulses = 0
+
+        self.cond = threading.Condition()
+        self.thread = None
+
+    # --- I2C device interface (see sim/mpy/machine.py) --- #
+
+    def i2c_write(self, register, data):
+        value = int.from_bytes(data[:2], "big")
+        now = time.monotonic()
+        with self.cond:
+            self._update(now)
+            if register == _REG_CONFIG:
+                self.config = value & ~_OS
+                if not value & _MODE_SINGLE:
+                    # Continuous: a config write restarts the conversion
+                    self.busy = True
+                    self.conv_end = now + self._period()
+                    self._ensure_thread()
+                else:
+                    # Single-shot: OS starts a conversion, otherwise the
+                    # device powers down
+                    self.busy = bool(value & _OS)
+                    self.conv_end = now + self._period()
+                self.cond.notify_all()
+            elif register == _REG_LO_THRESH:
+                self.lo_thresh = value
+            elif register == _REG_HI_THRESH:
+                self.hi_thresh = value
+
+    def i2c_read(self, register, nbytes):
+        with self.cond:
+            self._update(time.monotonic())
+            if register == _REG_CONVERT:
+                value = self.conversion & 0xFFFF
+            elif register == _REG_CONFIG:
+                single_busy = self.busy and self.config & _MODE_SINGLE
+                value = self.config | (0 if single_busy else _OS)
+            elif register == _REG_LO_THRESH:
+                value = self.lo_thresh
+            else:
+                value = self.hi_thresh
+        return value.to_bytes(2, "big")[:nbytes]
+
+    # --- Conversion model --- #
+
+    def _period(self):
+        rate = _SPS[(self.config >> 5) & 0x7]
+        return 1 / (rate * (1 + self.clock_error))
+
+    def _code(self, t):
+        pos, neg = _MUX[(self.config >> 12) & 0x7]
+        rel = t - self.t0
+        v = self.signal(pos, rel)
+        if neg is not None:
+            v -= self.signal(neg, rel)
+        fs = _FULL_SCALE_V[(self.config >> 9) & 0x7]
+        code = round(v / fs * 32768 + self.rng.gauss(0, self.noise_lsb))
+        return max(-32768, min(32767, code))
+
+    def _update(self, now):
+        # Finish a single-shot conversion whose time has come
+        if self.busy and self.config & _MODE_SINGLE and now >= self.conv_end:
+            self.conversion = self._code(self.conv_end)
+            self.conversions += 1
+            self.busy = False
+
+    def _rdy_enabled(self):
+        return ((self.config & _CQUE_NONE) != _CQUE_NONE and
+                self.hi_thresh & 0x8000 and not self.lo_thresh & 0x8000)
+
+    def _ensure_thread(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True,
+                                           name="fake-ads1115")
+            self.thread.start()
+
+    def _run(self):
+        # Continuous conversions and their ALERT/RDY pulses
+        while True:
+            with self.cond:
+                if self.config & _MODE_SINGLE or not self.busy:
+                    self.cond.wait()
+                    continue
+                delay = self.conv_end - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                self.conversion = self._code(self.conv_end)
+                self.conversions += 1
+                self.conv_end += self._period()
+                fire = self._rdy_enabled() and self.alert_pin is not None
+            if fire:
+                # The handler may write the config, which takes the lock
+                self.rdy_pulses += 1
+                machine.Pin.sim_edge(self.alert_pin, falling=True)
+                machine.Pin.sim_edge(self.alert_pin, falling=False)
@@ -0,0 +1,220 @@
+"""
+Filename: machine.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for the parts of the RP2040 machine module used by
+    upload2pico: Pin (with IRQs), I2C, SPI and Timer.
+
+    I2C transactions are routed to simulated devices registered with
+    attach_i2c() (e.g. sim/fakeads.py) and take the time the transfer
+    would take on the wire: 9 clock cycles per byte at the bus frequency.
+    A device raises an IRQ on a pin with Pin.sim_edge().
+"""
+
+import threading
+
+import utime
+
+# Simulated I2C devices by (bus id or None for every bus, 7-bit address)
+_i2c_devices = {}
+
+
+def attach_i2c(address, device, bus=None):
+    """Put a device on simulated I2C bus 'bus', or on every bus. It must
+       provide i2c_read(register, nbytes) -> bytes and
+       i2c_write(register, data)."""
+    _i2c_devices[(bus, address)] = device
+
+
+def detach_i2c(address, bus=None):
+    _i2c_devices.pop((bus, address), None)
+
+
+def freq(hz=None):
+    return 125000000 if hz is None else None
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x2b\x2e\x2c"
+
+
+def reset():
+    raise SystemExit("machine.reset() in the simulator")
+
+
+def soft_reset():
+    raise SystemExit("machine.soft_reset() in the simulator")
+
+
+def idle():
+    utime.sleep_us(10)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    # Level and IRQ handler per GPIO, shared by every Pin object
+    _levels = {}
+    _handlers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull == Pin.PULL_UP:
+            Pin._levels.setdefault(self.id, 1)
+        if value is not None:
+            Pin._levels[self.id] = 1 if value else 0
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels.get(self.id, 0)
+        Pin._levels[self.id] = 1 if v else 0
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        with Pin._lock:
+            if handler is None:
+                Pin._handlers.pop(self.id, None)
+            else:
+                Pin._handlers[self.id] = (handler, trigger, self)
+
+    @classmethod
+    def sim_edge(cls, id, falling=True):
+        """Drive an edge on GPIO id and run its IRQ handler, if any."""
+        cls._levels[id] = 0 if falling else 1
+        with cls._lock:
+            entry = cls._handlers.get(id)
+        if entry is None:
+            return False
+        handler, trigger, pin = entry
+        if trigger & (cls.IRQ_FALLING if falling else cls.IRQ_RISING):
+            handler(pin)
+            return True
+        return False
+
+    def __repr__(self):
+        return f"Pin({self.id})"
+
+
+class I2C:
+    # One lock per bus id: the IRQ-driven ADC scan and the sampler may
+    # address the same bus from different threads
+    _bus_locks = {}
+
+    def __init__(self, id, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+        self._lock = I2C._bus_locks.setdefault(id, threading.RLock())
+
+    def _transfer(self, address, nbytes):
+        # START + address byte + payload, 9 clocks per byte
+        utime.sleep_us((nbytes + 1) * 9 * 1000000 // self.freq)
+        device = (_i2c_devices.get((self.id, address)) or
+                  _i2c_devices.get((None, address)))
+        if device is None:
+            raise OSError(5)  # EIO, no ACK
+        return device
+
+    def scan(self):
+        return sorted(address for bus, address in _i2c_devices
+                      if bus is None or bus == self.id)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        with self._lock:
+            device = self._transfer(addr, 1 + len(buf))
+            device.i2c_write(memaddr, bytes(buf))
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        with self._lock:
+            # Register pointer write, repeated START, then the read
+            self._transfer(addr, 1)
+            device = self._transfer(addr, len(buf))
+            buf[:] = device.i2c_read(memaddr, len(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto(self, addr, buf, stop=True):
+        with self._lock:
+            device = self._transfer(addr, len(buf))
+            if len(buf):
+                device.i2c_write(buf[0], bytes(buf[1:]))
+        return len(buf)
+
+
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def init(self, baudrate=1000000, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def read(self, nbytes, write=0x00):
+        return bytes([0xFF]) * nbytes
+
+    def readinto(self, buf, write=0x00):
+        for i in range(len(buf)):
+            buf[i] = 0xFF
+
+    def write(self, buf):
+        return None
+
+    def write_readinto(self, write_buf, read_buf):
+        self.readinto(read_buf)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._thread = None
+        self._stop = threading.Event()
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None):
+        self.deinit()
+        interval = 1 / freq if freq > 0 else period / 1000
+        self._stop = threading.Event()
+
+        def run(stop=self._stop):
+            while not stop.wait(interval):
+                callback(self)
+                if mode == Timer.ONE_SHOT:
+                    return
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def deinit(self):
+        self._stop.set()
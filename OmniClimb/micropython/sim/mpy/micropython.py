@@ -0,0 +1,76 @@
+"""
+Filename: micropython.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for the MicroPython 'micropython' module.
+
+    The native and viper decorators leave functions as plain Python. The
+    viper pointer casts (ptr8, ptr16, ptr32) are installed as builtins and
+    return memoryviews over the same buffer, so viper code indexes the
+    same bytes it would on the Pico. Viper's 32-bit wrap-around is not
+    modelled.
+"""
+
+import builtins
+
+
+def const(value):
+    return value
+
+
+def native(f):
+    return f
+
+
+def viper(f):
+    return f
+
+
+def asm_thumb(f):
+    raise NotImplementedError("asm_thumb functions cannot run in the simulator")
+
+
+def _cast(code):
+    def cast(obj):
+        mv = memoryview(obj)
+        if mv.format != "B":
+            mv = mv.cast("B")
+        return mv if code == "B" else mv.cast(code)
+    return cast
+
+
+builtins.ptr8 = _cast("B")
+builtins.ptr16 = _cast("H")
+builtins.ptr32 = _cast("i")
+
+
+def schedule(func, arg):
+    # Soft IRQs of the simulated devices already run outside any hard
+    # interrupt context, so the callback can run right away
+    func(arg)
+    return True
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0 if level is None else None
+
+
+def mem_info(verbose=False):
+    print("mem: not available in the simulator")
+
+
+def qstr_info(verbose=False):
+    pass
+
+
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    return 0
@@ -0,0 +1,75 @@
+"""
+Filename: network.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for the Pico W network module. The WLAN "connects"
+    at once to the loopback interface. Simulator code can take the link
+    down with set_link(False) to exercise the reconnect paths.
+"""
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+_link_up = True
+
+
+def set_link(up):
+    """Simulate the access point going away (False) or coming back."""
+    global _link_up
+    _link_up = up
+
+
+class WLAN:
+    # One shared state per interface, like the single CYW43 radio
+    _state = {}
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._s = self._state.setdefault(interface, {
+            "active": False,
+            "connected": False,
+            "config": {},
+        })
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._s["active"]
+        self._s["active"] = bool(is_active)
+        if not is_active:
+            self._s["connected"] = False
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        self._s["config"]["ssid"] = ssid
+        self._s["connected"] = self._s["active"]
+
+    def disconnect(self):
+        self._s["connected"] = False
+
+    def isconnected(self):
+        return self._s["connected"] and _link_up
+
+    def status(self, param=None):
+        if param is not None:
+            return 0
+        if not self._s["active"]:
+            return STAT_IDLE
+        if not _link_up:
+            return STAT_NO_AP_FOUND
+        return STAT_GOT_IP if self._s["connected"] else STAT_IDLE
+
+    def config(self, *args, **kwargs):
+        if kwargs:
+            self._s["config"].update(kwargs)
+            return None
+        return self._s["config"].get(args[0]) if args else None
+
+    def ifconfig(self, *args):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
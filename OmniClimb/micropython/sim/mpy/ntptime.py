@@ -0,0 +1,21 @@
+"""
+Filename: ntptime.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for lib/ntptime.py. The host clock is already set,
+    so settime() only reports the call.
+"""
+
+import time as _time
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time():
+    return int(_time.time())
+
+
+def settime():
+    print(f"ntptime (sim): using host clock instead of {host}")
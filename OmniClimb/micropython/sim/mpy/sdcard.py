@@ -0,0 +1,169 @@
+"""
+Filename: sdcard.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Simulated SD card with the block device API of upload2pico/sdcard.py
+    (readblocks, writeblocks, the stream_* multi-block writes and the
+    write latency statistics), backed by a sparse in-memory sector store.
+
+    Writes take time according to a configurable latency model, set with
+    configure() before main.py creates the card:
+        cmd_us          per write command (CMD24/CMD25 + busy)
+        block_us        per 512-byte sector programmed
+        read_us         per sector read
+        stall_every     every N sectors written the card stalls once ...
+        stall_us        ... for this long (internal erase/wear levelling)
+    Stalls are deterministic so runs are comparable between commits.
+
+    Files under the mount point live in a host directory (see uos.py);
+    their writes are charged through vfs_write() with the same model.
+"""
+
+from array import array
+
+import utime
+
+_HIST_BUCKETS = 12
+_HIST_SHIFT = 7
+
+_config = {
+    "cmd_us": 250,
+    "block_us": 120,
+    "read_us": 100,
+    "stall_every": 0,
+    "stall_us": 0,
+    "sectors": 15523840,  # 8 GB
+}
+
+
+def configure(**kwargs):
+    """Set latency model parameters (see the module docstring)."""
+    for key, value in kwargs.items():
+        if key not in _config:
+            raise KeyError(f"unknown SD card parameter {key!r}")
+        _config[key] = value
+
+
+# Histogram bucket of a latency, as in upload2pico/sdcard.py
+def _bucket(latency):
+    bucket = 0
+    t = latency >> _HIST_SHIFT
+    while t and bucket < _HIST_BUCKETS - 1:
+        t >>= 1
+        bucket += 1
+    return bucket
+
+
+class SDCard:
+    def __init__(self, spi, cs, baudrate=1320000):
+        self.spi = spi
+        self.cs = cs
+        self.cdv = 1
+        self.sectors = _config["sectors"]
+        self.store = {}
+
+        self.write_hist = array('I', (0 for _ in range(_HIST_BUCKETS)))
+        self.write_max_us = 0
+        self.streaming = False
+        self.stream_block = 0
+        self.stream_end_block = 0
+
+        # Counters for the simulator's own reports. File system writes
+        # (see vfs_write) get their own latency histogram
+        self.sectors_written = 0
+        self.busy_us = 0
+        self.vfs_hist = array('I', (0 for _ in range(_HIST_BUCKETS)))
+        self.vfs_write_max_us = 0
+
+    def _delay(self, us):
+        self.busy_us += us
+        utime.sleep_us(us)
+
+    def _program(self, nblocks):
+        # Time for nblocks sectors, including any stall they run into
+        us = nblocks * _config["block_us"]
+        every = _config["stall_every"]
+        if every:
+            before = self.sectors_written // every
+            after = (self.sectors_written + nblocks) // every
+            us += (after - before) * _config["stall_us"]
+        self.sectors_written += nblocks
+        self._delay(us)
+
+    def readblocks(self, block_num, buf):
+        nblocks, err = divmod(len(buf), 512)
+        assert nblocks and not err, "Buffer length is invalid"
+        if block_num + nblocks > self.sectors:
+            raise OSError(5)  # EIO
+        self._delay(nblocks * _config["read_us"])
+        for i in range(nblocks):
+            data = self.store.get(block_num + i)
+            buf[i * 512:(i + 1) * 512] = data if data else bytes(512)
+
+    def writeblocks(self, block_num, buf):
+        nblocks, err = divmod(len(buf), 512)
+        assert nblocks and not err, "Buffer length is invalid"
+        if self.streaming or block_num + nblocks > self.sectors:
+            raise OSError(5)  # EIO
+        self._delay(_config["cmd_us"])
+        self._program(nblocks)
+        for i in range(nblocks):
+            self.store[block_num + i] = bytes(buf[i * 512:(i + 1) * 512])
+
+    def stream_begin(self, block_num, nblocks):
+        """Open a multi-block write at block_num."""
+        if block_num + nblocks > self.sectors:
+            raise OSError(5)  # EIO
+        self._delay(_config["cmd_us"])
+        self.stream_block = block_num
+        self.stream_end_block = block_num + nblocks
+        self.streaming = True
+
+    def stream_write(self, buf):
+        """Append whole 512-byte sectors to the open multi-block write."""
+        nblocks, err = divmod(len(buf), 512)
+        assert not err, "Buffer length is invalid"
+        if not self.streaming:
+            raise OSError(5)  # EIO
+        hist = self.write_hist
+        for i in range(nblocks):
+            if self.stream_block >= self.stream_end_block:
+                raise OSError(5)  # EIO, past the pre-erased range
+            t_start = utime.ticks_us()
+            self._program(1)
+            self.store[self.stream_block] = bytes(buf[i * 512:(i + 1) * 512])
+            self.stream_block += 1
+            latency = utime.ticks_diff(utime.ticks_us(), t_start)
+            if latency > self.write_max_us:
+                self.write_max_us = latency
+            hist[_bucket(latency)] += 1
+
+    def stream_end(self):
+        """Close the multi-block write."""
+        if self.streaming:
+            self._delay(_config["cmd_us"])
+            self.streaming = False
+
+    def reset_write_stats(self):
+        for i in range(_HIST_BUCKETS):
+            self.write_hist[i] = 0
+        self.write_max_us = 0
+
+    def vfs_write(self, nblocks):
+        """Charge a file system write of nblocks sectors."""
+        if nblocks:
+            t_start = utime.ticks_us()
+            self._delay(_config["cmd_us"])
+            self._program(nblocks)
+            latency = utime.ticks_diff(utime.ticks_us(), t_start)
+            if latency > self.vfs_write_max_us:
+                self.vfs_write_max_us = latency
+            self.vfs_hist[_bucket(latency)] += 1
+
+    def ioctl(self, op, arg):
+        if op == 4:  # get number of blocks
+            return self.sectors
+        if op == 5:  # get block size in bytes
+            return 512
+        return 0
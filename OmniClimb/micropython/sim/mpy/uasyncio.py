@@ -0,0 +1,38 @@
+"""
+Filename: uasyncio.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for MicroPython's uasyncio: the asyncio API plus the
+    MicroPython-only helpers used by the firmware.
+"""
+
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+
+
+def sleep_ms(ms):
+    return _asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag:
+    """Flag that may be set from another thread or an IRQ handler."""
+
+    def __init__(self):
+        self._loop = None
+        self._event = _asyncio.Event()
+
+    def set(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        self._loop = _asyncio.get_running_loop()
+        await self._event.wait()
+        self._event.clear()
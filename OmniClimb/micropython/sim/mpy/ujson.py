@@ -0,0 +1,9 @@
+"""
+Filename: ujson.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for MicroPython's ujson.
+"""
+
+from json import dump, dumps, load, loads  # noqa: F401
@@ -0,0 +1,175 @@
+"""
+Filename: uos.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for MicroPython's uos with a simulated VFS.
+
+    A block device mounted with mount(sd, "/sd") is backed by a host
+    directory, chosen with set_mount_dir() (a temporary directory by
+    default). Paths below a mount point are translated by host_path();
+    sim/run_sim.py routes the builtin open() through open_file() so the
+    firmware's open("/sd/...") calls land there, and every sector a file
+    write completes is charged to the device's latency model.
+"""
+
+import os as _os
+import tempfile as _tempfile
+
+import builtins
+
+_builtin_open = builtins.open
+
+# Mount point -> host directory, and mount point -> mounted device
+_mount_dirs = {}
+_mounts = {}
+
+
+def set_mount_dir(mount_point, host_dir):
+    _os.makedirs(host_dir, exist_ok=True)
+    _mount_dirs[mount_point.rstrip("/")] = host_dir
+
+
+def _mount_of(path):
+    for point in _mounts:
+        if path == point or path.startswith(point + "/"):
+            return point
+    return None
+
+
+def host_path(path):
+    """Host path of a file under a mount point, or None."""
+    if not isinstance(path, str):
+        return None
+    point = _mount_of(path)
+    if point is None:
+        return None
+    rel = path[len(point):].lstrip("/")
+    return _os.path.join(_mount_dirs[point], rel)
+
+
+def _host(path):
+    p = host_path(path)
+    if p is None:
+        raise OSError(2, "ENOENT (not on a simulated mount)", path)
+    return p
+
+
+def mount(device, mount_point, readonly=False):
+    mount_point = mount_point.rstrip("/")
+    if mount_point in _mounts:
+        raise OSError(1, "EPERM")  # already mounted
+    if mount_point not in _mount_dirs:
+        set_mount_dir(mount_point, _tempfile.mkdtemp(prefix="omniclimb-sd-"))
+    _mounts[mount_point] = device
+
+
+def umount(mount_point):
+    if _mounts.pop(mount_point.rstrip("/"), None) is None:
+        raise OSError(22, "EINVAL")
+
+
+def listdir(path="/"):
+    if path in ("", "/"):
+        return [p.lstrip("/") for p in _mounts]
+    return sorted(_os.listdir(_host(path)))
+
+
+def ilistdir(path="/"):
+    base = _host(path)
+    for name in sorted(_os.listdir(base)):
+        kind = 0x4000 if _os.path.isdir(_os.path.join(base, name)) else 0x8000
+        yield (name, kind, 0)
+
+
+def stat(path):
+    st = _os.stat(_host(path))
+    mode = 0x4000 if _os.path.isdir(_host(path)) else 0x8000
+    return (mode, 0, 0, 0, 0, 0, st.st_size, int(st.st_atime),
+            int(st.st_mtime), int(st.st_ctime))
+
+
+def statvfs(path):
+    device = _mounts.get(_mount_of(path))
+    blocks = device.ioctl(4, 0) if device else 0
+    return (512, 512, blocks, blocks, blocks, 0, 0, 0, 0, 255)
+
+
+def remove(path):
+    _os.remove(_host(path))
+
+
+def mkdir(path):
+    _os.mkdir(_host(path))
+
+
+def rmdir(path):
+    _os.rmdir(_host(path))
+
+
+def rename(old, new):
+    _os.rename(_host(old), _host(new))
+
+
+def sync():
+    pass
+
+
+def urandom(n):
+    return _os.urandom(n)
+
+
+def uname():
+    return ("rp2", "rp2", "sim", "sim", "Raspberry Pi Pico W (simulated)")
+
+
+class _CardFile:
+    # Host file that charges completed sectors to the mounted device,
+    # like FatFs flushing its sector buffer to the card
+    def __init__(self, f, device):
+        self._f = f
+        self._device = device
+
+    def _charge(self, start, end):
+        blocks = end // 512 - start // 512
+        if blocks and self._device is not None:
+            self._device.vfs_write(blocks)
+
+    def write(self, data):
+        start = self._f.tell()
+        n = self._f.write(data)
+        self._charge(start, self._f.tell())
+        return n
+
+    def flush(self):
+        if self._f.tell() % 512 and self._device is not None:
+            self._device.vfs_write(1)
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def open_file(path, mode="r", *args, **kwargs):
+    """builtins.open replacement that maps mounted paths to the host."""
+    p = host_path(path)
+    if p is None:
+        return _builtin_open(path, mode, *args, **kwargs)
+    f = _builtin_open(p, mode, *args, **kwargs)
+    if any(c in mode for c in "wa+"):
+        return _CardFile(f, _mounts.get(_mount_of(path)))
+    return f
@@ -0,0 +1,142 @@
+"""
+Filename: usocket.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    MicroPython-style sockets on top of CPython sockets. MicroPython
+    sockets are streams with read()/write(), which umqtt relies on;
+    sim/run_sim.py installs this module as the 'socket' of
+    lib/umqtt/simple.py.
+
+    read(n) blocks until n bytes arrived (or EOF). On a non-blocking
+    socket with no data it returns None instead of raising; write() on a
+    non-blocking socket returns the bytes accepted, or None when the
+    send buffer is full. connect() fails while network.set_link(False)
+    has the simulated access point down.
+
+    TLS is not simulated, but its cost is: with tls_handshake_ms set,
+    wrap_socket() stalls the caller that long, as the Pico's public-key
+    work does, either at once or, with do_handshake=False, in the first
+    write().
+"""
+
+import socket as _socket
+import time
+
+import network
+
+tls_handshake_ms = 0
+
+AF_INET = _socket.AF_INET
+SOCK_STREAM = _socket.SOCK_STREAM
+SOCK_DGRAM = _socket.SOCK_DGRAM
+SOL_SOCKET = _socket.SOL_SOCKET
+SO_REUSEADDR = _socket.SO_REUSEADDR
+IPPROTO_TCP = _socket.IPPROTO_TCP
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    if isinstance(host, bytes):
+        host = host.decode()
+    return _socket.getaddrinfo(host, port, af, type or SOCK_STREAM, proto,
+                               flags)
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, sock=None):
+        self._s = sock if sock is not None else _socket.socket(af, type, proto)
+        self._blocking = True
+        self._handshake_ms = 0
+
+    def connect(self, addr):
+        if not network._link_up:
+            raise OSError(113, "EHOSTUNREACH")
+        self._s.connect(addr)
+
+    def settimeout(self, timeout):
+        self._s.settimeout(timeout)
+        self._blocking = timeout is None or timeout > 0
+
+    def setblocking(self, flag):
+        self._s.setblocking(flag)
+        self._blocking = bool(flag)
+
+    def setsockopt(self, level, opt, value):
+        self._s.setsockopt(level, opt, value)
+
+    def fileno(self):
+        return self._s.fileno()
+
+    def write(self, buf, n=None):
+        if self._handshake_ms:
+            time.sleep(self._handshake_ms / 1000)
+            self._handshake_ms = 0
+        data = memoryview(buf)
+        if n is not None:
+            data = data[:n]
+        if not self._blocking:
+            try:
+                return self._s.send(data)
+            except BlockingIOError:
+                return None
+        self._s.sendall(data)
+        return len(data)
+
+    send = write
+
+    def read(self, n=-1):
+        try:
+            data = self._s.recv(n if n > 0 else 4096)
+        except BlockingIOError:
+            return None
+        except _socket.timeout:
+            raise OSError(110)  # ETIMEDOUT
+        if not data or n <= 0:
+            return data
+        if len(data) < n:
+            # Finish the read blocking, like a MicroPython stream read
+            blocking = self._blocking
+            self._s.setblocking(True)
+            try:
+                while len(data) < n:
+                    chunk = self._s.recv(n - len(data))
+                    if not chunk:
+                        break
+                    data += chunk
+            finally:
+                self._s.setblocking(blocking)
+        return data
+
+    recv = read
+
+    def readinto(self, buf, n=None):
+        data = self.read(n or len(buf))
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def sendto(self, data, addr):
+        return self._s.sendto(data, addr)
+
+    def recv(self, n):
+        return self._s.recv(n)
+
+    def recvfrom(self, n):
+        return self._s.recvfrom(n)
+
+    def bind(self, addr):
+        self._s.bind(addr)
+
+    def close(self):
+        self._s.close()
+
+
+def wrap_socket(sock, server_hostname=None, do_handshake=True, **kwargs):
+    """Stand-in for ssl.wrap_socket: the local broker speaks plain MQTT,
+       so the socket is returned unwrapped, after the handshake stall."""
+    if do_handshake:
+        time.sleep(tls_handshake_ms / 1000)
+    else:
+        sock._handshake_ms = tls_handshake_ms
+    return sock
@@ -0,0 +1,100 @@
+"""
+Filename: utime.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    CPython stand-in for the MicroPython utime module used by the desktop
+    simulator (see sim/run_sim.py).
+
+    Ticks wrap at 2**30 like on the RP2040, so ticks_diff/ticks_add
+    handling in the firmware is exercised. sleep_us() finishes with a
+    short spin because a plain time.sleep() overshoots by tens of us on
+    Linux, while the Pico's sleep_us() is a busy wait.
+
+    set_clock_error() makes the ticks run fast or slow by some ppm, like
+    the Pico's crystal against the hub PC's clock, so the drift estimate
+    in timebase.py can be tried out.
+"""
+
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+# Spin for the last part of a sleep shorter than this (s)
+_SPIN_S = 0.0002
+
+_epoch = _time.monotonic()
+_rate = 1.0
+
+
+def set_clock_error(ppm):
+    global _rate
+    _rate = 1.0 + ppm * 1e-6
+
+
+def ticks_ms():
+    return int((_time.monotonic() - _epoch) * _rate * 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return int((_time.monotonic() - _epoch) * _rate * 1000000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def _sleep_s(seconds):
+    if seconds <= 0:
+        return
+    deadline = _time.perf_counter() + seconds
+    if seconds > _SPIN_S:
+        _time.sleep(seconds - _SPIN_S)
+    while _time.perf_counter() < deadline:
+        pass
+
+
+def sleep(seconds):
+    _sleep_s(seconds)
+
+
+def sleep_ms(ms):
+    _sleep_s(ms / 1000)
+
+
+def sleep_us(us):
+    _sleep_s(us / 1000000)
+
+
+def time():
+    return int(_time.time())
+
+
+def time_ns():
+    return _time.time_ns()
+
+
+def localtime(secs=None):
+    t = _time.localtime(secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec,
+            t.tm_wday, t.tm_yday)
+
+
+def gmtime(secs=None):
+    t = _time.gmtime(secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec,
+            t.tm_wday, t.tm_yday)
+
+
+def mktime(t):
+    return int(_time.mktime(tuple(t[:6]) + (0, 0, -1)))
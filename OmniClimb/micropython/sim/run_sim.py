@@ -0,0 +1,651 @@
+"""
+Filename: run_sim.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Runs the unmodified upload2pico/main.py on a Linux/macOS/Windows box
+    against simulated hardware, and reports recording throughput.
+
+    The firmware imports the CPython stand-ins in sim/mpy/ (machine,
+    network, utime, uos, uasyncio, sdcard, ...) ahead of its own modules.
+    A fake ADS1115 (fakeads.py) sits on the simulated I2C buses for every
+    entry of config_record.adcs, with its ALERT/RDY line on that entry's
+    GPIO, the SD card is a latency-modelled block device whose files live
+    in a host directory, and MQTT goes to a local broker (broker.py) on a
+    free port. A probe client plays the Node-RED
+    hub: it waits for the Pico to boot, starts a recording, collects the
+    periodic status messages, stops the recording and ends the run.
+
+    The SD card's files are kept on the host file system, so locate() in
+    sdstream.py finds no FAT32 volume and binary recordings take the VFS
+    write path; the latency model applies to both paths.
+
+    Recording parameters come from upload2pico/config_record.py and can
+    be overridden per run with --set (see bench.py for sweeps). Host-side
+    garbage collection is timed and reported, since CPython GC pauses
+    stall the simulated cores like MicroPython's would on the Pico.
+
+    Usage:
+        python run_sim.py --duration 20
+        python run_sim.py --duration 60 --format csv --sd-stall-every 256 \\
+            --sd-stall-us 80000 --json
+        python run_sim.py --set sample_interval_ms=10 --set channel_map=0,1
+        python run_sim.py --set "adcs=((0,0x48,18),(1,0x49,19))" \
+            --set "channel_map=(0,1,2,3,4,5,6,7)"
+        python run_sim.py --metrics-ms 2000 --json
+        python run_sim.py --duration 60 --outage 10:15 --outage 40:3
+        python run_sim.py --duration 40 --broker-outage 10:15 \
+            --tls-handshake-ms 300 --json
+        python run_sim.py --upload tcp --json
+        python run_sim.py --start-delay-ms 3000 --json
+        python run_sim.py --idle-s 90 --resync-s 10 --clock-ppm 40 --json
+        python run_sim.py --duration 60 --signal climb \
+            --set "trigger_columns=(1,2,3)" --json
+
+    --outage takes the access point down, --broker-outage leaves the
+    link up but the broker silent, so the Pico's reconnects run into
+    their timeouts. --tls-handshake-ms stalls each connect for the TLS
+    public-key work; the report gives the longest step a connect held
+    Core 0 (mqtt_connect_block_max_us).
+
+    With --upload the hub then asks the Pico to upload the recording
+    (upload_recording) to host/collect_uploads.py's Collector, over MQTT
+    through the probe or over TCP, and checks the copy against the card.
+    With --start-delay-ms the start command names a start_at instant that
+    far ahead, and the report gives how far the first sample's anchor was
+    from it.
+
+    The Pico syncs its time base to host/time_server.py's SntpServer on a
+    free local port. --clock-ppm makes the simulated ticks run fast or
+    slow, and --idle-s keeps the Pico idle before the recording so it
+    resyncs every --resync-s seconds and estimates the drift; the report
+    gives the last sync's residual, round trip and drift.
+"""
+
+import argparse
+import ast
+import builtins
+import contextlib
+import gc
+import io
+import json
+import os
+import runpy
+import ssl
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+import _thread
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+MPY_DIR = os.path.join(SIM_DIR, "mpy")
+FIRMWARE_DIR = os.path.join(os.path.dirname(SIM_DIR), "upload2pico")
+HOST_DIR = os.path.join(os.path.dirname(os.path.dirname(SIM_DIR)), "host")
+
+PICO_ID = "pico-sim"
+COMMAND_TOPIC = "pico/all/cmd"
+# Simulated heap for gc.mem_free(). CPython objects are larger than
+# MicroPython's, so heap figures from the simulator only show trends
+SIM_HEAP_BYTES = 1024 * 1024
+
+
+def _print_exception(exc, file=None):
+    traceback.print_exception(type(exc), exc, exc.__traceback__,
+                              file=file or sys.stdout)
+
+
+class GcTimer:
+    """Times CPython garbage collections through gc.callbacks."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self._t_start = None
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._t_start = time.perf_counter()
+        elif self._t_start is not None:
+            pause = time.perf_counter() - self._t_start
+            self._t_start = None
+            self.count += 1
+            self.total_s += pause
+            self.max_s = max(self.max_s, pause)
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self._callback)
+
+
+def parse_setting(text):
+    """'key=value' of a --set option, the value as a Python literal
+       (so channel_map=0,1 is a tuple; a single channel is 0,)."""
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {text!r}")
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass  # plain string such as adc_mode=single
+    return key, value
+
+
+def parse_outage(text):
+    """'start:seconds' of an --outage option."""
+    try:
+        start, length = (float(v) for v in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected START:SECONDS, got {text!r}")
+    return start, length
+
+
+def record_config(overrides=None):
+    """Module object for the firmware's 'import config_record': the
+       defaults in upload2pico/config_record.py with overrides applied."""
+    config = types.ModuleType("config_record")
+    with io.open(os.path.join(FIRMWARE_DIR, "config_record.py")) as f:
+        exec(f.read(), config.__dict__)
+    for key, value in (overrides or {}).items():
+        if not hasattr(config, key):
+            raise KeyError(f"unknown recording parameter {key!r}")
+        setattr(config, key, value)
+    return config
+
+
+def install(card_dir, broker_port, sd_params=None, ads_params=None,
+            record_params=None, time_port=None, time_params=None,
+            tls_handshake_ms=0):
+    """Put the simulated MicroPython environment in place. Returns the
+       fake ADS1115s."""
+    for path in (FIRMWARE_DIR, MPY_DIR, SIM_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # Firmware stand-ins must win over same-named firmware files
+    sys.path.remove(MPY_DIR)
+    sys.path.insert(0, MPY_DIR)
+
+    # Threads hand over the GIL quickly, as the Pico's cores run in parallel
+    sys.setswitchinterval(0.0005)
+    if not hasattr(sys, "print_exception"):
+        sys.print_exception = _print_exception
+
+    import machine
+    import sdcard
+    import uos
+    import usocket
+    import utime
+    from fakeads import SIGNALS, FakeADS1115
+
+    builtins.open = uos.open_file
+    # MicroPython's heap queries, for metrics.py. Objects the host had
+    # allocated before the firmware started do not count
+    heap_base = sys.getallocatedblocks()
+    gc.mem_alloc = lambda: max(0, sys.getallocatedblocks() - heap_base) * 16
+    gc.mem_free = lambda: max(0, SIM_HEAP_BYTES - gc.mem_alloc())
+    uos.set_mount_dir("/sd", card_dir)
+
+    # umqtt speaks to MicroPython stream sockets; TLS is not simulated
+    ssl.wrap_socket = usocket.wrap_socket
+    usocket.tls_handshake_ms = tls_handshake_ms
+    import lib.umqtt.simple
+    import mqttconnect
+    lib.umqtt.simple.socket = usocket
+    mqttconnect.socket = usocket
+
+    config_mqtt = types.ModuleType("config_mqtt")
+    config_mqtt.clientID = PICO_ID
+    config_mqtt.server = b"127.0.0.1"
+    config_mqtt.port = broker_port
+    config_mqtt.username = b"sim"
+    config_mqtt.password = b"sim"
+    sys.modules["config_mqtt"] = config_mqtt
+    config_wifi = types.ModuleType("config_wifi")
+    config_wifi.ssid = "sim"
+    config_wifi.password = "sim"
+    sys.modules["config_wifi"] = config_wifi
+    sys.modules["config_record"] = record_config(record_params)
+    time_params = time_params or {}
+    utime.set_clock_error(time_params.get("clock_ppm", 0.0))
+    config_time = types.ModuleType("config_time")
+    config_time.servers = (("127.0.0.1", time_port),) if time_port else ()
+    config_time.samples = 8
+    config_time.resync_interval_s = time_params.get("resync_s", 60)
+    sys.modules["config_time"] = config_time
+
+    sdcard.configure(**(sd_params or {}))
+    ads_params = dict(ads_params or {})
+    if isinstance(ads_params.get("signal"), str):
+        ads_params["signal"] = SIGNALS[ads_params["signal"]]
+    ads = []
+    for n, (bus, address, alert_pin) in enumerate(
+            sys.modules["config_record"].adcs):
+        fake = FakeADS1115(alert_pin=alert_pin, seed=n, **ads_params)
+        machine.attach_i2c(address, fake, bus)
+        ads.append(fake)
+    return ads
+
+
+def recording_stats(path, record_format):
+    """(samples, first timestamp, last timestamp) of a finished recording,
+       or None if it cannot be read."""
+    try:
+        if record_format == "csv":
+            with io.open(path) as f:
+                # Skip the '#anchor' line in front of each frame
+                rows = [line.split(",", 1)[0] for line in f
+                        if line.strip() and not line.startswith("#")]
+            return (len(rows), int(rows[0]), int(rows[-1])) if rows else None
+        # Compressed frames (framecodec.py) need the host decoder
+        if HOST_DIR not in sys.path:
+            sys.path.insert(0, HOST_DIR)
+        import decode_recording
+        header, data = decode_recording.read_recording(path)
+        footer = header.get("footer")
+        if footer is None or not len(data):
+            return None
+        ticks = data[:, 0] % (1 << 30)
+        return len(data), int(ticks[0]), int(ticks[-1])
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+
+class Hub(threading.Thread):
+    """Probe client playing the Node-RED hub for one recording."""
+
+    def __init__(self, probe, duration, filename, record_format,
+                 metrics_interval_ms=None, broker=None, outages=(),
+                 upload=None, upload_dir=None, start_delay_ms=None,
+                 idle_s=0, boot_timeout=30, broker_outages=()):
+        super().__init__(daemon=True, name="sim-hub")
+        self.probe = probe
+        self.duration = duration
+        self.filename = filename
+        self.record_format = record_format
+        self.metrics_interval_ms = metrics_interval_ms
+        self.broker = broker
+        # (start, seconds, link down) per outage
+        self.outages = sorted([(s, n, True) for s, n in outages] +
+                              [(s, n, False) for s, n in broker_outages])
+        self.upload = upload
+        self.upload_dir = upload_dir
+        self.collector = None
+        self.start_delay_ms = start_delay_ms
+        self.start_at = None
+        self.idle_s = idle_s
+        self.boot_timeout = boot_timeout
+        self.statuses = []
+        self.metrics = []
+        self.events = {}
+        self.error = None
+
+    def _pump(self, until, stop_on=None):
+        # Collect messages until 'until' or until an event named stop_on
+        while time.monotonic() < until:
+            msg = self.probe.wait_for(lambda m: True,
+                                      until - time.monotonic())
+            if msg is None:
+                return False
+            t, topic, payload = msg
+            if topic.endswith("/upload"):
+                self.collector.handle(PICO_ID, payload)
+                continue
+            try:
+                status = json.loads(payload)
+            except ValueError:
+                status = payload.decode(errors="replace")
+            if topic.endswith("/metrics"):
+                self.metrics.append((t, status))
+                continue
+            if isinstance(status, dict):
+                self.statuses.append((t, status))
+                name = status.get("status")
+            else:
+                name = status
+            self.events.setdefault(name, t)
+            if name == stop_on:
+                return True
+        return False
+
+    def run(self):
+        import network
+        try:
+            probe = self.probe
+            probe.subscribe(f"pico/{PICO_ID}/status")
+            if not self._pump(time.monotonic() + self.boot_timeout,
+                              "booted_up"):
+                raise RuntimeError("Pico did not boot")
+            if self.metrics_interval_ms:
+                probe.subscribe(f"pico/{PICO_ID}/metrics")
+                probe.publish(COMMAND_TOPIC, json.dumps({
+                    "command": "metrics",
+                    "interval_ms": self.metrics_interval_ms,
+                }))
+            self._pump(time.monotonic() + self.idle_s)
+            command = {
+                "command": "start_recording",
+                "filename": self.filename,
+                "format": self.record_format,
+            }
+            if self.start_delay_ms is not None:
+                # Fleet-wide start instant on the host's clock
+                self.start_at = (time.time_ns() // 1000000 +
+                                 self.start_delay_ms)
+                command["start_at"] = self.start_at
+            probe.publish(COMMAND_TOPIC, json.dumps(command))
+            t_start = time.monotonic()
+            for start, length, link in self.outages:
+                # Access point gone (link) or broker hung: either way the
+                # Pico's broker connection drops
+                self._pump(t_start + start)
+                if link:
+                    network.set_link(False)
+                else:
+                    self.broker.silent = True
+                self.broker.drop_client(PICO_ID)
+                self._pump(t_start + start + length)
+                network.set_link(True)
+                self.broker.silent = False
+            self._pump(t_start + self.duration)
+            probe.publish(COMMAND_TOPIC,
+                          json.dumps({"command": "stop_recording"}))
+            self.events["stop_sent"] = time.monotonic()
+            self._pump(time.monotonic() + 30, "idle_sd_ready")
+            if self.upload:
+                self._upload()
+        except Exception as e:
+            self.error = e
+        finally:
+            _thread.interrupt_main()
+
+    def _upload(self):
+        # Fetch the recording the way collect_uploads.py would
+        if HOST_DIR not in sys.path:
+            sys.path.insert(0, HOST_DIR)
+        from collect_uploads import Collector, serve_tcp
+        self.collector = Collector(self.upload_dir, verbose=False)
+        command = {"command": "upload_recording", "filename": self.filename,
+                   "session": "sim", "transport": self.upload}
+        server = None
+        if self.upload == "tcp":
+            server = serve_tcp(self.collector, "127.0.0.1", 0)
+            command["host"], command["port"] = server.server_address
+        else:
+            self.probe.subscribe(f"pico/{PICO_ID}/upload")
+        self.events["upload_sent"] = time.monotonic()
+        self.probe.publish(COMMAND_TOPIC, json.dumps(command))
+        try:
+            self._pump(time.monotonic() + 120, "upload_done")
+        finally:
+            if server is not None:
+                server.shutdown()
+
+
+def start_report(hub, card_dir):
+    """Scheduled start fields of the report: the epoch anchor of the first
+       sample against the requested start_at."""
+    if hub.start_at is None:
+        return {}
+    anchor = None
+    try:
+        with io.open(os.path.join(card_dir, hub.filename), "rb") as f:
+            data = f.read(1024)
+        if hub.record_format == "csv":
+            line = data.split(b"\n", 1)[0].decode()
+            anchor = int(line.split(",")[2])
+        elif data[4] >= 4:
+            anchor, = struct.unpack_from("<q", data, 512 + 20)
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
+    return {
+        "start_at": hub.start_at,
+        "start_error_ms": anchor - hub.start_at if anchor else None,
+    }
+
+
+def time_report(hub, server):
+    """Time base fields of the report, from the last status message."""
+    synced = [s for _, s in hub.statuses if s.get("time_sync")]
+    if not synced:
+        return {"time_source": None}
+    residual_us, delay_us, drift_ppb, age_s = synced[-1]["time_sync"]
+    return {
+        "time_source": synced[-1]["time_source"],
+        "time_requests": server.requests,
+        "time_residual_us": residual_us,
+        "time_delay_us": delay_us,
+        "time_drift_ppb": drift_ppb,
+        "time_sync_age_s": age_s,
+    }
+
+
+def upload_report(hub, stats):
+    """Upload fields of the report: bytes, time and whether the uploaded
+       copy holds the same samples as the card."""
+    if not hub.upload:
+        return {}
+    sent = hub.events.get("upload_sent")
+    done = hub.events.get("upload_done")
+    path = os.path.join(hub.upload_dir, "sim", PICO_ID, hub.filename)
+    copy = (recording_stats(path, hub.record_format)
+            if os.path.exists(path) else None)
+    return {
+        "upload": hub.upload,
+        "upload_bytes": os.path.getsize(path) if copy else None,
+        "upload_s": round(done - sent, 3) if sent and done else None,
+        "upload_matches": copy is not None and copy == stats,
+    }
+
+
+def summarize(hub, fw, ads, card_dir, gc_timer):
+    """Throughput report of one simulated recording."""
+    started = hub.events.get("recording_started")
+    stopped = hub.events.get("stop_sent")
+    duration = stopped - started if started and stopped else None
+    stats = recording_stats(os.path.join(card_dir, hub.filename),
+                            hub.record_format)
+    samples = stats[0] if stats else None
+    # Rate over the stored samples' own timestamps (ticks_ms, wrapping)
+    span_ms = ((stats[2] - stats[1]) % (1 << 30)) if stats else 0
+    interval_ms = fw["_SAMPLE_INTERVAL_MS"]
+    per_frame = fw["_SAMPLES_PER_FRAME"]
+
+    recording = [s for _, s in hub.statuses
+                 if s.get("status") == "recording_active"]
+    jitter = [s["jitter_us"] for s in recording if s.get("jitter_us")]
+    sd = fw["sd"]
+    ring = fw["frame_ring"]
+    return {
+        "format": hub.record_format,
+        "sample_interval_ms": interval_ms,
+        "channels": len(fw["_CHANNEL_MAP"]),
+        "samples_per_frame": per_frame,
+        "adc_mode": fw["adc_mode"],
+        "adc_rate": fw["_ADC_RATE"],
+        "duration_s": round(duration, 3) if duration else None,
+        "samples_written": samples,
+        "target_samples_per_s": 1000 / interval_ms,
+        # Achieved rate of the stored samples; partial frames at stop are
+        # discarded by the firmware, so this is not samples / duration
+        "samples_per_s": (round((samples - 1) * 1000 / span_ms, 2)
+                          if span_ms else None),
+        "frames_per_s": (round(samples / per_frame / duration, 3)
+                         if samples is not None and duration else None),
+        "dropped_frames": ring.dropped,
+        "queue_high_water": ring.high_water,
+        "missed_samples": fw["sample_clock"].missed,
+        "jitter_us": ([min(j[0] for j in jitter),
+                       round(sum(j[1] for j in jitter) / len(jitter)),
+                       max(j[2] for j in jitter)] if jitter else None),
+        "sd_write_hist": list(sd.write_hist),
+        "sd_write_max_us": sd.write_max_us,
+        "sd_sectors_written": sd.sectors_written,
+        "sd_busy_ms": sd.busy_us // 1000,
+        "sd_vfs_write_hist": list(sd.vfs_hist),
+        "sd_vfs_write_max_us": sd.vfs_write_max_us,
+        "host_gc_count": gc_timer.count,
+        "host_gc_ms": round(gc_timer.total_s * 1000, 1),
+        "host_gc_max_ms": round(gc_timer.max_s * 1000, 2),
+        "adc_conversions": sum(fake.conversions for fake in ads),
+        "status_messages": len(hub.statuses),
+        "metrics_messages": len(hub.metrics),
+        "last_metrics": hub.metrics[-1][1] if hub.metrics else None,
+        # [capture running, captures, frames skipped] in trigger mode
+        "trigger": next((s["trigger"] for s in reversed(recording)
+                         if s.get("trigger")), None),
+        **start_report(hub, card_dir),
+        **upload_report(hub, stats),
+    }
+
+
+def run(duration=10.0, record_format=None, card_dir=None, sd_params=None,
+        ads_params=None, record_params=None, metrics_interval_ms=None,
+        outages=(), upload=None, start_delay_ms=None, time_params=None,
+        idle_s=0, broker_outages=(), tls_handshake_ms=0, quiet=True):
+    """Simulate one recording of 'duration' seconds and return the report.
+       Runs main.py in this process, so call it once per process."""
+    from broker import Broker, Probe
+    if HOST_DIR not in sys.path:
+        sys.path.insert(0, HOST_DIR)
+    from time_server import SntpServer
+
+    card_dir = card_dir or tempfile.mkdtemp(prefix="omniclimb-sd-")
+    broker = Broker().start()
+    time_server = SntpServer("127.0.0.1", 0).start()
+    ads = install(card_dir, broker.port, sd_params, ads_params,
+                  record_params, time_server.port, time_params,
+                  tls_handshake_ms)
+    record_format = (record_format or
+                     sys.modules["config_record"].record_format)
+    probe = Probe(broker.port)
+    hub = Hub(probe, duration, f"sim_{int(time.time())}.{record_format}",
+              record_format, metrics_interval_ms, broker, outages, upload,
+              tempfile.mkdtemp(prefix="omniclimb-upload-"), start_delay_ms,
+              idle_s, broker_outages=broker_outages)
+    hub.start()
+
+    out = io.StringIO() if quiet else sys.stdout
+    fw = {}
+    gc_timer = GcTimer()
+    try:
+        with contextlib.redirect_stdout(out), gc_timer:
+            fw = runpy.run_path(os.path.join(FIRMWARE_DIR, "main.py"),
+                                run_name="__main__")
+    except KeyboardInterrupt:
+        pass
+    hub.join(5)
+    probe.close()
+    broker.stop()
+    time_server.stop()
+    if hub.error is None and not fw:
+        hub.error = "main.py exited before the recording finished"
+    if hub.error is not None:
+        if quiet:
+            sys.stderr.write(out.getvalue()[-4000:])
+        raise RuntimeError(f"simulation failed: {hub.error}")
+    report = summarize(hub, fw, ads, card_dir, gc_timer)
+    report["mqtt_reconnects"] = fw["metrics"].reconnects
+    report["mqtt_connect_block_max_us"] = fw["connector"].block_max_us
+    report.update(time_report(hub, time_server))
+    report["card_dir"] = card_dir
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run upload2pico/main.py against simulated hardware.")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="recording length in seconds")
+    parser.add_argument("--format", choices=("bin", "csv"),
+                        help="recording format (default: config_record)")
+    parser.add_argument("--card-dir", help="host directory backing /sd")
+    parser.add_argument("--sd-cmd-us", type=int, default=250)
+    parser.add_argument("--sd-block-us", type=int, default=120)
+    parser.add_argument("--sd-stall-every", type=int, default=0,
+                        help="sectors between card stalls (0 = none)")
+    parser.add_argument("--sd-stall-us", type=int, default=0)
+    parser.add_argument("--adc-clock-error", type=float, default=0.0)
+    parser.add_argument("--signal", choices=("pulls", "climb"),
+                        default="pulls",
+                        help="ADC input profile (see fakeads.py)")
+    parser.add_argument("--set", type=parse_setting, action="append",
+                        default=[], metavar="KEY=VALUE",
+                        help="override a config_record.py parameter")
+    parser.add_argument("--metrics-ms", type=int,
+                        help="enable the firmware's metrics messages at "
+                             "this interval")
+    parser.add_argument("--outage", type=parse_outage, action="append",
+                        default=[], metavar="START:SECONDS",
+                        help="take the access point down START seconds "
+                             "into the recording for SECONDS")
+    parser.add_argument("--broker-outage", type=parse_outage,
+                        action="append", default=[], metavar="START:SECONDS",
+                        help="leave the link up but make the broker "
+                             "unresponsive START seconds into the "
+                             "recording for SECONDS")
+    parser.add_argument("--tls-handshake-ms", type=int, default=0,
+                        help="stall each MQTT connect this long for the "
+                             "simulated TLS handshake")
+    parser.add_argument("--upload", choices=("mqtt", "tcp"),
+                        help="upload the recording to a host collector "
+                             "after it stops")
+    parser.add_argument("--start-delay-ms", type=int,
+                        help="schedule the start this far ahead with "
+                             "start_at")
+    parser.add_argument("--clock-ppm", type=float, default=0.0,
+                        help="Pico clock error against the host (ppm)")
+    parser.add_argument("--resync-s", type=int, default=60,
+                        help="time base resync interval while idle")
+    parser.add_argument("--idle-s", type=float, default=0,
+                        help="stay idle this long before the recording")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the firmware's console output")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args()
+    try:
+        record_config(dict(args.set))
+    except KeyError as e:
+        parser.error(e.args[0])
+
+    report = run(
+        duration=args.duration,
+        record_format=args.format,
+        card_dir=args.card_dir,
+        sd_params={
+            "cmd_us": args.sd_cmd_us,
+            "block_us": args.sd_block_us,
+            "stall_every": args.sd_stall_every,
+            "stall_us": args.sd_stall_us,
+        },
+        ads_params={"clock_error": args.adc_clock_error,
+                    "signal": args.signal},
+        record_params=dict(args.set),
+        metrics_interval_ms=args.metrics_ms,
+        outages=args.outage,
+        broker_outages=args.broker_outage,
+        tls_handshake_ms=args.tls_handshake_ms,
+        upload=args.upload,
+        start_delay_ms=args.start_delay_ms,
+        time_params={"clock_ppm": args.clock_ppm,
+                     "resync_s": args.resync_s},
+        idle_s=args.idle_s,
+        quiet=not args.verbose,
+    )
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Filename: adcbank.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Up to four ADS1115s (addresses 0x48 to 0x4B, on one or both I2C
+    buses) sampled as one ADC, for holds with more than four FSRs.
+
+    A channel in the channel map is 4 * chip + input, where chip is the
+    position in config_record.adcs: (0, 1, 2, 3) is the single ADS1115 of
+    a standard hold, (0, 1, ..., 7) two of them. Values land in the frame
+    columns in channel map order, whichever chip they come from.
+
+    The chips always convert in parallel, so adding one does not lower
+    the rate of the others:
+        continuous  every chip free-runs its own mux scan, driven by its
+                    ALERT/RDY interrupt (ADS1115.scan_start); a sample
+                    copies the latest value of each column
+        single      one conversion is started on every chip. After one
+                    conversion time each chip's result is read and its
+                    next conversion started right away (read_rev), in the
+                    same chip order. A sample takes as many conversion
+                    times as the busiest chip has inputs, not as many as
+                    the bank has channels, and every channel costs two
+                    register transfers since nothing is polled
+"""
+
+import utime
+from utime import ticks_us, ticks_diff
+
+_INPUTS = 4  # single-ended inputs per ADS1115
+_SPS = (8, 16, 32, 64, 128, 250, 475, 860)  # by data rate index
+
+
+class AdcBank:
+    def __init__(self, chips, alert_pins, channel_map, rate):
+        self.chips = chips
+        self.alert_pins = alert_pins
+        self.rate = rate
+        self.gain = chips[0].gain
+        # Per chip: the inputs it scans and the frame column of each
+        self.inputs = [[] for _ in chips]
+        self.columns = [[] for _ in chips]
+        for column, channel in enumerate(channel_map):
+            chip, ain = divmod(channel, _INPUTS)
+            if chip >= len(chips):
+                raise ValueError(f"channel {channel} needs ADS1115 "
+                                 f"#{chip}, only {len(chips)} configured")
+            self.inputs[chip].append(ain)
+            self.columns[chip].append(column)
+        self.used = [i for i in range(len(chips)) if self.inputs[i]]
+        # Single-shot plan: per step, (chip, column, config of its next
+        # conversion or None) for every chip converting in that step
+        configs = [[chips[i].config_word(rate, ain)
+                    for ain in self.inputs[i]] for i in range(len(chips))]
+        steps = max(len(self.inputs[i]) for i in self.used)
+        self.first = tuple((chips[i], configs[i][0]) for i in self.used)
+        self.plan = [tuple((chips[i], self.columns[i][step],
+                            configs[i][step + 1]
+                            if step + 1 < len(configs[i]) else None)
+                           for i in self.used if step < len(configs[i]))
+                     for step in range(steps)]
+        self.conv_us = chips[0].conversion_us(rate)
+        self.sources = None  # (scan_values, index) per column, continuous
+        self.continuous = False
+        self.timing = None  # per-column histograms, see set_timing
+
+    def start_continuous(self):
+        """Start the RDY-driven scan on every chip in use. Returns False,
+           with all chips stopped, if one of them does not pulse its
+           ALERT/RDY pin (or has none)."""
+        for i in self.used:
+            if self.alert_pins[i] is None:
+                return False
+        for i in self.used:
+            self.chips[i].scan_start(self.alert_pins[i], self.inputs[i],
+                                     rate=self.rate)
+        # Allow for two full sweeps of the busiest chip
+        utime.sleep_ms(2000 * len(self.plan) // _SPS[self.rate] + 1)
+        if not all(self.chips[i].scan_count for i in self.used):
+            self.stop()
+            return False
+        sources = [None] * sum(len(c) for c in self.columns)
+        for i in self.used:
+            for index, column in enumerate(self.columns[i]):
+                sources[column] = (self.chips[i].scan_values, index)
+        self.sources = sources
+        self.continuous = True
+        self.set_timing(self.timing)
+        return True
+
+    def stop(self):
+        """Stop any scan and power the chips down."""
+        for i in self.used:
+            if self.chips[i].scan_pin is not None:
+                self.chips[i].scan_stop()
+        self.continuous = False
+
+    def set_timing(self, timing):
+        """Attach per-column I2C time histograms (None detaches). In
+           continuous mode the RDY interrupts fill them."""
+        self.timing = timing
+        for i in self.used:
+            self.chips[i].scan_timing = (
+                None if timing is None else
+                [timing[column] for column in self.columns[i]])
+
+    def read_into(self, buf, offset):
+        """Store one sample of every column at buf[offset:].
+
+           This is the single-shot scan of the driver: ADS1115 only
+           provides the register steps (config_word, write_config,
+           read_rev, alert_read), so the chips of the bank can be
+           interleaved instead of scanned one after another."""
+        if self.continuous:
+            for column, (values, index) in enumerate(self.sources):
+                buf[offset + column] = values[index]
+            return
+        timing = self.timing
+        conv_us = self.conv_us
+        # t_step is when the first chip's conversion of a step started. The
+        # chips are read in the order they were started, so its conversion
+        # time covers them all
+        started = False
+        for chip, config in self.first:
+            chip.write_config(config)
+            if not started:
+                t_step = ticks_us()
+                started = True
+        for step in self.plan:
+            remaining = conv_us - ticks_diff(ticks_us(), t_step)
+            if remaining > 0:
+                utime.sleep_us(remaining)
+            started = False
+            for chip, column, config in step:
+                if timing is not None:
+                    t_read = ticks_us()
+                buf[offset + column] = (chip.alert_read() if config is None
+                                        else chip.read_rev(config))
+                if timing is not None:
+                    timing[column].add(ticks_diff(ticks_us(), t_read))
+                if not started:
+                    t_step = ticks_us()
+                    started = True
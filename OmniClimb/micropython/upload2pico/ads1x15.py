@@ -22,6 +22,8 @@
 # THE SOFTWARE.
 #
 import utime as time
+from array import array
+from machine import Pin
 from micropython import const
 
 _REGISTER_MASK = const(0x03)
@@ -126,6 +128,11 @@ _RATES = (
     _DR_860SPS    # - /860 samples per Second
 )
 
+# Longest conversion time in us by rate index: the internal oscillator
+# may run 10 % slow, plus the wakeup from power-down
+_CONV_US = tuple(1100000 // sps + 50
+                 for sps in (8, 16, 32, 64, 128, 250, 475, 860))
+
 
 class ADS1115:
     def __init__(self, i2c, address=0x48, gain=1):
@@ -133,6 +140,9 @@ class ADS1115:
         self.address = address
         self.gain = gain
         self.temp2 = bytearray(2)
+        self.scan_buf = bytearray(2)
+        self.scan_pin = None
+        self.scan_timing = None
 
     def _write_register(self, register, value):
         self.temp2[0] = value >> 8
@@ -166,13 +176,30 @@ class ADS1115:
         res = self._read_register(_REGISTER_CONVERT)
         return res if res < 32768 else res - 65536
 
-    def read_rev(self):
+    def read_rev(self, config=None):
         """Read voltage between a channel and GND. and then start
-           the next conversion."""
+           the next conversion, with config (see config_word) or the mode
+           of set_conv."""
         res = self._read_register(_REGISTER_CONVERT)
-        self._write_register(_REGISTER_CONFIG, self.mode)
+        self._write_register(_REGISTER_CONFIG,
+                             self.mode if config is None else config)
         return res if res < 32768 else res - 65536
 
+    def config_word(self, rate=4, channel1=0, channel2=None):
+        """Config register value that starts a single-shot conversion,
+           for write_config and read_rev."""
+        return (_CQUE_NONE | _CLAT_NONLAT | _CPOL_ACTVLOW | _CMODE_TRAD |
+                _RATES[rate] | _MODE_SINGLE | _OS_SINGLE | _GAINS[self.gain] |
+                _CHANNELS[(channel1, channel2)])
+
+    def write_config(self, config):
+        """Write the config register, e.g. to start a conversion."""
+        self._write_register(_REGISTER_CONFIG, config)
+
+    def conversion_us(self, rate=4):
+        """Time after which a single-shot conversion is surely done."""
+        return _CONV_US[rate]
+
     def alert_start(self, rate=4, channel1=0, channel2=None,
                     threshold_high=0x4000, threshold_low=0, latched=False) :
         """Start continuous measurement, set ALERT pin on threshold."""
@@ -198,6 +225,60 @@ class ADS1115:
         res = self._read_register(_REGISTER_CONVERT)
         return res if res < 32768 else res - 65536
 
+    def scan_start(self, pin, channels=(0, 1, 2, 3), rate=7):
+        """Continuously convert a list of single-ended channels.
+           The comparator is set up as a conversion-ready signal and a
+           falling edge on ALERT/RDY (connected to pin) collects the
+           result and rotates the mux to the next channel. The latest
+           value of each channel is kept in scan_values. If scan_timing
+           is set to a list with one histogram per channel, the I2C time
+           of each conversion is added to its channel's histogram."""
+        self.scan_configs = tuple(_CQUE_1CONV | _CLAT_NONLAT |
+                                  _CPOL_ACTVLOW | _CMODE_TRAD | _RATES[rate] |
+                                  _MODE_CONTIN | _GAINS[self.gain] |
+                                  _CHANNELS[(channel, None)]
+                                  for channel in channels)
+        self.scan_values = array('h', (0 for _ in channels))
+        self.scan_index = 0
+        self.scan_count = 0  # completed sweeps over all channels
+        self.scan_pin = pin
+        # MSB of HI_THRESH set and LO_THRESH clear enables RDY mode
+        self._write_register(_REGISTER_LOWTHRESH, 0)
+        self._write_register(_REGISTER_HITHRESH, 0x8000)
+        pin.irq(trigger=Pin.IRQ_FALLING, handler=self._scan_irq)
+        self._write_register(_REGISTER_CONFIG, self.scan_configs[0])
+
+    def _scan_irq(self, pin):
+        # Soft IRQ: runs scheduled, so I2C access is allowed here
+        buf = self.scan_buf
+        timing = self.scan_timing
+        if timing is not None:
+            t_start = time.ticks_us()
+        self.i2c.readfrom_mem_into(self.address, _REGISTER_CONVERT, buf)
+        idx = channel = self.scan_index
+        res = (buf[0] << 8) | buf[1]
+        self.scan_values[idx] = res if res < 32768 else res - 65536
+        idx += 1
+        if idx == len(self.scan_configs):
+            idx = 0
+            self.scan_count += 1
+        self.scan_index = idx
+        # Writing the config restarts the conversion on the new mux input
+        config = self.scan_configs[idx]
+        buf[0] = config >> 8
+        buf[1] = config & 0xff
+        self.i2c.writeto_mem(self.address, _REGISTER_CONFIG, buf)
+        if timing is not None:
+            timing[channel].add(time.ticks_diff(time.ticks_us(), t_start))
+
+    def scan_stop(self):
+        """Stop a scan started with scan_start and power down."""
+        if self.scan_pin is not None:
+            self.scan_pin.irq(handler=None)
+            self.scan_pin = None
+        self._write_register(_REGISTER_CONFIG, _CQUE_NONE | _MODE_SINGLE |
+                             _GAINS[self.gain])
+
 
 class ADS1113(ADS1115):
     def __init__(self, i2c, address=0x48):
@@ -250,4 +331,12 @@ class ADS1015(ADS1115):
             threshold_low << 4, latched)
 
     def alert_read(self):
-        return super().alert_read() >> 4
\ No newline at end of file
+        return super().alert_read() >> 4
+
+    def read_rev(self, config=None):
+        return super().read_rev(config) >> 4
+
+    def conversion_us(self, rate=4):
+        # Rates are 128 to 3300 SPS
+        return 1100000 // (128, 250, 490, 920, 1600, 2400, 3300,
+                           3300)[rate] + 50
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Filename: backoff.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Exponential reconnect backoff with jitter for the network state
+    machine in main.py.
+
+    Attempt n waits a random time between half and all of
+    min(max_ms, base_ms * 2**n). When many Picos lose the access point at
+    once, the random part spreads their reconnects out instead of having
+    all of them hit the AP and the broker in the same second, and the
+    exponential part keeps a long outage from turning into a steady
+    stream of TLS handshakes.
+"""
+
+import random
+
+
+class Backoff:
+    def __init__(self, base_ms, max_ms):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.attempt = 0
+
+    def reset(self):
+        self.attempt = 0
+
+    def next_ms(self):
+        """Delay before the next attempt; counts the attempt."""
+        cap = self.base_ms << min(self.attempt, 16)
+        if cap > self.max_ms:
+            cap = self.max_ms
+        self.attempt += 1
+        half = cap // 2
+        return half + random.getrandbits(30) % (half + 1)
@@ -0,0 +1,27 @@
+# Recording parameters, kept out of main.py like the MQTT and Wi-Fi
+# settings so a rig can be retuned (or swept by sim/bench.py) without
+# editing the firmware
+sample_interval_ms = 20      # 50 Hz
+samples_per_frame = 100      # one frame per SD write
+channel_map = (0, 1, 2, 3)   # 4 * ADS1115 index + input, per ADC column
+# ADS1115s as (I2C bus, address, ALERT/RDY pin or None), up to four at
+# 0x48 to 0x4B. Bus 0 is on GP16/GP17, bus 1 on GP26/GP27; e.g. 8 FSRs:
+# adcs = ((0, 0x48, 18), (1, 0x49, 19)) and channel_map = tuple(range(8))
+# The pin is only used in continuous mode, which needs each chip's
+# ALERT/RDY output wired to it; without the wire every recording first
+# fails to start the scan and falls back to single-shot reads
+adcs = ((0, 0x48, 18),)
+adc_mode = "single"          # "single", or "continuous" (ALERT/RDY driven)
+adc_rate = 7                 # ADS1115 data rate index, 7 = 860 SPS
+record_format = "bin"        # default recording format, "bin" or "csv"
+compress_frames = True       # delta/varint code binary frames (framecodec.py)
+tick_offsets = True          # keep each sample's ticks, not just the frame's
+# Trigger mode (see trigger.py): only frames around a load are recorded.
+# A capture starts when an ADC column in trigger_columns (0 = first
+# channel) reaches trigger_high counts and ends trigger_holdoff_s after
+# all of them fell below trigger_low. () records everything
+trigger_columns = ()         # e.g. (1, 2, 3), the FSRs but not the vref
+trigger_high = 4000          # ADC counts that start a capture
+trigger_low = 3000           # ADC counts under which the hold-off runs
+trigger_pre_s = 2            # kept from before the trigger
+trigger_holdoff_s = 2        # recorded after the load is gone
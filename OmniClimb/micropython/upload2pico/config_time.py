@@ -0,0 +1,10 @@
+# Time synchronization (see timebase.py). Servers are tried in order as
+# (host, port). The default is host/time_server.py on the hub PC that
+# also runs the MQTT broker, since the gym often has no internet; add
+# ("pool.ntp.org", 123) after it where there is
+import config_mqtt
+
+_hub = config_mqtt.server
+servers = ((_hub.decode() if isinstance(_hub, bytes) else _hub, 123),)
+samples = 8                  # SNTP exchanges per sync
+resync_interval_s = 60       # between syncs while no recording is active
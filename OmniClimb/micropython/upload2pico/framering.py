@@ -0,0 +1,76 @@
+"""
+Filename: framering.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Preallocated ring of frame buffers shared between the sampling core
+    (producer) and the SD writer core (consumer).
+
+    Every slot is allocated once at boot, so a recording never allocates
+    or frees frame memory. The producer only advances 'written' and the
+    consumer only advances 'read', which keeps the ring safe for one
+    producer and one consumer without a lock.
+
+    When the writer falls behind and all slots are full, the sampler
+    keeps sampling into a spare overflow buffer and that frame is counted
+    in 'dropped' instead of blocking the sampler.
+"""
+
+from array import array
+
+
+class FrameRing:
+    def __init__(self, slots, frame_items, typecode='i'):
+        self.slots = slots
+        self.frames = [array(typecode, (0 for _ in range(frame_items)))
+                       for _ in range(slots)]
+        self.overflow = array(typecode, (0 for _ in range(frame_items)))
+        self.reset()
+
+    def reset(self):
+        """Empty the ring and clear the counters. Only call while
+           neither side is running."""
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+        self.high_water = 0
+        self._filling_overflow = False
+
+    def depth(self):
+        """Number of frames waiting for the writer."""
+        return self.written - self.read
+
+    # --- Producer side (sampling core) --- #
+
+    def acquire(self):
+        """Return the buffer to fill with the next frame. Returns the
+           overflow buffer when the ring is full."""
+        if self.written - self.read >= self.slots:
+            self._filling_overflow = True
+            return self.overflow
+        self._filling_overflow = False
+        return self.frames[self.written % self.slots]
+
+    def commit(self):
+        """Publish the frame filled since acquire() to the writer."""
+        if self._filling_overflow:
+            self.dropped += 1
+            return False
+        self.written += 1
+        depth = self.written - self.read
+        if depth > self.high_water:
+            self.high_water = depth
+        return True
+
+    # --- Consumer side (SD writer core) --- #
+
+    def peek(self):
+        """Return the oldest committed frame, or None if empty. The
+           frame stays owned by the writer until release()."""
+        if self.written == self.read:
+            return None
+        return self.frames[self.read % self.slots]
+
+    def release(self):
+        """Hand the frame returned by peek() back to the sampler."""
+        self.read += 1
@@ -21,6 +21,11 @@ Description:
     and ADC recording. Core 2 handles the writing of this force data to an
     external Micro SD card module.
 
+    On Core 1 the sampler, MQTT servicing and status publishing run as
+    separate uasyncio tasks, so a command is handled within a few ms
+    instead of waiting for the current 2 s frame to finish, and network
+    traffic does not push back the sample schedule.
+
 ACKNOWLEDGEMENTS:
     The multithreading implemented in this script was inspired by Bob
     Grant's video
@@ -43,22 +48,41 @@ ACKNOWLEDGEMENTS:
 # Import standard micropython libraries, 3rd party libraries,
 # and local libraries
 import sys
+import random
 import uos
 import utime
 import ujson
 import network
 import _thread
+import uasyncio as asyncio
 import sdcard
-import ntptime
 import config_mqtt
 import config_wifi
+import config_record
+import config_time
+import recformat
+import sdstream
 
 # Import explicit library submodules
 from machine import Pin, I2C, SPI # Pin is still needed for I2C/SPI
 from lib.umqtt.simple import MQTTClient
-from utime import ticks_ms, ticks_diff
+from mqttqueue import PublishQueue
+from mqttconnect import Connector
+from backoff import Backoff
+from utime import ticks_ms, ticks_us, ticks_add, ticks_diff
 from ads1x15 import ADS1115
-from array import array # Explicitly imported
+from adcbank import AdcBank
+from framering import FrameRing
+from framecodec import FrameEncoder
+from trigger import LoadTrigger
+from sampleclock import SampleClock, JitterStats
+from telemetry import ForceDecimator, ByteBudget
+from forcelut import ForceLut
+from metrics import Metrics
+from ringlog import RingLog, LEVELS, DEBUG, INFO
+from upload import Uploader, MqttSink, TcpSink
+from timebase import TimeBase
+from array import array
 from micropython import const
 
 
@@ -67,47 +91,250 @@ from micropython import const
 
 # Constants
 _PICO_ID = config_mqtt.clientID
-_SAMPLES_PER_FRAME = const(100)
-_CHANNELS_PER_SAMPLE = const(5)
-_SAMPLE_INTERVAL_MS = const(20)
+_FRAME_RING_SLOTS = const(16)  # compact frames, the RAM of 8 'i' ones
+
+# Recording layout from config_record.py. A sample is one column per
+# channel in _CHANNEL_MAP, where channel 4 * n + k is input k of the n-th
+# ADS1115 in _ADCS. Frames are compact 'h' arrays (see recformat.py): the
+# ticks_ms of the first sample, each sample's tick offset from it (unless
+# tick_offsets is off) and the ADC values. That halves the RAM of 'i'
+# rows, but each frame is still one sector-padded chunk on the card: 100
+# samples of four channels take 1004 B + the 32 B chunk header, 3 sectors
+# instead of 4 (a quarter less), or 2 without tick offsets
+_SAMPLES_PER_FRAME = config_record.samples_per_frame
+_SAMPLE_INTERVAL_MS = config_record.sample_interval_ms
+_CHANNEL_MAP = tuple(config_record.channel_map)
+_CHANNELS = len(_CHANNEL_MAP)
+_TICK_OFFSETS = config_record.tick_offsets
+_FRAME_LAYOUT = (recformat.LAYOUT_COMPACT if _TICK_OFFSETS
+                 else recformat.LAYOUT_COMPACT_GRID)
+_OFFSETS_AT = recformat.COMPACT_BASE_ITEMS
+_VALUES_AT = _OFFSETS_AT + (_SAMPLES_PER_FRAME if _TICK_OFFSETS else 0)
+_FRAME_ITEMS = recformat.compact_items(_SAMPLES_PER_FRAME, _CHANNELS,
+                                       _TICK_OFFSETS)
+_FRAME_BYTES = _FRAME_ITEMS * 2
+_MAX_TICK_OFFSET = const(0xFFFF)
+if _TICK_OFFSETS and ((_SAMPLES_PER_FRAME - 1) * _SAMPLE_INTERVAL_MS
+                      > _MAX_TICK_OFFSET):
+    raise ValueError("frames span too long for 16-bit tick offsets")
+
+# Binary recordings are preallocated to this size and streamed into the
+# file's sectors when its clusters are contiguous (about 6 h of four
+# channels at 50 Hz, more with compressed frames).
+# The footer is checkpointed every _CHECKPOINT_FRAMES frames (10 s), which
+# bounds what a power loss can cost
+_PREALLOC_BYTES = const(16 * 1024 * 1024)
+_CHECKPOINT_FRAMES = const(5)
+
+# Binary frames are delta/varint coded on Core 1 (see framecodec.py),
+# which typically brings a frame's chunk from 3 sectors to 2, a third
+# fewer sectors written and uploaded
+_COMPRESS_FRAMES = config_record.compress_frames
+_FRAME_ENCODING = (recformat.ENCODING_DELTA if _COMPRESS_FRAMES
+                   else recformat.ENCODING_RAW)
+
+# Time base (see timebase.py), synced to the servers in config_time.py
+# at boot and again between recordings. A start_recording command may
+# name a start_at instant (Unix epoch ms) up to _START_MAX_DELAY_MS ahead,
+# so every Pico starts its sample grid at the same time
+_START_MAX_DELAY_MS = const(60000)
+_TIME_SYNC_INTERVAL_MS = config_time.resync_interval_s * 1000
+
+# uasyncio task periods. MQTT is polled often enough that a command takes
+# effect within one poll plus one sample interval (< 50 ms)
+_MQTT_POLL_MS = const(10)
+_IDLE_POLL_MS = const(5)
+_STATUS_PUBLISH_INTERVAL_MS = const(1000)
+
+# Outgoing MQTT queue (see mqttqueue.py). Tasks only queue messages; the
+# MQTT task writes them without blocking. Event statuses go at QoS 1 with
+# up to _MQTT_INFLIGHT awaiting their PUBACK, periodic data at QoS 0
+_MQTT_QUEUE_MESSAGES = const(16)
+_MQTT_QUEUE_BYTES = const(8192)
+_MQTT_INFLIGHT = const(4)
+
+# Network recovery (see mqtt_task). Reconnects back off exponentially with
+# jitter from _RECONNECT_BASE_MS up to _RECONNECT_MAX_MS. The MQTT session
+# is persistent (clean_session=False), so subscriptions survive a drop.
+# The radio is only power cycled after _WIFI_RESET_AFTER failed rejoins.
+# A reconnect yields to the sampler between socket steps (mqttconnect.py);
+# only the TLS handshake's public-key work still holds Core 0, once per
+# attempt, and shows as connect_step_us in the metrics
+_RECONNECT_BASE_MS = const(500)
+_RECONNECT_MAX_MS = const(30000)
+_WIFI_CONNECT_TIMEOUT_MS = const(10000)
+_WIFI_RESET_AFTER = const(3)
+_MQTT_CONNECT_TIMEOUT_MS = const(10000)
+_NET_UP = const(0)
+_NET_BACKOFF = const(1)
+_NET_WIFI = const(2)
+_NET_MQTT = const(3)
+
+# Live telemetry: 50 Hz decimated 5x to 10 Hz min/max/mean records, sent in
+# 1 s batches within a byte budget so publishing never starves sampling
+_LIVE_DECIMATION = const(5)
+_LIVE_RECORDS_PER_BATCH = const(10)
+_LIVE_BYTE_BUDGET = const(512)  # bytes per second
+_LIVE_POLL_MS = const(50)
+
+# Live force in pounds, converted on the Pico (see forcelut.py). Each entry
+# pairs a channel column (0 = first input in _CHANNEL_MAP) with its FSR
+# model; the reference voltage is read from _LIVE_VREF_COLUMN. Left empty,
+# the live stream carries raw ADC counts
+_LIVE_FORCE_SENSORS = ()  # e.g. ((1, "a301"), (2, "a401"))
+_LIVE_VREF_COLUMN = const(0)
+_LIVE_FORCE_SCALE = const(10)  # 0.1 lb, fits the int16 records
+
+# Hot-path metrics (see metrics.py), off until the 'metrics' command
+# enables them. The heap is polled between messages to spot collections
+# (a lower bound, see metrics.poll_heap)
+_METRICS_INTERVAL_MS = const(5000)
+_METRICS_HEAP_POLL_MS = const(250)
+
+# Runtime log (see ringlog.py). Messages wait in a RAM ring and are
+# flushed to MQTT and, while no recording uses the SPI bus, to _LOG_FILE
+_LOG_RING_BYTES = const(4096)
+_LOG_FLUSH_MS = const(2000)
+_LOG_CHUNK_BYTES = const(1024)
+_LOG_FILE = "/sd/pico.log"
+
+# Recording uploads (see upload.py), only while no recording is active.
+# Over MQTT at most _UPLOAD_QUEUE_DEPTH upload messages wait in the
+# publish queue, leaving room for statuses
+_UPLOAD_CHUNK_BYTES = const(1024)
+_UPLOAD_RATE = const(16384)  # bytes per second, unless the command says
+_UPLOAD_QUEUE_DEPTH = const(4)
+_UPLOAD_TCP_PORT = const(5050)
+
+# ADC acquisition modes (see adcbank.py). Single-shot starts one
+# conversion per ADS1115 at a time and polls them. Continuous lets every
+# ADS1115 free-run at _ADC_RATE and rotates its mux from its ALERT/RDY pin
+# interrupt, so the sampler only copies the latest values. Continuous
+# falls back to single-shot when a chip shows no ALERT/RDY pulses (pin not
+# wired).
+_ADC_SINGLE_SHOT = "single"
+_ADC_CONTINUOUS = "continuous"
+_ADC_MODE = config_record.adc_mode
+_ADC_RATE = config_record.adc_rate  # 7 = 860 SPS
+
+# ADS1115s as (I2C bus, address, ALERT/RDY pin) and the (sda, scl) pins
+# of each I2C bus
+_ADCS = tuple(config_record.adcs)
+_I2C_PINS = ((16, 17), (26, 27))
+
+# Trigger mode (see trigger.py and config_record.py): only frames around
+# a load on the hold are recorded. The pre-trigger history is rounded up
+# to whole frames
+_TRIGGER_COLUMNS = tuple(config_record.trigger_columns)
+_TRIGGER_PRE_FRAMES = -(-config_record.trigger_pre_s * 1000 //
+                        (_SAMPLES_PER_FRAME * _SAMPLE_INTERVAL_MS))
+
+# Recording file formats. Binary writes the frames, unformatted, behind
+# a recformat header; CSV is kept for quick inspection on the card
+_FORMAT_BIN = "bin"
+_FORMAT_CSV = "csv"
+_DEFAULT_RECORD_FORMAT = config_record.record_format
 
 # MQTT Topics
 # All picos subscribe to the cental command topic and publish
 # to their unique status topic
 global_command_topic = b"pico/all/cmd"
 status_topic = b"pico/" + _PICO_ID.encode() + b"/status"
+force_topic = b"pico/" + _PICO_ID.encode() + b"/force"
+metrics_topic = b"pico/" + _PICO_ID.encode() + b"/metrics"
+log_topic = b"pico/" + _PICO_ID.encode() + b"/log"
+upload_topic = b"pico/" + _PICO_ID.encode() + b"/upload"
 
 # Global Data Recording State & Shared Buffer
 recording_active = False
+sd_writer_active = False  # Core 1 owns the SD card until it exits
 current_filename = ""
+adc_mode = _ADC_MODE
 
-# Global MQTT Client Object
+# Global MQTT Client Object, its outgoing queue and its non-blocking
+# connect (see mqttconnect.py)
 client = None
+publisher = None
+connector = None
+tls_session = None  # kept for resumption where the ssl module allows it
 
 # Shared buffer for ADC data between Core 0 (sampling) and Core 1 (writing)
-# This will hold completed 'frames' of data ready to be written.
-# Using a list to hold 'array.array' objects (frames). Access to the
-# data queue is locked between cores
-data_queue = []
+# This holds completed 'frames' of data ready to be written. The ring's
+# frame buffers are preallocated once; Core 0 fills a slot in place and
+# Core 1 drains it. The lock only guards the recording state
+frame_ring = FrameRing(_FRAME_RING_SLOTS, _FRAME_ITEMS, 'h')
 lock = _thread.allocate_lock()
 
-# I2C and SPI setup
-i2c = I2C(0, sda=Pin(16), scl=Pin(17), freq=400000)
+# Load trigger, allocated only when configured. trigger_enabled is set
+# per recording by the start command
+load_trigger = (LoadTrigger(_TRIGGER_COLUMNS, config_record.trigger_high,
+                            config_record.trigger_low,
+                            config_record.trigger_holdoff_s * 1000,
+                            _TRIGGER_PRE_FRAMES, _FRAME_ITEMS, 'h')
+                if _TRIGGER_COLUMNS else None)
+trigger_enabled = False
+
+# Fixed-phase sample grid. Anchored when a recording starts and kept
+# across frames, so time spent between frames does not shift samples
+sample_clock = SampleClock(_SAMPLE_INTERVAL_MS)
+
+# Command-to-effect latency (us). A command is stamped when it arrives and
+# the latency is recorded when the sampler (or the reply) acts on it
+command_received_us = None
+command_latency = JitterStats()
+sampling = False
+
+# Optional live force stream, toggled by the 'live_stream' command
+live_stream_enabled = False
+live_force = [ForceLut(model, _LIVE_VREF_COLUMN, column, _CHANNELS,
+                       _LIVE_FORCE_SCALE, 32767)
+              for column, model in _LIVE_FORCE_SENSORS]
+# ForceLut reads 'i' items, so a sample is copied out of the 'h' frame
+live_sample = array('i', (0 for _ in range(_CHANNELS)))
+live_force_values = array('i', (0 for _ in range(len(live_force))))
+live_decimator = ForceDecimator(len(live_force) or len(_CHANNEL_MAP),
+                                _LIVE_DECIMATION, _LIVE_RECORDS_PER_BATCH,
+                                units=1 if live_force else 0)
+live_budget = ByteBudget(_LIVE_BYTE_BUDGET, 2 * _LIVE_BYTE_BUDGET)
+
+# Ticks to epoch time, set by sync_time()
+timebase = TimeBase()
+
+# Leveled logger for everything after boot, level set by 'log_level'
+log = RingLog(_LOG_RING_BYTES, INFO)
+
+# Hot-path metrics, toggled by the 'metrics' command
+metrics = Metrics(len(_CHANNEL_MAP), _FRAME_RING_SLOTS)
+metrics_interval_ms = _METRICS_INTERVAL_MS
+
+# Recording upload, started by 'upload_recording'. upload_job is the
+# running task
+uploader = Uploader(_PICO_ID, _UPLOAD_CHUNK_BYTES)
+upload_job = None
+
+# I2C and SPI setup. Only the I2C buses with an ADS1115 are started
+i2c_buses = {}
+for bus, _, _ in _ADCS:
+    if bus not in i2c_buses:
+        i2c_buses[bus] = I2C(bus, sda=Pin(_I2C_PINS[bus][0]),
+                             scl=Pin(_I2C_PINS[bus][1]), freq=400000)
 cs_pin = Pin(13, mode=Pin.OUT, value=1)
 spi_sd = SPI(1, baudrate=40000000, sck=Pin(14), mosi=Pin(15), miso=Pin(12))
 
-# --- Initialize ADS1115 and SD Card --- #
-ads = ADS1115(i2c, address=0x48, gain=1)
+# --- Initialize the ADS1115s and SD Card --- #
+adc = AdcBank([ADS1115(i2c_buses[bus], address=address, gain=1)
+               for bus, address, _ in _ADCS],
+              # ALERT/RDY is open drain
+              [None if pin is None else Pin(pin, Pin.IN, Pin.PULL_UP)
+               for _, _, pin in _ADCS],
+              _CHANNEL_MAP, _ADC_RATE)
 sd = sdcard.SDCard(spi=spi_sd, cs=cs_pin)
 sd_card_present = False
-
-# A single frame buffer to hold data before pushing to queue.
-# Using 'l' data type for a minimum of 4 bytes for each data point.
-# This size is necessary for capturing the timestamps. This could be
-# made more efficient by allocating only 2 byes ('i')for ADC values
-frame_buffer_raw = array('l', (0 for _ in range(
-    _SAMPLES_PER_FRAME * _CHANNELS_PER_SAMPLE
-    )))
+recording_file = sdstream.RecordingFile(sd, _FRAME_BYTES, _CHECKPOINT_FRAMES,
+                                        log)
+frame_encoder = (FrameEncoder(_SAMPLES_PER_FRAME, _CHANNELS,
+                              _SAMPLE_INTERVAL_MS, _TICK_OFFSETS)
+                 if _COMPRESS_FRAMES else None)
 
 # Network Setup
 wlan = network.WLAN(network.STA_IF)
@@ -116,32 +343,36 @@ wlan = network.WLAN(network.STA_IF)
 """----FUNCTIONS----"""
 
 
-# Synchronize Pico time with NTP
+# Sync the time base used for scheduled starts and chunk anchors to the
+# servers in config_time.py, or to the RTC if none answers
 def sync_time():
-    print("Attempting NTP time sync...")
-    try:
-        ntptime.host = "pool.ntp.org"
-        ntptime.settime()
-        print("Time synced via NTP:", utime.localtime())
-    except Exception as e:
-        print(f"NTP time sync failed: {e}")
+    print("Attempting time sync...")
+    if asyncio.run(timebase.sync(config_time.servers, config_time.samples)):
+        print(f"Time base synced (round trip {timebase.delay_us} us).")
+    elif timebase.sync_rtc():
+        print("No time server answered, time base from the RTC.")
+    else:
+        print("No time base. Scheduled starts are disabled.")
 
 
 # WiFi connection
 def connect_to_network():
-    # --- Soft Reset Wi-Fi Interface ---
-    print("Performing soft reset of Wi-Fi interface...")
+    wlan.active(True)
+    wlan.config(pm=0xa11140)  # disable power-save mode
     if wlan.isconnected():
-        wlan.disconnect()
+        # Still associated (e.g. after a soft reboot), keep the link
+        print('WLAN already connected')
+        return wlan.ifconfig()[0]
+
+    # Only reset the radio when it reports a failure
+    if wlan.status() < 0:
+        print("Performing soft reset of Wi-Fi interface...")
+        wlan.active(False)
         utime.sleep_ms(50)
+        wlan.active(True)
+        wlan.config(pm=0xa11140)
+        print("Wi-Fi interface reset complete.")
 
-    wlan.active(False)
-    utime.sleep_ms(50)
-    wlan.active(True)
-    print("Wi-Fi interface reset complete.")
-    # --- End Soft Reset ---
-
-    wlan.config(pm=0xa11140)  # disable power-save mode
     wlan.connect(config_wifi.ssid, config_wifi.password)
 
     max_wait = 20  # wait time in seconds
@@ -178,191 +409,512 @@ def mount_sd_card():
         return False
 
 
-# ADC Recording (intended for Core 0 - main loop).
-# This function will be called repeatedly in the main loop while
-# recording_active is True.
-def core0_record_adc_data_frame():
-    global recording_active, lock, data_queue, frame_buffer_raw
+# Start the ADC in the configured acquisition mode for a new recording
+def start_adc_acquisition():
+    global adc_mode
+    adc_mode = _ADC_MODE
+    if adc_mode != _ADC_CONTINUOUS:
+        return
+
+    # Waits for two full sweeps (under 10 ms for 4 inputs at 860 SPS)
+    if not adc.start_continuous():
+        adc_mode = _ADC_SINGLE_SHOT
+        log.warning("No ALERT/RDY pulses from an ADS1115. Using "
+                    "single-shot reads.")
+        publish_status(b"adc_rdy_not_detected")
+
+
+# Return the ADC to single-shot power-down after a recording. Called from
+# Core 0 only, so the I2C bus is never shared with the RDY interrupt
+def stop_adc_acquisition():
+    if adc.continuous:
+        adc.stop()
+
+
+# Record how long the last command took to take effect
+def note_command_effect():
+    global command_received_us
+    if command_received_us is not None:
+        command_latency.add(ticks_diff(ticks_us(), command_received_us))
+        command_received_us = None
+
+
+# ADC Recording (Core 0 sampler task).
+# This coroutine is awaited repeatedly by core0_sampler_task. It returns
+# False right away when no recording is active.
+async def core0_record_adc_data_frame():
+    global recording_active, lock, frame_ring, sampling
 
     # Check if recording is active *before* starting to fill a new frame.
     # If not active, return immediately.
     with lock:  # Acquire lock to check recording_active as it's shared
-        if not recording_active:
-            # print("Core 0: Detected recording_active is FALSE. Returning.")
-            return
+        active = recording_active
+    if not active:
+        stop_adc_acquisition()
+        if sampling:
+            sampling = False
+            note_command_effect()
+        return False
 
-    # Loop through to fill the entire frame buffer without checking the flag
-    # within the loop
+    if not sampling:
+        # A scheduled start waits for the fleet-wide start instant in
+        # short steps, so a stop command still takes effect
+        remaining = sample_clock.remaining_us()
+        while remaining > 2000:
+            await asyncio.sleep_ms(min(_IDLE_POLL_MS, remaining // 1000 - 1))
+            if not recording_active:
+                return True
+            remaining = sample_clock.remaining_us()
+        sampling = True
+        note_command_effect()
+
+    # Slots are compact 'h' frames: only the first sample's ticks_ms takes
+    # 32 bits, the others are 16-bit offsets from it. In trigger mode an
+    # idle frame is filled into the trigger's history instead, and only
+    # queued if a capture starts during it
+    gate = load_trigger if trigger_enabled else None
+    held = gate is not None and not gate.start_frame()
+    frame_buffer_raw = gate.buffer() if held else frame_ring.acquire()
+    t_fill_start = ticks_ms()
+
+    # Loop through to fill the entire frame buffer. Other tasks (MQTT,
+    # status) run while waiting for each sample deadline, and a stop
+    # command is seen at the next sample instead of the end of the frame
     for sample_idx in range(_SAMPLES_PER_FRAME):
+        # Wait for the absolute deadline of this sample
+        await sample_clock.wait_async()
+        # A plain read of the flag; the commit below rechecks under lock
+        if not recording_active:
+            break
         timestamp = ticks_ms()
 
-        base_idx = sample_idx * _CHANNELS_PER_SAMPLE
-
-        frame_buffer_raw[base_idx + 0] = timestamp
-        frame_buffer_raw[base_idx + 1] = ads.read(rate=7, channel1=0)
-        frame_buffer_raw[base_idx + 2] = ads.read(rate=7, channel1=1)
-        frame_buffer_raw[base_idx + 3] = ads.read(rate=7, channel1=2)
-        frame_buffer_raw[base_idx + 4] = ads.read(rate=7, channel1=3)
-
-        # Calculate time elapsed for this sample and determine sleep duration
-        elapsed_sample_time = ticks_diff(ticks_ms(), timestamp)
-        sleep_duration = _SAMPLE_INTERVAL_MS - elapsed_sample_time
-
-        if sleep_duration > 0:
-            utime.sleep_ms(sleep_duration)
+        if sample_idx == 0:
+            frame_start = timestamp
+            recformat.set_frame_base(frame_buffer_raw, timestamp)
+        if _TICK_OFFSETS:
+            # Only a stall of over a minute would not fit
+            offset = min(ticks_diff(timestamp, frame_start),
+                         _MAX_TICK_OFFSET)
+            frame_buffer_raw[_OFFSETS_AT + sample_idx] = recformat.int16(
+                offset)
+
+        base_idx = _VALUES_AT + sample_idx * _CHANNELS
+        # Latest conversions collected by the ALERT/RDY interrupts, or
+        # single-shot reads with the chips converting in parallel
+        adc.read_into(frame_buffer_raw, base_idx)
+        if gate is not None:
+            gate.update(frame_buffer_raw, base_idx, timestamp)
+
+        if live_stream_enabled:
+            if live_force:
+                # Fixed-point pounds instead of raw counts
+                for i in range(_CHANNELS):
+                    live_sample[i] = frame_buffer_raw[base_idx + i]
+                for i in range(len(live_force)):
+                    live_force[i].convert(live_sample, 0, live_force_values,
+                                          i, 1)
+                live_decimator.add(live_force_values, 0, timestamp)
+            else:
+                live_decimator.add(frame_buffer_raw, base_idx, timestamp)
 
     # --- Check recording_active *after* the data frame is filled --- #
     # This check happens *after* the for loop completes all _SAMPLES_PER_FRAME.
     with lock:
         if recording_active:
-            data_queue.append(array('i', frame_buffer_raw))
-            print(f"Core 0: Completed and queued a \
-                  {len(frame_buffer_raw)//_CHANNELS_PER_SAMPLE} \
-                    -sample frame.")
+            if metrics.enabled:
+                metrics.frame_fill.add(ticks_diff(ticks_ms(), t_fill_start))
+                metrics.note_queue(frame_ring.depth())
+            if held:
+                gate.hold()
+                if gate.hit:
+                    # Capture started: queue the history, this frame last
+                    for frame in gate.release():
+                        frame_ring.acquire()[:] = frame
+                        queue_frame()
+                    log.info(f"Core 0: Trigger, capture {gate.captures}.")
+            else:
+                queue_frame()
         else:
             # If recording_active became False while we were filling the
-            # buffer this full frame is discarded. The next call to this
+            # buffer this partial frame is discarded. The next call to this
             # function will stop immediately.
-            print("Core 0: Recording stopped during frame collection.")
+            log.info("Core 0: Recording stopped during frame collection.")
+    return True
+
+
+# Hand the frame just filled to Core 1. Called with the lock held
+def queue_frame():
+    if frame_ring.commit():
+        if __debug__ and log.level <= DEBUG:
+            log.debug("Core 0: Queued a frame.")
+    else:
+        log.warning(f"Core 0: Frame ring full, frame dropped "
+                    f"({frame_ring.dropped} total).")
+
+
+# Sampler task: fills frames while recording, idles cheaply otherwise
+async def core0_sampler_task():
+    global recording_active
+    while True:
+        try:
+            if not await core0_record_adc_data_frame():
+                await asyncio.sleep_ms(_IDLE_POLL_MS)
+        except Exception as e:
+            # An I2C error stops the recording but not the Pico
+            log.error(f"Core 0: Error while sampling: {e}")
+            sys.print_exception(e)
+            with lock:
+                recording_active = False
+            publish_status(f"recording_adc_error_{e}".encode())
 
 
-# SD Card Writing (runs on Core 1). Uncomment lines to measure write time
-def core1_write2sd(file_path):
-    global data_queue, recording_active, lock
-    print(f"Core 1 (SD Write Thread) started for {file_path}")
+# Transform the compact frame into CSV lines of ticks_ms and ADC values
+def frame_to_csv(frame):
+    lines = []
+    base = recformat.frame_base(frame)
+    for sample_idx in range(_SAMPLES_PER_FRAME):
+        if _TICK_OFFSETS:
+            offset = frame[_OFFSETS_AT + sample_idx] & 0xFFFF
+        else:
+            offset = sample_idx * _SAMPLE_INTERVAL_MS
+        base_idx = _VALUES_AT + sample_idx * _CHANNELS
+        row_elements = [str(ticks_add(base, offset))]
+        row_elements += [str(frame[base_idx + i])
+                         for i in range(_CHANNELS)]
+        lines.append(','.join(row_elements))
+
+    return '\n'.join(lines) + '\n'
+
+
+# SD Card Writing (runs on Core 1). Write times go to the metrics
+def core1_write2sd(file_path, record_format):
+    global frame_ring, recording_active, lock, sd_writer_active
+    log.info(f"Core 1 (SD Write Thread) started for {file_path}")
+
+    binary = record_format == _FORMAT_BIN
 
     # Create/open the file once at the beginning of the thread's life
     try:
-        with open(file_path, "a") as f:
-            while True:
-                data_to_write_frame = None
-                with lock:
-                    if data_queue:
-                        data_to_write_frame = data_queue.pop(0)
-
-                if data_to_write_frame:
-                    # t_start_write = ticks_ms()
+        if binary:
+            # Preallocated, sector aligned file with CRC-checked chunks
+            # and a checkpointed footer (see recformat.py)
+            recording_id = random.getrandbits(32)
+            header = recformat.pack_header(
+                _PICO_ID, _CHANNEL_MAP, _SAMPLE_INTERVAL_MS,
+                _SAMPLES_PER_FRAME, adc.gain, recording_id=recording_id,
+                encoding=_FRAME_ENCODING, layout=_FRAME_LAYOUT)
+            sd.reset_write_stats()
+            if recording_file.open(file_path, _PREALLOC_BYTES, header,
+                                   recording_id, frame_encoder):
+                log.info("Core 1: Streaming to contiguous sectors.")
+            f = recording_file
+        else:
+            f = open(file_path, "a")
 
-                    # Transform the 1D array.array frame into CSV lines
-                    lines = []
-                    for sample_idx in range(_SAMPLES_PER_FRAME):
-                        base_idx = sample_idx * _CHANNELS_PER_SAMPLE
-                        row_elements = [str(data_to_write_frame[base_idx + i])
-                                        for i in range(_CHANNELS_PER_SAMPLE)]
-                        lines.append(','.join(row_elements))
+        with f:
+            while True:
+                # Frames are written straight from their ring slot
+                data_to_write_frame = frame_ring.peek()
 
-                    data_block_str = '\n'.join(lines) + '\n'
+                if data_to_write_frame is not None:
+                    t_start_write = ticks_us()
 
+                    # Time anchor of the frame's first sample
+                    anchor_ticks = recformat.frame_base(data_to_write_frame)
+                    anchor_epoch = timebase.epoch_ms(anchor_ticks)
                     try:
-                        f.write(data_block_str)
+                        if binary:
+                            # One chunk per frame, compressed by the
+                            # encoder and decoded on the host
+                            f.write(data_to_write_frame, _FRAME_BYTES,
+                                    _SAMPLES_PER_FRAME, anchor_ticks,
+                                    anchor_epoch)
+                        else:
+                            f.write(f"#anchor,{anchor_ticks},"
+                                    f"{anchor_epoch}\n")
+                            f.write(frame_to_csv(data_to_write_frame))
                         # f.flush() # Optional: force write to disk more often
-                        print(f"Core 1: Wrote \
-                              {len(data_to_write_frame)//_CHANNELS_PER_SAMPLE} \
-                                samples to file.")
+                        if __debug__ and log.level <= DEBUG:
+                            log.debug("Core 1: Wrote a frame to file.")
                     except OSError as e:
-                        print(f"Core 1: Error writing to file {file_path}: {e}")
+                        log.error(f"Core 1: Error writing to file "
+                                  f"{file_path}: {e}")
                         publish_status(f"recording_write_error_{e}".encode())
                         with lock:
                             recording_active = False  # Signal stop main loop
                         break  # Exit Core 1 loop on critical write error
 
-                    # t_write_duration = ticks_diff(ticks_ms(), t_start_write)
-                    # print(f"Core 1: Wrote {len(data_to_write_frame)//_CHANNELS_PER_SAMPLE} samples in {t_write_duration} ms\n")
+                    # Hand the slot back to Core 0
+                    frame_ring.release()
+
+                    if metrics.enabled:
+                        metrics.sd_write.add(ticks_diff(ticks_us(),
+                                                        t_start_write))
                 else:
                     # No data in queue, check recording_active state
                     with lock:
-                        if not recording_active and not data_queue:
+                        if not recording_active and not frame_ring.depth():
                             # If recording is off AND queue is empty,
                             #  then we can exit
-                            print("Core 1: Recording stopped and queue empty. \
-                                  Exiting thread.")
+                            log.info("Core 1: Recording stopped and queue "
+                                     "empty. Exiting thread.")
                             break
                     utime.sleep_ms(10)  # avoid busy-waiting
 
     except OSError as e:
-        print(f"Core 1: Initial file open error for {file_path}: {e}")
+        log.error(f"Core 1: Initial file open error for {file_path}: {e}")
         publish_status(f"recording_file_open_error_{e}".encode())
         with lock:
             recording_active = False  # Force stop on file open error
     except Exception as e:
-        print(f"Core 1: Unexpected error in write thread: {e}")
+        log.error(f"Core 1: Unexpected error in write thread: {e}")
         sys.print_exception(e)
         publish_status(f"recording_thread_error_{e}".encode())
         with lock:
             recording_active = False  # Force stop on unexpected error
     finally:
-        print("Core 1 (SD Write Thread) finished.")
+        log.info("Core 1 (SD Write Thread) finished.")
         # Ensure recording_active is false (handled by main loop too)
         with lock:
             recording_active = False
+            sd_writer_active = False
         publish_status(b"recording_stopped_core1_exit")
 
 
+# ticks_us() value at which a recording scheduled for start_at (epoch ms)
+# begins, or None to start now. Raises ValueError if start_at is too far
+# ahead
+def scheduled_start_us(start_at):
+    if start_at is None:
+        return None
+    if not timebase.synced():
+        log.warning("No time base, starting now instead of at start_at.")
+        publish_status(b"recording_start_unsynced")
+        return None
+    t_ms = ticks_ms()
+    t_us = ticks_us()
+    delay_us = start_at * 1000 - timebase.epoch_us(t_ms, t_us)
+    if delay_us > _START_MAX_DELAY_MS * 1000:
+        raise ValueError("start_at too far ahead")
+    if delay_us < 0:
+        log.warning(f"start_at passed {-delay_us // 1000} ms ago, starting "
+                    f"now.")
+        publish_status(b"recording_start_late")
+        return None
+    # Local us run fast or slow by the crystal's drift
+    delay_us -= delay_us * timebase.drift_ppb // 1000000000
+    return ticks_add(t_us, delay_us)
+
+
 # Start data recording command
-def start_adc_recording(filename_from_cmd):
+def start_adc_recording(filename_from_cmd,
+                        record_format=_DEFAULT_RECORD_FORMAT, start_at=None,
+                        trigger=None):
     global recording_active, current_filename, lock, sd_card_present
+    global sd_writer_active, trigger_enabled
 
-    print("start_adc_recording called.")
     with lock:
         if recording_active:
-            print("Recording already active. Ignoring start command.")
+            log.info("Recording already active. Ignoring start command.")
             publish_status(b"recording_already_active")
             return
 
         if not sd_card_present:
-            print("SD card not mounted. Cannot start recording.")
+            log.warning("SD card not mounted. Cannot start recording.")
             publish_status(b"error_sd_not_mounted")
             return
 
+        if sd_writer_active:
+            log.info("Previous recording still closing. Ignoring start "
+                     "command.")
+            publish_status(b"recording_still_closing")
+            return
+
+        # Recording has priority over the card and the network
+        if upload_job is not None:
+            upload_job.cancel()
+            log.info("Upload aborted for recording.")
+            publish_status(b"upload_aborted_recording")
+
+        if trigger is None:
+            trigger = load_trigger is not None
+        elif trigger and load_trigger is None:
+            log.warning("No trigger_columns configured. Ignoring start "
+                        "command.")
+            publish_status(b"error_trigger_not_configured")
+            return
+
+        try:
+            start_us = scheduled_start_us(start_at)
+        except ValueError:
+            log.warning("start_at too far ahead. Ignoring start command.")
+            publish_status(b"error_start_too_far")
+            return
+
         current_filename = "/sd/" + filename_from_cmd
 
         # Clear any old data in the queue before starting new recording
-        data_queue.clear()
+        frame_ring.reset()
+        trigger_enabled = bool(trigger)
+        if trigger_enabled:
+            load_trigger.reset()
+
+        start_adc_acquisition()
+        sample_clock.start(start_us)
+        sample_clock.jitter.reset()
+        live_decimator.reset()
 
         # Set recording_active to True *before* starting thread
         # This signals core0_record_adc_data_frame to start sampling
         recording_active = True
-        print(f"DEBUG: recording_active set to \
-              {recording_active} \
-                in start_adc_recording.")
+        sd_writer_active = True
 
         # Start Core 1 thread only once when recording starts
         # This will now pass the filename to core1_write2sd directly
-        _thread.start_new_thread(core1_write2sd, (current_filename, ))
+        _thread.start_new_thread(core1_write2sd,
+                                 (current_filename, record_format))
 
-        print(f"Starting recording to {current_filename}")
+        log.info(f"Starting recording to {current_filename}")
         publish_status(b"recording_started")
 
 
 # Stop data recording command
 def stop_adc_recording():
     global recording_active, lock
-    print("stop_adc_recording called.")
     with lock:
         if not recording_active:
-            print("No recording active. Ignoring stop command.")
+            log.info("No recording active. Ignoring stop command.")
             publish_status(b"no_recording_active")
             return
 
         recording_active = False  # Signal both Core 0 and 1 threads to stop
-        print(f"DEBUG: recording_active set to \
-              {recording_active} \
-                in stop_adc_recording.")
-        print("Stopping recording.")
+        log.info("Stopping recording.")
         publish_status(b"recording_stopping_signal")
 
 
+# Enable or disable the live force stream
+def set_live_stream(enable):
+    global live_stream_enabled
+    live_decimator.reset()
+    live_stream_enabled = enable
+    log.info(f"Live force stream {'enabled' if enable else 'disabled'}.")
+    publish_status(b"live_stream_on" if enable else b"live_stream_off")
+
+
+# Enable or disable the metrics messages, optionally changing their period
+def set_metrics(enable, interval_ms=None):
+    global metrics_interval_ms
+    if interval_ms:
+        metrics_interval_ms = max(int(interval_ms), _METRICS_HEAP_POLL_MS)
+    metrics.reset()
+    metrics.enabled = enable
+    sample_clock.hist = metrics.jitter if enable else None
+    adc.set_timing(metrics.i2c if enable else None)
+    log.info(f"Metrics {'enabled' if enable else 'disabled'}.")
+    publish_status(b"metrics_on" if enable else b"metrics_off")
+
+
+# Change the log level at runtime
+def set_log_level(name):
+    level = LEVELS.get(name)
+    if level is None:
+        log.warning(f"Unknown log level {name}")
+        publish_status(b"error_unknown_log_level")
+        return
+    log.level = level
+    log.info(f"Log level set to {name}.")
+    publish_status(b"log_level_" + name.encode())
+
+
+# Upload task: send one file to the collector and report the outcome
+async def upload_task(path, session, sink, offset, rate):
+    global upload_job
+    try:
+        size, confirmed = await uploader.run(path, session, sink, offset,
+                                             rate)
+        if confirmed is None or confirmed >= size:
+            log.info(f"Uploaded {path} ({size} bytes).")
+            publish_status(b"upload_done")
+        else:
+            log.warning(f"Upload of {path} incomplete, collector holds "
+                        f"{confirmed} of {size} bytes.")
+            publish_status(b"upload_incomplete")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.error(f"Upload of {path} failed: {e}")
+        publish_status(f"upload_error_{e}".encode())
+    finally:
+        sink.abort()
+        upload_job = None
+
+
+# Upload a recording from the SD card to the host collector
+def start_upload(command_data):
+    global upload_job
+    filename = command_data.get("filename")
+    if not filename:
+        log.warning("'upload_recording' command missing 'filename'.")
+        publish_status(b"error_missing_filename")
+        return
+    with lock:
+        busy = recording_active or sd_writer_active
+    if busy:
+        log.info("Recording active. Ignoring upload command.")
+        publish_status(b"error_recording_active")
+        return
+    if upload_job is not None:
+        log.info("Upload already running. Ignoring upload command.")
+        publish_status(b"error_upload_busy")
+        return
+    path = "/sd/" + filename
+    try:
+        uos.stat(path)
+    except OSError:
+        log.warning(f"Upload: {path} not found.")
+        publish_status(b"error_file_not_found")
+        return
+
+    if command_data.get("transport", "mqtt") == "tcp":
+        sink = TcpSink(command_data.get("host"),
+                       command_data.get("port", _UPLOAD_TCP_PORT))
+    else:
+        sink = MqttSink(publisher, upload_topic, _UPLOAD_QUEUE_DEPTH)
+    # Over MQTT the collector's resume offsets come with the command
+    offset = (command_data.get("offsets") or {}).get(_PICO_ID, 0)
+    upload_job = asyncio.create_task(upload_task(
+        path, command_data.get("session", ""), sink, offset,
+        int(command_data.get("rate", _UPLOAD_RATE))))
+    log.info(f"Uploading {path}.")
+    publish_status(b"upload_started")
+
+
+# Cancel a running upload
+def cancel_upload():
+    if upload_job is None:
+        publish_status(b"no_upload_active")
+        return
+    upload_job.cancel()
+    log.info("Upload cancelled.")
+    publish_status(b"upload_cancelled")
+
+
 # Check Pico connection handler
 def check_pico_connection():
-    print("Received check connection command.")
+    log.info("Received check connection command.")
     publish_status(b"connected")
 
 
 # MQTT Message Callback Function
 def mqtt_callback(topic, msg):
-    print(f"Received MQTT message on topic '{topic.decode()}': '{msg.decode()}'")
+    if __debug__ and log.level <= DEBUG:
+        log.debug(f"Received MQTT message on topic '{topic.decode()}': "
+                  f"'{msg.decode()}'")
+
+    global command_received_us
 
     if topic == global_command_topic:
+        command_received_us = ticks_us()
         try:
             command_data = ujson.loads(msg.decode())
             cmd_type = command_data.get("command")
@@ -370,51 +922,117 @@ def mqtt_callback(topic, msg):
             if cmd_type == "start_recording":
                 filename = command_data.get("filename")
                 if not filename:
-                    print("Error: 'start_recording' command missing \
-                          'filename'.")
+                    log.warning("'start_recording' command missing "
+                                "'filename'.")
                     publish_status(b"error_missing_filename")
                     return
-                start_adc_recording(filename)
-                print("mqtt_callback: start_adc_recording initiated.")
+                record_format = command_data.get("format",
+                                                 _DEFAULT_RECORD_FORMAT)
+                if record_format not in (_FORMAT_BIN, _FORMAT_CSV):
+                    log.warning(f"Unknown recording format {record_format}")
+                    publish_status(b"error_unknown_format")
+                    return
+                start_adc_recording(filename, record_format,
+                                    command_data.get("start_at"),
+                                    command_data.get("trigger"))
 
             elif cmd_type == "stop_recording":
                 stop_adc_recording()
-                print("mqtt_callback: stop_adc_recording called.")
 
             elif cmd_type == "check_pico_connection":
                 check_pico_connection()
+                note_command_effect()
+
+            elif cmd_type == "live_stream":
+                set_live_stream(bool(command_data.get("enable", True)))
+                note_command_effect()
+
+            elif cmd_type == "log_level":
+                set_log_level(command_data.get("level", "info"))
+                note_command_effect()
+
+            elif cmd_type == "upload_recording":
+                start_upload(command_data)
+                note_command_effect()
+
+            elif cmd_type == "cancel_upload":
+                cancel_upload()
+                note_command_effect()
+
+            elif cmd_type == "metrics":
+                set_metrics(bool(command_data.get("enable", True)),
+                            command_data.get("interval_ms"))
+                note_command_effect()
 
             else:
-                print("Unknown JSON command type:", cmd_type)
+                log.warning(f"Unknown JSON command type: {cmd_type}")
                 publish_status(b"error_unknown_json_command")
 
         except ValueError:
-            print(f"Received non-JSON message on global command topic: \
-                  {msg.decode()}")
+            log.warning(f"Received non-JSON message on global command topic: "
+                        f"{msg.decode()}")
             publish_status(b"error_non_json_command")
         except Exception as e:
-            print(f"Error processing command: {e}")
+            log.error(f"Error processing command: {e}")
             sys.print_exception(e) # Print traceback for debugging
             publish_status(f"error_processing_command_{e}".encode())
 
 
-# Publish status to MQTT broker
-def publish_status(status_msg):
+# Queue a message for the MQTT task. Returns False if the queue was full
+def mqtt_publish(topic, msg, qos=0):
+    if publisher is None:
+        return False
+    return publisher.publish(topic, msg, retain=False, qos=qos)
+
+
+# Publish status to MQTT broker. Event statuses default to QoS 1
+def publish_status(status_msg, qos=1):
     try:
-        if client:
-            client.publish(status_topic, status_msg, retain=False, qos=0)
-            print(f"Published status \
-                  '{status_msg.decode()}' \
-                    to \
-                  '{status_topic.decode()}'")
+        if not mqtt_publish(status_topic, status_msg, qos):
+            log.warning("MQTT queue full, status dropped.")
     except Exception as e:
-        print(f"Failed to publish status: {e}")
+        log.error(f"Failed to publish status: {e}")
         sys.print_exception(e)
 
 
+# Periodic status message. Carries the recording state plus the frame
+# ring counters so dropped frames are visible from the hub
+def status_payload(state):
+    # Sample jitter (us) since the previous status message
+    jitter = sample_clock.jitter
+    payload = ujson.dumps({
+        "status": state,
+        "dropped_frames": frame_ring.dropped,
+        "queue_depth": frame_ring.depth(),
+        "queue_high_water": frame_ring.high_water,
+        "jitter_us": [jitter.min, jitter.mean(), jitter.max],
+        "missed_samples": sample_clock.missed,
+        "cmd_latency_us": [command_latency.min, command_latency.mean(),
+                           command_latency.max],
+        "live_dropped": live_decimator.dropped,
+        "sd_write_hist": list(sd.write_hist),
+        "sd_write_max_us": sd.write_max_us,
+        "mqtt_queue": ([publisher.depth(), len(publisher.inflight),
+                        publisher.dropped, publisher.retransmits]
+                       if publisher else None),
+        "log_suppressed": log.suppressed,
+        "log_lost": log.lost,
+        "epoch_ms": timebase.epoch_ms(),
+        "time_source": timebase.source,
+        "time_sync": [timebase.residual_us, timebase.delay_us,
+                      timebase.drift_ppb, timebase.age_s()],
+        "upload": ([uploader.name, uploader.sent, uploader.size]
+                   if upload_job is not None else None),
+        "trigger": ([load_trigger.active, load_trigger.captures,
+                     load_trigger.skipped] if trigger_enabled else None),
+    }).encode()
+    jitter.reset()
+    return payload
+
+
 # Connect to MQTT broker
 def connect_mqtt():
-    global client
+    global client, publisher, connector
 
     client = MQTTClient(
         client_id=_PICO_ID.encode(),
@@ -428,26 +1046,248 @@ def connect_mqtt():
     )
 
     client.set_callback(mqtt_callback)
+    publisher = PublishQueue(client, _MQTT_QUEUE_MESSAGES, _MQTT_QUEUE_BYTES,
+                             _MQTT_INFLIGHT)
+    connector = Connector(client, _MQTT_CONNECT_TIMEOUT_MS)
     print(f"Connecting to MQTT broker \
           {config_mqtt.server}:{config_mqtt.port} \
             as client ID '{_PICO_ID}'...")
 
     try:
-        client.connect()
+        asyncio.run(mqtt_connect())
         print("Connected to MQTT broker.")
-        client.subscribe(global_command_topic)
-        print(f"Subscribed to topic: '{global_command_topic.decode()}'")
         publish_status(b"booted_up")
     except OSError as e:
         print(f"MQTT connection failed: {e}")
         raise
 
 
+# Open the MQTT connection with a persistent session, resuming the TLS
+# session where the ssl module supports it. Subscribes only if the broker
+# no longer has the session. Runs without blocking the sampler (see
+# mqttconnect.py)
+async def mqtt_connect():
+    global tls_session
+    if client.sock is not None:
+        try:
+            client.sock.close()  # frees the old TLS context first
+        except OSError:
+            pass
+    if tls_session is not None:
+        client.ssl_params["session"] = tls_session
+    connector.hist = metrics.connect_step if metrics.enabled else None
+    try:
+        present = await connector.connect(clean_session=False)
+    except TypeError:
+        # This port's wrap_socket() takes no session; connect without
+        client.sock.close()
+        client.ssl_params.pop("session", None)
+        tls_session = None
+        present = await connector.connect(clean_session=False)
+    tls_session = getattr(client.sock, "session", None)
+    if not present:
+        await connector.subscribe(global_command_topic)
+        log.info(f"Subscribed to topic: '{global_command_topic.decode()}'")
+    return present
+
+
+# Rejoin the access point without blocking the other tasks. The radio is
+# power cycled only after repeated failures
+async def wifi_reconnect(attempt):
+    if attempt >= _WIFI_RESET_AFTER:
+        log.warning("Resetting Wi-Fi interface.")
+        wlan.active(False)
+        await asyncio.sleep_ms(50)
+        wlan.active(True)
+        wlan.config(pm=0xa11140)
+    wlan.connect(config_wifi.ssid, config_wifi.password)
+    t_start = ticks_ms()
+    while ticks_diff(ticks_ms(), t_start) < _WIFI_CONNECT_TIMEOUT_MS:
+        if wlan.isconnected():
+            return True
+        if wlan.status() < 0:
+            break
+        await asyncio.sleep_ms(100)
+    return wlan.isconnected()
+
+
+# MQTT task: services incoming commands, writes queued messages and runs
+# the reconnect state machine:
+#   UP       polling; any error drops to BACKOFF
+#   BACKOFF  wait the next jittered backoff delay
+#   WIFI     rejoin the access point if the link is down
+#   MQTT     reconnect (persistent session) and resend in-flight messages
+# It never gives up, so a recording continues through any outage, losing
+# at most the samples due during each attempt's TLS handshake
+async def mqtt_task():
+    state = _NET_UP
+    backoff = Backoff(_RECONNECT_BASE_MS, _RECONNECT_MAX_MS)
+    wifi_attempts = 0
+
+    while True:
+        if state == _NET_UP:
+            try:
+                # Handle MQTT messages and write out queued messages
+                if metrics.enabled:
+                    t_start = ticks_us()
+                    publisher.poll()
+                    metrics.mqtt_publish.add(ticks_diff(ticks_us(), t_start))
+                else:
+                    publisher.poll()
+                await asyncio.sleep_ms(_MQTT_POLL_MS)
+            except Exception as e:
+                # Any failure here (socket error, broken framing) is
+                # handled by reconnecting. Sampling keeps running
+                log.warning(f"Network/MQTT error: {e}")
+                state = _NET_BACKOFF
+
+        elif state == _NET_BACKOFF:
+            delay = backoff.next_ms()
+            log.info(f"Reconnecting in {delay} ms "
+                     f"(attempt {backoff.attempt}).")
+            await asyncio.sleep_ms(delay)
+            state = _NET_MQTT if wlan.isconnected() else _NET_WIFI
+
+        elif state == _NET_WIFI:
+            if await wifi_reconnect(wifi_attempts):
+                log.info("Wi-Fi reconnected.")
+                wifi_attempts = 0
+                state = _NET_MQTT
+            else:
+                wifi_attempts += 1
+                state = _NET_BACKOFF
+
+        elif state == _NET_MQTT:
+            try:
+                present = await mqtt_connect()
+            except Exception as e:
+                log.warning(f"MQTT reconnect failed: {e}")
+                state = _NET_BACKOFF
+                continue
+            metrics.reconnects += 1
+            backoff.reset()
+            publisher.restart()
+            log.info(f"Reconnected to MQTT broker (session "
+                     f"{'resumed' if present else 'new'}, longest "
+                     f"blocking step {connector.step_max_us} us).")
+            with lock:
+                active = recording_active
+            publish_status(b"reconnected_recording" if active
+                           else b"reconnected_idle")
+            state = _NET_UP
+
+
+# Status task: periodically publish the recording state and counters
+async def status_task():
+    while True:
+        await asyncio.sleep_ms(_STATUS_PUBLISH_INTERVAL_MS)
+        with lock:
+            if recording_active:
+                state = "recording_active"
+            elif sd_card_present:
+                state = "idle_sd_ready"
+            else:
+                state = "idle_no_sd"
+        publish_status(status_payload(state), qos=0)
+
+
+# Telemetry task: publish full live force batches within the byte budget
+async def telemetry_task():
+    while True:
+        await asyncio.sleep_ms(_LIVE_POLL_MS)
+        batch = live_decimator.take()
+        if batch is None:
+            continue
+        if not live_budget.allow(len(batch)):
+            live_decimator.dropped += 1
+            continue
+        if not mqtt_publish(force_topic, batch):
+            live_decimator.dropped += 1
+
+
+# Metrics task: poll the heap and publish a metrics message per interval
+async def metrics_task():
+    t_last = ticks_ms()
+    while True:
+        await asyncio.sleep_ms(_METRICS_HEAP_POLL_MS)
+        if not metrics.enabled:
+            t_last = ticks_ms()
+            continue
+        if ticks_diff(ticks_ms(), t_last) < metrics_interval_ms:
+            metrics.poll_heap()
+            continue
+        t_last = ticks_ms()
+        mqtt_publish(metrics_topic, metrics.payload())
+
+
+# Time sync task: resync the time base between recordings, so the drift
+# estimate follows the crystal. A recording runs on the model it started
+# with; a start command abandons a sync in progress
+async def time_sync_task():
+    while True:
+        await asyncio.sleep_ms(_TIME_SYNC_INTERVAL_MS)
+        with lock:
+            busy = recording_active or sd_writer_active
+        if busy:
+            continue
+        if await timebase.sync(config_time.servers, config_time.samples,
+                               lambda: recording_active):
+            log.info(f"Time resync: residual {timebase.residual_us} us, "
+                     f"round trip {timebase.delay_us} us, drift "
+                     f"{timebase.drift_ppb} ppb.")
+        else:
+            log.warning("Time resync failed, no server answered.")
+
+
+# Log task: drain the log ring to MQTT, and to the SD card while Core 1
+# is not using it
+async def log_task():
+    while True:
+        await asyncio.sleep_ms(_LOG_FLUSH_MS)
+        sd_failed = False
+        chunk = log.drain(_LOG_CHUNK_BYTES)
+        while chunk is not None:
+            mqtt_publish(log_topic, chunk)  # the SD copy may still have it
+            # Checked again before every append: a recording started
+            # during the await below hands the card to Core 1, and the
+            # check and the write must not have an await between them
+            with lock:
+                to_sd = (sd_card_present and not sd_writer_active
+                         and not sd_failed)
+            if to_sd:
+                try:
+                    with open(_LOG_FILE, "ab") as f:
+                        f.write(chunk)
+                except OSError:
+                    sd_failed = True
+            await asyncio.sleep_ms(0)
+            chunk = log.drain(_LOG_CHUNK_BYTES)
+
+
+# Run sampling, MQTT servicing and status publishing as independent tasks
+async def run_tasks():
+    sampler = asyncio.create_task(core0_sampler_task())
+    status = asyncio.create_task(status_task())
+    telemetry = asyncio.create_task(telemetry_task())
+    metrics_publisher = asyncio.create_task(metrics_task())
+    log_flusher = asyncio.create_task(log_task())
+    time_sync = asyncio.create_task(time_sync_task())
+    try:
+        await mqtt_task()
+    finally:
+        sampler.cancel()
+        status.cancel()
+        telemetry.cancel()
+        metrics_publisher.cancel()
+        log_flusher.cancel()
+        time_sync.cancel()
+        if upload_job is not None:
+            upload_job.cancel()
+
+
 # Main loop (runs on Core 0)
 def main_loop():
-    global client, recording_active, data_queue, sd_card_present
-    reconnect_attempts = 0
-    max_reconnect_attempts = 5
+    global client, recording_active, frame_ring, sd_card_present
     wlan_local_ref = network.WLAN(network.STA_IF)
 
     try:
@@ -462,74 +1302,8 @@ def main_loop():
 
         connect_mqtt()
 
-        last_status_publish_time = utime.time()
-        status_publish_interval = 1
-
-        # This loop keeps the Pico running and ready for commands
-        while True:
-            try:
-                # Handle MQTT messages and maintain connection
-                client.check_msg()
-
-                core0_record_adc_data_frame()
-
-                utime.sleep_us(500)  # Yield control frequently
-
-                # Periodically publish status
-                if utime.time() - last_status_publish_time > status_publish_interval:
-                    with lock:
-                        if recording_active:
-                            publish_status(b"recording_active")
-                        elif sd_card_present:
-                            publish_status(b"idle_sd_ready")
-                        else:
-                            publish_status(b"idle_no_sd")
-                    last_status_publish_time = utime.time()
-
-                reconnect_attempts = 0
-
-            except OSError as e:
-                print(f"Network/MQTT error in main loop: {e}")
-                # Reconnection logic handles most network errors,
-                # allows loop to continue
-                if reconnect_attempts < max_reconnect_attempts:
-                    print(f"Attempting to reconnect... ({reconnect_attempts+1}/{max_reconnect_attempts})")
-                    utime.sleep(5)
-                    try:
-                        if not wlan_local_ref.isconnected():
-                            print("Wi-Fi disconnected. Reconnecting...")
-                            wlan_local_ref.active(False)
-                            utime.sleep(1)
-                            wlan_local_ref.active(True)
-                            wlan_local_ref.connect(config_wifi.ssid, config_wifi.password)
-                            wifi_reconnect_wait = 10
-                            while wifi_reconnect_wait > 0 and not wlan_local_ref.isconnected():
-                                utime.sleep(1)
-                                wifi_reconnect_wait -= 1
-                            if not wlan_local_ref.isconnected():
-                                print("Wi-Fi reconnect failed.")
-                                # If Wi-Fi consistently fails,
-                                # it's a critical error for connectivity
-                                raise RuntimeError("WiFi reconnect failed")
-
-                        client.connect()
-                        print("Reconnected to MQTT broker.")
-                        client.subscribe(global_command_topic)
-                        publish_status(b"reconnected_idle")
-                        reconnect_attempts = 0
-                    except Exception as re:
-                        print(f"Reconnect failed: {re}")
-                        sys.print_exception(re)
-                        reconnect_attempts += 1
-                else:
-                    print("Max reconnect attempts reached. Exiting main loop.")
-                    break
-
-            except Exception as e:
-                print(f"Unexpected error in main loop: {e}")
-                sys.print_exception(e)
-                print("Exiting main loop due to unexpected error.")
-                break
+        # This keeps the Pico running and ready for commands
+        asyncio.run(run_tasks())
 
     # Catches initial setup failures like WiFi connect fail
     except RuntimeError as e:
@@ -550,6 +1324,14 @@ def main_loop():
         utime.sleep(3)
 
         if sd_card_present:
+            # Keep the log lines that were never flushed
+            chunk = log.drain(_LOG_RING_BYTES)
+            if chunk is not None:
+                try:
+                    with open(_LOG_FILE, "ab") as f:
+                        f.write(chunk)
+                except OSError as e:
+                    print(f"Error writing {_LOG_FILE}: {e}")
             try:
                 uos.umount("/sd")
                 print("SD card unmounted.")
@@ -558,6 +1340,8 @@ def main_loop():
 
         if client:
             try:
+                # Final statuses are still queued
+                publisher.flush(1000)
                 client.disconnect()
                 print("Disconnected from MQTT broker.")
             except Exception as e:
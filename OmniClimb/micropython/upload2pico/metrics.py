@@ -0,0 +1,148 @@
+"""
+Filename: metrics.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Hot-path timing counters and histograms for the recording pipeline,
+    published periodically on pico/<id>/metrics while enabled.
+
+    Instrumented points only pay for two ticks_us() calls and a histogram
+    update, and only while metrics are enabled (see the 'metrics'
+    command in main.py). Histograms are log2 bucketed like the SD card's
+    write_hist: bucket 0 holds values below 2**shift, each following
+    bucket doubles the limit and the last collects everything slower.
+
+    Histograms cover the time since the previous metrics message and are
+    reset when it is built; counters (reconnects, GC collections seen)
+    are cumulative since boot. Core 1 updates sd_write while Core 0 reads it,
+    so a message can be off by the one write in flight.
+
+    Payload (JSON), each histogram as [count, mean, max, [buckets]]:
+        seq             message counter
+        interval_ms     time covered by the histograms
+        i2c_us          per channel, one ADS1115 read (I2C + conversion
+                        wait in single-shot mode)
+        jitter_us       lateness of each sample against its deadline
+        frame_fill_ms   time to fill a frame
+        queue_depth     frame ring depth at each commit, counts by depth
+        sd_write_us     one frame written to the card
+        mqtt_publish_us one MQTT poll: incoming packets plus the queued
+                        writes (mqttqueue.py)
+        gc              [collections seen, mem_free, lowest mem_free].
+                        Collections seen is a lower bound: a collection
+                        is only noticed when allocated memory shrank
+                        between two heap polls, so one followed by more
+                        allocation before the next poll is missed
+        reconnects      MQTT reconnects since boot
+        connect_step_us one non-blocking step of an MQTT (re)connect
+                        (mqttconnect.py), mostly the TLS handshake's
+                        public-key work; sampling waits for each
+"""
+
+import gc
+import ujson
+from array import array
+from utime import ticks_ms, ticks_diff
+from micropython import const
+
+_HIST_BUCKETS = const(12)
+
+
+class LatencyHist:
+    def __init__(self, shift=7):
+        self.shift = shift
+        self.buckets = array('I', (0 for _ in range(_HIST_BUCKETS)))
+        self.reset()
+
+    def reset(self):
+        for i in range(_HIST_BUCKETS):
+            self.buckets[i] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        if value > self.max:
+            self.max = value
+        self.total += value
+        self.count += 1
+        bucket = 0
+        t = value >> self.shift
+        while t and bucket < _HIST_BUCKETS - 1:
+            t >>= 1
+            bucket += 1
+        self.buckets[bucket] += 1
+
+    def summary(self):
+        mean = self.total // self.count if self.count else 0
+        return [self.count, mean, self.max, list(self.buckets)]
+
+
+class Metrics:
+    def __init__(self, channels, queue_slots):
+        self.enabled = False
+        self.seq = 0
+        # 16 us .. 32 ms per read, 64 us .. 131 ms per SD frame write
+        self.i2c = [LatencyHist(4) for _ in range(channels)]
+        self.jitter = LatencyHist(4)
+        self.frame_fill = LatencyHist(9)
+        self.sd_write = LatencyHist(6)
+        self.mqtt_publish = LatencyHist(7)
+        self.connect_step = LatencyHist(9)  # 512 us .. 1 s
+        self.queue_depth = array('I', (0 for _ in range(queue_slots + 1)))
+        self.reconnects = 0
+        self.gc_seen = 0  # lower bound, see poll_heap
+        self.heap_alloc = gc.mem_alloc()
+        self.heap_free_min = gc.mem_free()
+        self.t_start = ticks_ms()
+
+    def reset(self):
+        """Start a new reporting interval."""
+        for hist in self.i2c:
+            hist.reset()
+        for hist in (self.jitter, self.frame_fill, self.sd_write,
+                     self.mqtt_publish, self.connect_step):
+            hist.reset()
+        for i in range(len(self.queue_depth)):
+            self.queue_depth[i] = 0
+        self.heap_free_min = gc.mem_free()
+        self.t_start = ticks_ms()
+
+    def note_queue(self, depth):
+        if depth >= len(self.queue_depth):
+            depth = len(self.queue_depth) - 1
+        self.queue_depth[depth] += 1
+
+    def poll_heap(self):
+        """Sample the heap. MicroPython has no GC hook, so a collection
+           is counted whenever allocated memory shrank since the last
+           poll. Collections that allocation outgrows before the next
+           poll go unseen, so gc_seen is a lower bound."""
+        alloc = gc.mem_alloc()
+        if alloc < self.heap_alloc:
+            self.gc_seen += 1
+        self.heap_alloc = alloc
+        free = gc.mem_free()
+        if free < self.heap_free_min:
+            self.heap_free_min = free
+        return free
+
+    def payload(self):
+        """JSON metrics message for the interval; starts the next one."""
+        self.seq += 1
+        free = self.poll_heap()
+        payload = ujson.dumps({
+            "seq": self.seq,
+            "interval_ms": ticks_diff(ticks_ms(), self.t_start),
+            "i2c_us": [hist.summary() for hist in self.i2c],
+            "jitter_us": self.jitter.summary(),
+            "frame_fill_ms": self.frame_fill.summary(),
+            "queue_depth": list(self.queue_depth),
+            "sd_write_us": self.sd_write.summary(),
+            "mqtt_publish_us": self.mqtt_publish.summary(),
+            "gc": [self.gc_seen, free, self.heap_free_min],
+            "reconnects": self.reconnects,
+            "connect_step_us": self.connect_step.summary(),
+        }).encode()
+        self.reset()
+        return payload
@@ -0,0 +1,179 @@
+"""
+Filename: mqttconnect.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Non-blocking (re)connect for umqtt.simple's MQTTClient, run as a
+    uasyncio coroutine on the same loop as the sampler.
+
+    MQTTClient.connect() resolves the broker, opens the TCP connection,
+    runs the TLS handshake and waits for CONNACK, all on a blocking
+    socket, and subscribe() then waits for its SUBACK the same way. With
+    the broker unreachable that holds the loop, and with it sampling, for
+    the whole socket timeout. Here the socket is non-blocking from the
+    start: the TCP connect is polled for completion, the TLS handshake
+    (wrap_socket with do_handshake=False) advances inside the
+    non-blocking writes of the CONNECT packet, and CONNACK and SUBACK are
+    read as they arrive. Between steps the coroutine sleeps, so a dead
+    broker costs timeouts, not samples.
+
+    Two steps still run to completion in one call. getaddrinfo() blocks
+    for the DNS round trip, so the broker address is resolved once and
+    cached. The TLS public-key operations are plain computation inside
+    one write(); MicroPython's ssl exposes no session to resume, so every
+    reconnect pays for them. Each step's duration goes to 'hist' (a
+    metrics.LatencyHist) when one is attached, and the longest step is
+    kept for the last connect (step_max_us) and since boot
+    (block_max_us), so that cost can be measured on the hold.
+"""
+
+import socket
+import select
+import struct
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_us, ticks_add, ticks_diff
+from micropython import const
+from lib.umqtt.simple import MQTTException
+
+_EAGAIN = const(11)
+_ETIMEDOUT = const(110)
+_ECONNREFUSED = const(111)
+_EINPROGRESS = const(115)
+_STEP_MS = const(10)  # sleep between non-blocking steps
+
+
+class Connector:
+    def __init__(self, client, timeout_ms):
+        self.client = client
+        self.timeout_ms = timeout_ms
+        self.addr = None
+        self.hist = None
+        self.step_max_us = 0
+        self.block_max_us = 0
+
+    def _step(self, fn, arg):
+        # One non-blocking socket call, timed. None when it would block
+        t_start = ticks_us()
+        try:
+            return fn(arg)
+        except OSError as e:
+            if e.args[0] not in (_EAGAIN, _EINPROGRESS):
+                raise
+            return None
+        finally:
+            t = ticks_diff(ticks_us(), t_start)
+            if t > self.step_max_us:
+                self.step_max_us = t
+                if t > self.block_max_us:
+                    self.block_max_us = t
+            if self.hist is not None:
+                self.hist.add(t)
+
+    async def _wait(self, deadline):
+        if ticks_diff(deadline, ticks_ms()) <= 0:
+            raise OSError(_ETIMEDOUT)
+        await asyncio.sleep_ms(_STEP_MS)
+
+    async def _send(self, data, deadline):
+        sock = self.client.sock
+        mv = memoryview(data)
+        while len(mv):
+            n = self._step(sock.write, mv)
+            if n:
+                mv = mv[n:]
+            else:
+                await self._wait(deadline)
+
+    async def _recv(self, n, deadline):
+        sock = self.client.sock
+        buf = b""
+        while len(buf) < n:
+            data = self._step(sock.read, n - len(buf))
+            if data == b"":
+                raise OSError(-1)  # closed by the broker
+            if data:
+                buf += data
+            else:
+                await self._wait(deadline)
+        return buf
+
+    async def connect(self, clean_session=True):
+        """Open the client's connection like MQTTClient.connect(), within
+           timeout_ms. Returns the session present flag. Raises OSError
+           on failure, MQTTException when the broker refuses."""
+        client = self.client
+        deadline = ticks_add(ticks_ms(), self.timeout_ms)
+        self.step_max_us = 0
+        if self.addr is None:
+            self.addr = socket.getaddrinfo(client.server, client.port)[0][-1]
+        sock = socket.socket()
+        client.sock = sock
+        sock.setblocking(False)
+        self._step(sock.connect, self.addr)
+        poller = select.poll()
+        poller.register(sock, select.POLLOUT)
+        while True:
+            ready = poller.poll(0)
+            if ready:
+                if ready[0][1] & (select.POLLERR | select.POLLHUP):
+                    raise OSError(_ECONNREFUSED)
+                break
+            await self._wait(deadline)
+        poller.unregister(sock)
+        if client.ssl is True:
+            import ssl
+            client.sock = ssl.wrap_socket(sock, do_handshake=False,
+                                          **client.ssl_params)
+        elif client.ssl:
+            client.sock = client.ssl.wrap_socket(
+                sock, server_hostname=client.server,
+                do_handshake_on_connect=False)
+        await self._send(_connect_packet(client, clean_session), deadline)
+        resp = await self._recv(4, deadline)
+        if resp[0] != 0x20 or resp[1] != 0x02:
+            raise OSError(-1)  # not a CONNACK
+        if resp[3] != 0:
+            raise MQTTException(resp[3])
+        client.sock.setblocking(True)
+        return resp[2] & 1
+
+    async def subscribe(self, topic, qos=0):
+        """MQTTClient.subscribe() without blocking, within timeout_ms."""
+        client = self.client
+        deadline = ticks_add(ticks_ms(), self.timeout_ms)
+        client.pid = client.pid % 65535 + 1
+        pkt = bytearray(b"\x82\0\0\0")
+        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, client.pid)
+        client.sock.setblocking(False)
+        await self._send(pkt + struct.pack("!H", len(topic)) + topic +
+                         bytes((qos,)), deadline)
+        resp = await self._recv(5, deadline)
+        if resp[0] != 0x90 or resp[2:4] != pkt[2:4]:
+            raise OSError(-1)  # not our SUBACK
+        if resp[4] == 0x80:
+            raise MQTTException(resp[4])
+        client.sock.setblocking(True)
+
+
+# The CONNECT packet MQTTClient.connect() sends, as one buffer
+def _connect_packet(client, clean_session):
+    flags = clean_session << 1
+    body = struct.pack("!H", len(client.client_id)) + client.client_id
+    if client.lw_topic:
+        flags |= (0x4 | (client.lw_qos & 0x1) << 3 |
+                  (client.lw_qos & 0x2) << 3 | client.lw_retain << 5)
+        body += (struct.pack("!H", len(client.lw_topic)) + client.lw_topic +
+                 struct.pack("!H", len(client.lw_msg)) + client.lw_msg)
+    if client.user:
+        flags |= 0xC0
+        body += (struct.pack("!H", len(client.user)) + client.user +
+                 struct.pack("!H", len(client.pswd)) + client.pswd)
+    var = b"\x00\x04MQTT\x04" + bytes((flags,)) + struct.pack(
+        "!H", client.keepalive)
+    sz = len(var) + len(body)
+    pkt = bytearray(b"\x10")
+    while sz > 0x7F:
+        pkt.append((sz & 0x7F) | 0x80)
+        sz >>= 7
+    pkt.append(sz)
+    return pkt + var + body
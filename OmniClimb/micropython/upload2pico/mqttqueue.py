@@ -0,0 +1,194 @@
+"""
+Filename: mqttqueue.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Non-blocking publishing layer on top of umqtt.simple's MQTTClient.
+
+    MQTTClient.publish() writes the whole packet to the socket and, at
+    QoS 1, waits in wait_msg() for the PUBACK. Over TLS on a busy network
+    that stalls the caller for as long as the broker takes. Here publish()
+    only encodes the packet into a bounded queue and returns; poll(),
+    called from the MQTT task, reads incoming packets (commands, PUBACKs)
+    and writes as much of the queue as the socket accepts without
+    blocking, resuming a partially written packet on the next poll.
+
+    QoS 1 messages get a packet id when they are sent and stay in the
+    in-flight window (up to 'window' messages) until their PUBACK
+    arrives. Messages leave the queue in order, so a full window holds
+    back the messages behind it. After a reconnect, restart() queues the
+    unacknowledged messages again with the DUP flag set, ahead of
+    everything else.
+
+    The queue holds at most max_messages packets and max_bytes bytes.
+    A QoS 1 message that does not fit evicts the oldest queued QoS 0
+    message; otherwise the new message is dropped and counted.
+    publish() may be called from either core.
+"""
+
+import struct
+import _thread
+from utime import ticks_ms, ticks_diff, sleep_ms
+
+_EAGAIN = 11
+
+
+class PublishQueue:
+    def __init__(self, client, max_messages=16, max_bytes=8192, window=4):
+        self.client = client
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.window = window
+        # Queued entries are [packet, offset of the packet id (0 for
+        # QoS 0), packet id (0 until assigned)]
+        self.queue = []
+        self.queued_bytes = 0
+        self.inflight = []  # [pid, packet] in send order
+        self.current = None
+        self.offset = 0
+        self.lock = _thread.allocate_lock()
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.retransmits = 0
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        """Queue a message. Returns False if it was dropped."""
+        sz = 2 + len(topic) + len(msg) + (2 if qos else 0)
+        header = bytearray(b"\x30\0\0\0\0")
+        header[0] |= qos << 1 | retain
+        i = 1
+        while sz > 0x7F:
+            header[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        header[i] = sz
+        pkt = (header[:i + 1] + struct.pack("!H", len(topic)) + topic +
+               (b"\0\0" if qos else b"") + msg)
+        pid_offset = i + 3 + len(topic) if qos else 0
+
+        with self.lock:
+            if not self._make_room(len(pkt), qos):
+                self.dropped += 1
+                return False
+            self.queue.append([pkt, pid_offset, 0])
+            self.queued_bytes += len(pkt)
+        return True
+
+    def _make_room(self, nbytes, qos):
+        # Evict queued QoS 0 messages for a QoS 1 message if needed
+        while (len(self.queue) >= self.max_messages or
+               self.queued_bytes + nbytes > self.max_bytes):
+            if not qos:
+                return False
+            for i in range(len(self.queue)):
+                entry = self.queue[i]
+                if not entry[1]:
+                    self.queue.pop(i)
+                    self.queued_bytes -= len(entry[0])
+                    self.dropped += 1
+                    break
+            else:
+                return False
+        return True
+
+    def depth(self):
+        return len(self.queue)
+
+    def _next(self):
+        # Make the next queued packet current, if the window allows
+        with self.lock:
+            if not self.queue:
+                return False
+            entry = self.queue[0]
+            pkt, pid_offset, pid = entry
+            if pid_offset and len(self.inflight) >= self.window:
+                return False
+            self.queue.pop(0)
+            self.queued_bytes -= len(pkt)
+            if pid_offset:
+                if not pid:
+                    client = self.client
+                    client.pid = client.pid % 65535 + 1
+                    pid = client.pid
+                    struct.pack_into("!H", pkt, pid_offset, pid)
+                self.inflight.append([pid, pkt])
+        self.current = pkt
+        self.offset = 0
+        return True
+
+    def _write(self):
+        sock = self.client.sock
+        sock.setblocking(False)
+        try:
+            while True:
+                if self.current is None and not self._next():
+                    return
+                n = sock.write(memoryview(self.current)[self.offset:])
+                if not n:
+                    return  # socket buffer full
+                self.offset += n
+                if self.offset == len(self.current):
+                    self.current = None
+                    self.sent += 1
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                raise
+        finally:
+            sock.setblocking(True)
+
+    def _puback(self):
+        sock = self.client.sock
+        sz = sock.read(1)
+        pid = sock.read(2)
+        if sz != b"\x02" or pid is None or len(pid) != 2:
+            raise OSError(-1)  # framing lost, reconnect
+        pid = pid[0] << 8 | pid[1]
+        with self.lock:
+            for i in range(len(self.inflight)):
+                if self.inflight[i][0] == pid:
+                    self.inflight.pop(i)
+                    self.acked += 1
+                    break
+
+    def poll(self, max_packets=8):
+        """Handle up to max_packets incoming packets, then write queued
+           packets until the socket would block. Raises OSError when the
+           connection is lost."""
+        client = self.client
+        for _ in range(max_packets):
+            op = client.check_msg()
+            if op is None:
+                break
+            if op == 0x40:  # PUBACK
+                self._puback()
+        self._write()
+
+    def restart(self):
+        """After a reconnect: resend the unacknowledged QoS 1 messages
+           (DUP set) and any partially written packet, ahead of the
+           queue."""
+        with self.lock:
+            resend = []
+            for pid, pkt in self.inflight:
+                pkt[0] |= 0x08
+                resend.append([pkt, 1, pid])
+                self.queued_bytes += len(pkt)
+            self.retransmits += len(resend)
+            current = self.current
+            if current is not None and not current[0] & 0x06:
+                resend.append([current, 0, 0])
+                self.queued_bytes += len(current)
+            self.queue = resend + self.queue
+            self.inflight = []
+            self.current = None
+            self.offset = 0
+
+    def flush(self, timeout_ms):
+        """Poll until everything is sent and acknowledged or timeout_ms
+           passed. Blocks, so it is meant for shutdown."""
+        t_start = ticks_ms()
+        while ((self.queue or self.inflight or self.current is not None) and
+               ticks_diff(ticks_ms(), t_start) < timeout_ms):
+            self.poll()
+            sleep_ms(10)
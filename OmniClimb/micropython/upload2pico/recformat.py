@@ -0,0 +1,231 @@
+"""
+Filename: recformat.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Binary recording format for the Core 1 SD writer in main.py.
+
+    A binary recording starts with a small self-describing header followed
+    by every queued frame in a CRC-checked chunk (see below), which
+    sdstream.RecordingFile fills straight from the frame's 'array' buffer,
+    so no string formatting happens on the Pico. The host-side decoder
+    (OmniClimb/host/decode_recording.py) turns these files into CSV or
+    NumPy arrays.
+
+    From version 3 the file is preallocated and sector aligned so that a
+    power loss only costs the data in flight:
+
+        sector 0            file header, zero padded
+        sectors 1..         chunks, each padded to whole sectors
+        last sector         footer, rewritten at every checkpoint
+
+    Chunk header (little endian), followed by the frame bytes:
+        magic               4s  b"OCCK"
+        recording id        I   random, also in the file header
+        sequence            I   0, 1, 2, ...
+        payload bytes       H
+        samples             H
+        anchor ticks        I   version 4: ticks_ms of the first sample
+        anchor epoch        q   version 4: Unix epoch ms at anchor ticks
+                                (timebase.py), 0 when the Pico had no
+                                time base
+        crc32               I   over the 16 (version 3) or 28 (version 4)
+                                bytes above and the payload
+
+    The anchors let the host put the samples of every hold on one epoch
+    time axis; they follow any resync of the Pico's time base.
+
+    Footer (little endian):
+        magic               4s  b"OCFT"
+        recording id        I
+        chunks              I   chunks written at the checkpoint
+        samples             I
+        next sector         I   first unused sector after the chunks
+        closed              I   1 once the recording ended cleanly
+        crc32               I   over the 24 bytes above
+
+    The decoder walks the chunks from sector 1 and stops at the first one
+    whose magic, recording id, sequence or CRC does not match.
+
+    Header layout (little endian):
+        magic               4s  b"OCLB"
+        version             B
+        channels            B   number of ADC columns after the timestamp
+        header size         H   bytes, including the channel map
+        sample interval     H   ms
+        samples per frame   H
+        gain                B   ADS1115 gain index (0 = 2/3x, 1 = 1x, ...)
+        typecode            1s  array typecode of the frame items
+        pico id             16s NUL padded client ID
+        data bytes          I   version 2: valid frame bytes after the
+                                header, or 0 when the file ends with the
+                                data; unused (0) from version 3
+        recording id        I   version 3 and later
+        encoding            B   version 5: how the frames are stored
+        layout              B   version 6: LAYOUT_* of the frames
+        channel map         channels x B, ADS1115 input of each column
+
+    Up to version 5 (LAYOUT_ROWS) each frame is samples_per_frame rows of
+    (timestamp, ch0, ch1, ...) as typecode items. From version 6 frames
+    are 'h' arrays, the same in the frame ring and on the card:
+
+        base ticks          2 x h   ticks_ms of the first sample, low half
+                                    first (a little-endian I on the card)
+        tick offsets        samples x H   ticks_ms - base per sample;
+                                    LAYOUT_COMPACT only
+        values              samples x channels x h   ADC counts, sample
+                                    by sample
+
+    LAYOUT_COMPACT_GRID leaves the offsets out: sample k was taken at
+    base + k * interval, which only holds while no sample is missed.
+
+    With ENCODING_RAW the payload holds the frame's array items; with
+    ENCODING_DELTA it is delta/varint coded by framecodec.py, or raw when
+    that would not be smaller (the payload is then exactly the size of the
+    raw frame).
+"""
+
+import struct
+from micropython import const
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+MAGIC = b"OCLB"
+VERSION = const(6)
+
+# Frame encodings of version 5
+ENCODING_RAW = const(0)
+ENCODING_DELTA = const(1)
+
+# Frame layouts of version 6
+LAYOUT_ROWS = const(0)
+LAYOUT_COMPACT = const(1)
+LAYOUT_COMPACT_GRID = const(2)
+COMPACT_BASE_ITEMS = const(2)  # items of the base ticks
+
+_HEADER_FMT = "<4sBBHHHB1s16sIIBB"
+_HEADER_SIZE = const(40)
+
+CHUNK_MAGIC = b"OCCK"
+_CHUNK_FMT = "<4sIIHHIq"
+_CHUNK_ID_FMT = "<4sIIHH"  # the fields shared with version 3
+_CHUNK_CRC_OFFSET = const(28)
+CHUNK_HEADER_SIZE = const(32)  # including the CRC
+_CHUNK_V3_HEADER_SIZE = const(20)
+
+FOOTER_MAGIC = b"OCFT"
+_FOOTER_FMT = "<4sIIIII"
+_FOOTER_SIZE = const(24)  # excluding the CRC
+
+_SECTOR = const(512)
+
+
+# Table-driven CRC-32 for ports built without binascii.crc32
+if crc32 is None:
+    from array import array
+    _CRC_TABLE = array('I', (0 for _ in range(256)))
+    for _i in range(256):
+        _c = _i
+        for _ in range(8):
+            _c = (_c >> 1) ^ 0xEDB88320 if _c & 1 else _c >> 1
+        _CRC_TABLE[_i] = _c
+
+    def crc32(data, crc=0):
+        crc ^= 0xFFFFFFFF
+        for b in data:
+            crc = _CRC_TABLE[(crc ^ b) & 0xFF] ^ (crc >> 8)
+        return crc ^ 0xFFFFFFFF
+
+
+# Build the file header for a binary recording
+def pack_header(pico_id, channel_map, sample_interval_ms, samples_per_frame,
+                gain, typecode="h", recording_id=0, encoding=ENCODING_RAW,
+                layout=LAYOUT_COMPACT):
+    n_channels = len(channel_map)
+    header_size = _HEADER_SIZE + n_channels
+    buf = bytearray(header_size)
+    struct.pack_into(_HEADER_FMT, buf, 0, MAGIC, VERSION, n_channels,
+                     header_size, sample_interval_ms, samples_per_frame,
+                     gain, typecode.encode(), pico_id.encode()[:16], 0,
+                     recording_id, encoding, layout)
+    for i in range(n_channels):
+        buf[_HEADER_SIZE + i] = channel_map[i]
+    return buf
+
+
+# Items of a compact frame ('h' array), with or without the tick offsets
+def compact_items(samples, channels, offsets=True):
+    return COMPACT_BASE_ITEMS + samples * (channels + (1 if offsets else 0))
+
+
+# The 'h' item holding the low 16 bits of value
+def int16(value):
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+# Store the ticks of a compact frame's first sample
+def set_frame_base(frame, ticks):
+    frame[0] = int16(ticks)
+    frame[1] = int16(ticks >> 16)
+
+
+# Ticks of a compact frame's first sample
+def frame_base(frame):
+    return (frame[0] & 0xFFFF) | (frame[1] & 0xFFFF) << 16
+
+
+# Bytes taken by a chunk carrying payload_bytes, padded to whole sectors
+def chunk_size(payload_bytes, version=VERSION):
+    header = CHUNK_HEADER_SIZE if version >= 4 else _CHUNK_V3_HEADER_SIZE
+    n = header + payload_bytes
+    return (n + _SECTOR - 1) // _SECTOR * _SECTOR
+
+
+# Fill in the chunk header in front of a payload already copied to
+# buf[CHUNK_HEADER_SIZE:]
+def pack_chunk_header(buf, recording_id, sequence, payload_bytes, samples,
+                      anchor_ticks=0, anchor_epoch_ms=0):
+    struct.pack_into(_CHUNK_FMT, buf, 0, CHUNK_MAGIC, recording_id, sequence,
+                     payload_bytes, samples, anchor_ticks, anchor_epoch_ms)
+    mv = memoryview(buf)
+    crc = crc32(mv[:_CHUNK_CRC_OFFSET])
+    crc = crc32(mv[CHUNK_HEADER_SIZE:CHUNK_HEADER_SIZE + payload_bytes], crc)
+    struct.pack_into("<I", buf, _CHUNK_CRC_OFFSET, crc)
+
+
+# (recording id, sequence, payload bytes, samples) of the chunk header at
+# buf[0:] of any version, or None if it does not start with the chunk
+# magic. The CRC is left to the decoder
+def unpack_chunk_header(buf):
+    magic, rec_id, seq, nbytes, samples = struct.unpack_from(_CHUNK_ID_FMT,
+                                                             buf)
+    if magic != CHUNK_MAGIC:
+        return None
+    return rec_id, seq, nbytes, samples
+
+
+# Fill a sector buffer with the checkpoint footer
+def pack_footer(buf, recording_id, chunks, samples, next_sector, closed):
+    for i in range(len(buf)):
+        buf[i] = 0
+    struct.pack_into(_FOOTER_FMT, buf, 0, FOOTER_MAGIC, recording_id, chunks,
+                     samples, next_sector, closed)
+    struct.pack_into("<I", buf, _FOOTER_SIZE,
+                     crc32(memoryview(buf)[:_FOOTER_SIZE]))
+
+
+# (recording id, chunks, samples, next sector, closed) of a footer sector,
+# or None if it holds no valid footer
+def unpack_footer(buf):
+    fields = struct.unpack_from(_FOOTER_FMT, buf)
+    if fields[0] != FOOTER_MAGIC:
+        return None
+    crc, = struct.unpack_from("<I", buf, _FOOTER_SIZE)
+    if crc != crc32(memoryview(buf)[:_FOOTER_SIZE]):
+        return None
+    return fields[1:]
+
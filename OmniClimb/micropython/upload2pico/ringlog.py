@@ -0,0 +1,110 @@
+"""
+Filename: ringlog.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Leveled logger backed by a preallocated byte ring, for use on both
+    cores instead of print().
+
+    print() over USB-CDC blocks until the host reads the text and
+    allocates the formatted string on every call, which costs the sampler
+    milliseconds per frame. Here a message below the current level only
+    increments 'suppressed'; one at or above it is copied into the ring
+    and left there until a flush task drains it to the SD card or MQTT.
+    Messages at or above 'console_level' (warnings and errors by default)
+    are also printed, so failures still show on the REPL.
+
+    Hot-path call sites also guard the message formatting itself:
+        if __debug__ and log.level <= DEBUG:
+            log.debug(f"...")
+    With mpy-cross -O1 __debug__ is False and such blocks are removed
+    from the compiled firmware entirely.
+
+    When the ring fills before it is drained, the oldest text is
+    overwritten and counted in 'lost' (bytes).
+"""
+
+import _thread
+from utime import ticks_ms
+from micropython import const
+
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+_TAGS = {DEBUG: "D", INFO: "I", WARNING: "W", ERROR: "E"}
+
+
+class RingLog:
+    def __init__(self, size, level=INFO, console_level=WARNING):
+        self.buf = bytearray(size)
+        self.size = size
+        self.level = level
+        self.console_level = console_level
+        # Total bytes ever written and drained; their difference is the
+        # unread text in the ring
+        self.head = 0
+        self.tail = 0
+        self.suppressed = 0
+        self.lost = 0
+        self.lock = _thread.allocate_lock()
+
+    def log(self, level, msg):
+        if level < self.level:
+            self.suppressed += 1
+            return
+        if level >= self.console_level:
+            print(msg)
+        line = "{} {} {}\n".format(ticks_ms(), _TAGS.get(level, "?"),
+                                   msg).encode()
+        with self.lock:
+            self._put(line)
+
+    def debug(self, msg):
+        self.log(DEBUG, msg)
+
+    def info(self, msg):
+        self.log(INFO, msg)
+
+    def warning(self, msg):
+        self.log(WARNING, msg)
+
+    def error(self, msg):
+        self.log(ERROR, msg)
+
+    def _put(self, line):
+        n = len(line)
+        if n > self.size:
+            line = line[n - self.size:]
+            n = self.size
+        pos = self.head % self.size
+        first = min(n, self.size - pos)
+        self.buf[pos:pos + first] = line[:first]
+        if first < n:
+            self.buf[0:n - first] = line[first:]
+        self.head += n
+        overrun = self.head - self.tail - self.size
+        if overrun > 0:
+            self.lost += overrun
+            self.tail += overrun
+
+    def pending(self):
+        return self.head - self.tail
+
+    def drain(self, max_bytes):
+        """Remove and return up to max_bytes of the oldest unread text,
+           or None when the ring is empty."""
+        with self.lock:
+            n = min(self.head - self.tail, max_bytes)
+            if n <= 0:
+                return None
+            pos = self.tail % self.size
+            first = min(n, self.size - pos)
+            out = bytearray(n)
+            out[0:first] = self.buf[pos:pos + first]
+            if first < n:
+                out[first:n] = self.buf[0:n - first]
+            self.tail += n
+        return out
@@ -0,0 +1,89 @@
+"""
+Filename: sampleclock.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Fixed-phase sample scheduler for the ADC sampler in main.py.
+
+    Sample deadlines are absolute ticks_us() values, start + n * interval,
+    instead of "sleep for whatever is left of this interval". Time spent
+    on I2C reads, MQTT servicing or status publishing between frames is
+    absorbed by the next deadline rather than shifting every following
+    sample, so a recording stays on a uniform grid.
+
+    Each wakeup records its lateness (actual - nominal, in us) so the
+    min/mean/max jitter can be reported in the status payload, and in
+    'hist' (a metrics.LatencyHist) when one is attached.
+"""
+
+import uasyncio as asyncio
+from utime import ticks_us, ticks_add, ticks_diff, sleep_us
+
+
+class JitterStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, jitter_us):
+        if self.count == 0 or jitter_us < self.min:
+            self.min = jitter_us
+        if self.count == 0 or jitter_us > self.max:
+            self.max = jitter_us
+        self.total += jitter_us
+        self.count += 1
+
+    def mean(self):
+        return self.total // self.count if self.count else 0
+
+
+class SampleClock:
+    def __init__(self, interval_ms):
+        self.interval_us = interval_ms * 1000
+        self.jitter = JitterStats()
+        self.hist = None
+        self.deadline = ticks_us()
+        self.missed = 0
+
+    def start(self, at_us=None):
+        """Anchor the sample grid at the current time, or at the ticks_us()
+           value at_us for a scheduled start."""
+        self.deadline = ticks_us() if at_us is None else at_us
+        self.missed = 0
+
+    def remaining_us(self):
+        """Time until the next sample is due (negative when late)."""
+        return ticks_diff(self.deadline, ticks_us())
+
+    def mark(self):
+        """Record the jitter of the sample taken now and advance to the
+           next deadline. Whole intervals that have already passed are
+           skipped (and counted in missed) so the grid keeps its phase."""
+        late = -self.remaining_us()
+        if late >= self.interval_us:
+            skipped = late // self.interval_us
+            self.missed += skipped
+            late -= skipped * self.interval_us
+            self.deadline = ticks_add(self.deadline,
+                                      skipped * self.interval_us)
+        self.jitter.add(late)
+        if self.hist is not None:
+            self.hist.add(late)
+        self.deadline = ticks_add(self.deadline, self.interval_us)
+
+    async def wait_async(self):
+        """Wait until the next sample is due, then mark it. Other
+           uasyncio tasks run during the coarse part of the wait; the
+           last millisecond is slept with sleep_us."""
+        remaining = self.remaining_us()
+        if remaining > 2000:
+            await asyncio.sleep_ms(remaining // 1000 - 1)
+            remaining = self.remaining_us()
+        if remaining > 0:
+            sleep_us(remaining)
+        self.mark()
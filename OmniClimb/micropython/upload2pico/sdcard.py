@@ -10,9 +10,17 @@ Changes for increased read throughput:
 
 Line 19: _CMD_TIMEOUT = const(100) to _CMD_TIMEOUT = const(1000)
 Line 172: time.sleep_ms(1) to time.sleep(0.0001)
+
+Changes for sustained logging:
+
+stream_begin/stream_write/stream_end keep one CMD25 multi-block write
+open for a whole recording, pre-erased with ACMD23, and record the
+latency of every sector in write_hist. Busy waits poll into a
+preallocated buffer instead of allocating a byte per poll.
 """
 
 from micropython import const
+from array import array
 import time
 
 
@@ -29,6 +37,11 @@ _TOKEN_CMD25 = const(0xFC)
 _TOKEN_STOP_TRAN = const(0xFD)
 _TOKEN_DATA = const(0xFE)
 
+# Sector write latency histogram: bucket 0 is < 128 us, each following
+# bucket doubles the limit, the last one collects everything slower
+_HIST_BUCKETS = const(12)
+_HIST_SHIFT = const(7)
+
 
 class SDCard:
     def __init__(self, spi, cs, baudrate=1320000):
@@ -42,6 +55,10 @@ class SDCard:
             self.dummybuf[i] = 0xFF
         self.dummybuf_memoryview = memoryview(self.dummybuf)
 
+        self.write_hist = array('I', (0 for _ in range(_HIST_BUCKETS)))
+        self.write_max_us = 0
+        self.streaming = False
+
         # initialise the card
         self.init_card(baudrate)
 
@@ -197,25 +214,29 @@ class SDCard:
         self.spi.write(b"\xff")
 
         # check the response
-        if (self.spi.read(1, 0xFF)[0] & 0x1F) != 0x05:
+        self.spi.readinto(self.tokenbuf, 0xFF)
+        if (self.tokenbuf[0] & 0x1F) != 0x05:
             self.cs(1)
             self.spi.write(b"\xff")
-            return
+            return False
 
         # wait for write to finish
-        while self.spi.read(1, 0xFF)[0] == 0:
-            pass
+        self.spi.readinto(self.tokenbuf, 0xFF)
+        while self.tokenbuf[0] == 0:
+            self.spi.readinto(self.tokenbuf, 0xFF)
 
         self.cs(1)
         self.spi.write(b"\xff")
+        return True
 
     def write_token(self, token):
         self.cs(0)
         self.spi.read(1, token)
         self.spi.write(b"\xff")
         # wait for write to finish
-        while self.spi.read(1, 0xFF)[0] == 0x00:
-            pass
+        self.spi.readinto(self.tokenbuf, 0xFF)
+        while self.tokenbuf[0] == 0x00:
+            self.spi.readinto(self.tokenbuf, 0xFF)
 
         self.cs(1)
         self.spi.write(b"\xff")
@@ -270,6 +291,49 @@ class SDCard:
                 nblocks -= 1
             self.write_token(_TOKEN_STOP_TRAN)
 
+    def stream_begin(self, block_num, nblocks):
+        """Open a multi-block write at block_num. ACMD23 tells the card
+        how many blocks follow so it can pre-erase them."""
+        if self.cmd(55, 0, 0) > 1 or self.cmd(23, nblocks, 0) != 0:
+            raise OSError(5)  # EIO
+        if self.cmd(25, block_num * self.cdv, 0) != 0:
+            raise OSError(5)  # EIO
+        self.streaming = True
+
+    def stream_write(self, buf):
+        """Append whole 512-byte sectors to the open multi-block write."""
+        nblocks, err = divmod(len(buf), 512)
+        assert not err, "Buffer length is invalid"
+        mv = memoryview(buf)
+        offset = 0
+        hist = self.write_hist
+        while nblocks:
+            t_start = time.ticks_us()
+            if not self.write(_TOKEN_CMD25, mv[offset : offset + 512]):
+                raise OSError(5)  # EIO, data rejected
+            latency = time.ticks_diff(time.ticks_us(), t_start)
+            if latency > self.write_max_us:
+                self.write_max_us = latency
+            bucket = 0
+            t = latency >> _HIST_SHIFT
+            while t and bucket < _HIST_BUCKETS - 1:
+                t >>= 1
+                bucket += 1
+            hist[bucket] += 1
+            offset += 512
+            nblocks -= 1
+
+    def stream_end(self):
+        """Close the multi-block write."""
+        if self.streaming:
+            self.write_token(_TOKEN_STOP_TRAN)
+            self.streaming = False
+
+    def reset_write_stats(self):
+        for i in range(_HIST_BUCKETS):
+            self.write_hist[i] = 0
+        self.write_max_us = 0
+
     def ioctl(self, op, arg):
         if op == 4:  # get number of blocks
             return self.sectors
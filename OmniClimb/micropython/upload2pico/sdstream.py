@@ -0,0 +1,310 @@
+"""
+Filename: sdstream.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Streaming, sector-aligned recording files on the SD card.
+
+    A recording file is preallocated to a fixed size through the normal
+    VFS, then its sector range is looked up directly in the FAT32
+    structures. When the clusters are contiguous, chunks are streamed into
+    that range with one open multi-block write (sdcard.stream_*), so a
+    recording performs no FAT or directory updates and no partial-sector
+    read-modify-write. The file size never changes; a footer in the last
+    sector records how much of it holds valid chunks (see recformat.py).
+
+    Only FAT32 volumes are handled. For FAT12/16/exFAT cards or fragmented
+    files locate() returns None and the recorder falls back to ordinary
+    file writes.
+"""
+
+import struct
+import micropython
+import recformat
+from micropython import const
+
+_SECTOR = const(512)
+_ATTR_LFN = const(0x0F)
+_ATTR_DIR = const(0x10)
+_FAT32_EOC = const(0x0FFFFFF8)
+
+
+# Grow a new file to nbytes without writing its data. Seeking past the
+# end of a file opened for writing makes FatFs allocate the clusters
+def preallocate(path, nbytes):
+    with open(path, "wb") as f:
+        f.seek(nbytes - 1)
+        f.write(b"\0")
+
+
+class _Fat32:
+    def __init__(self, sd):
+        self.sd = sd
+        self.buf = bytearray(_SECTOR)
+        self.fat_sector = -1
+        self.fat_buf = bytearray(_SECTOR)
+
+        sd.readblocks(0, self.buf)
+        buf = self.buf
+        if buf[510] != 0x55 or buf[511] != 0xAA:
+            raise ValueError("no boot signature")
+        part_lba = 0
+        if buf[82:87] != b"FAT32":
+            # MBR: use the first partition
+            part_lba = struct.unpack_from("<I", buf, 454)[0]
+            sd.readblocks(part_lba, buf)
+            if buf[82:87] != b"FAT32":
+                raise ValueError("not a FAT32 volume")
+
+        (bytes_per_sector, self.sectors_per_cluster, reserved,
+         num_fats) = struct.unpack_from("<HBHB", buf, 11)
+        if bytes_per_sector != _SECTOR:
+            raise ValueError("unsupported sector size")
+        fat_size, = struct.unpack_from("<I", buf, 36)
+        self.root_cluster, = struct.unpack_from("<I", buf, 44)
+        self.fat_start = part_lba + reserved
+        self.data_start = self.fat_start + num_fats * fat_size
+
+    def cluster_sector(self, cluster):
+        return self.data_start + (cluster - 2) * self.sectors_per_cluster
+
+    def next_cluster(self, cluster):
+        sector = self.fat_start + (cluster * 4) // _SECTOR
+        if sector != self.fat_sector:
+            self.sd.readblocks(sector, self.fat_buf)
+            self.fat_sector = sector
+        offset = (cluster * 4) % _SECTOR
+        return struct.unpack_from("<I", self.fat_buf, offset)[0] & 0x0FFFFFFF
+
+    def find(self, dir_cluster, name):
+        """Return (first cluster, size, attributes) of an entry."""
+        name = name.lower()
+        lfn = ""
+        buf = self.buf
+        cluster = dir_cluster
+        while cluster < _FAT32_EOC:
+            first = self.cluster_sector(cluster)
+            for sector in range(first, first + self.sectors_per_cluster):
+                self.sd.readblocks(sector, buf)
+                for pos in range(0, _SECTOR, 32):
+                    tag = buf[pos]
+                    if tag == 0x00:
+                        raise OSError(2)  # ENOENT
+                    if tag == 0xE5:
+                        lfn = ""
+                        continue
+                    attr = buf[pos + 11]
+                    if attr == _ATTR_LFN:
+                        part = _lfn_chars(buf, pos)
+                        lfn = part + lfn if not tag & 0x40 else part
+                        continue
+                    entry_name = lfn if lfn else _short_name(buf, pos)
+                    lfn = ""
+                    if entry_name.lower() == name:
+                        hi, = struct.unpack_from("<H", buf, pos + 20)
+                        lo, = struct.unpack_from("<H", buf, pos + 26)
+                        size, = struct.unpack_from("<I", buf, pos + 28)
+                        return (hi << 16) | lo, size, attr
+            cluster = self.next_cluster(cluster)
+        raise OSError(2)  # ENOENT
+
+
+def _lfn_chars(buf, pos):
+    chars = []
+    for start, count in ((1, 5), (14, 6), (28, 2)):
+        for i in range(count):
+            c = buf[pos + start + 2 * i] | buf[pos + start + 2 * i + 1] << 8
+            if c == 0x0000 or c == 0xFFFF:
+                return "".join(chars)
+            chars.append(chr(c))
+    return "".join(chars)
+
+
+def _short_name(buf, pos):
+    base = bytes(buf[pos:pos + 8]).decode().rstrip()
+    ext = bytes(buf[pos + 8:pos + 11]).decode().rstrip()
+    return base + "." + ext if ext else base
+
+
+# Find the sector range of a file on a FAT32 card mounted at mount_point.
+# Returns (first sector, sector count) when the file's clusters are
+# contiguous, otherwise None. Errors go to log (a ringlog.RingLog), if any
+def locate(sd, path, mount_point="/sd", log=None):
+    try:
+        fat = _Fat32(sd)
+        parts = [p for p in path[len(mount_point):].split("/") if p]
+        cluster = fat.root_cluster
+        for i, part in enumerate(parts):
+            cluster, size, attr = fat.find(cluster, part)
+            if i < len(parts) - 1 and not attr & _ATTR_DIR:
+                return None
+        if cluster < 2 or size == 0:
+            return None
+
+        cluster_bytes = fat.sectors_per_cluster * _SECTOR
+        clusters = (size + cluster_bytes - 1) // cluster_bytes
+        c = cluster
+        for _ in range(clusters - 1):
+            nxt = fat.next_cluster(c)
+            if nxt != c + 1:
+                return None  # fragmented
+            c = nxt
+        return fat.cluster_sector(cluster), size // _SECTOR
+    except (OSError, ValueError) as e:
+        if log is not None:
+            log.warning(f"sdstream: cannot locate {path}: {e}")
+        return None
+
+
+# Byte copy between any two buffers (e.g. an 'i' frame into the staging
+# bytearray) without allocating; slice assignment rejects mixed typecodes
+@micropython.viper
+def _copy(dst, dst_off: int, src, src_off: int, n: int):
+    d = ptr8(dst)
+    s = ptr8(src)
+    i = 0
+    while i < n:
+        d[dst_off + i] = s[src_off + i]
+        i += 1
+
+
+class RecordingFile:
+    """Preallocated, sector-aligned recording file (recformat version 3 and
+       later).
+       Each frame becomes one CRC-protected chunk of whole sectors and a
+       footer in the last sector is checkpointed every few chunks. An
+       encoder (framecodec.FrameEncoder) given to open() compresses each
+       frame straight into the chunk buffer. Chunks
+       are streamed straight into the file's sectors when it is
+       contiguous, otherwise written through the VFS; in both cases the
+       file never grows, so no FAT updates happen while recording.
+       Messages go to log (a ringlog.RingLog), as this runs on Core 1."""
+
+    def __init__(self, sd, max_payload, checkpoint_chunks, log=None):
+        self.sd = sd
+        self.log = log
+        self.chunk = bytearray(recformat.chunk_size(max_payload))
+        self.sector = bytearray(_SECTOR)
+        self.checkpoint_chunks = checkpoint_chunks
+        self.f = None
+        self.streaming = False
+
+    def open(self, path, nbytes, header, recording_id, encoder=None):
+        self.recording_id = recording_id
+        self.encoder = encoder
+        self.chunks = 0
+        self.samples = 0
+        self.next_sector = 1  # sector 0 holds the header
+        self.nsectors = nbytes // _SECTOR
+        self.footer_sector = self.nsectors - 1
+
+        preallocate(path, nbytes)
+        extent = locate(self.sd, path, log=self.log)
+
+        sector = self.sector
+        for i in range(_SECTOR):
+            sector[i] = 0
+        sector[:len(header)] = header
+
+        if extent is not None:
+            self.first_block = extent[0]
+            self.sd.writeblocks(self.first_block, sector)
+            self._write_footer(0)
+            self.sd.stream_begin(self.first_block + 1,
+                                 self.footer_sector - 1)
+            self.streaming = True
+        else:
+            if self.log is not None:
+                self.log.warning("sdstream: file not contiguous, using VFS "
+                                 "writes")
+            self.f = open(path, "r+b")
+            self.f.write(sector)
+            self._write_footer(0)
+        return self.streaming
+
+    def write(self, payload, nbytes, samples, anchor_ticks=0,
+              anchor_epoch_ms=0):
+        """Append one frame of nbytes as a chunk, with its time anchor."""
+        chunk = self.chunk
+        encoded = -1
+        if self.encoder is not None:
+            encoded = self.encoder.encode(chunk, recformat.CHUNK_HEADER_SIZE,
+                                          payload)
+        if encoded >= 0:
+            nbytes = encoded
+        else:
+            _copy(chunk, recformat.CHUNK_HEADER_SIZE, payload, 0, nbytes)
+        size = recformat.chunk_size(nbytes)
+        nsec = size // _SECTOR
+        if self.next_sector + nsec > self.footer_sector:
+            raise OSError(28)  # ENOSPC, preallocated file is full
+
+        for i in range(recformat.CHUNK_HEADER_SIZE + nbytes, size):
+            chunk[i] = 0
+        recformat.pack_chunk_header(chunk, self.recording_id, self.chunks,
+                                    nbytes, samples, anchor_ticks,
+                                    anchor_epoch_ms)
+
+        mv = memoryview(chunk)[:size]
+        if self.streaming:
+            self.sd.stream_write(mv)
+        else:
+            self.f.write(mv)
+        self.next_sector += nsec
+        self.chunks += 1
+        self.samples += samples
+
+        if self.chunks % self.checkpoint_chunks == 0:
+            self.checkpoint()
+
+    def checkpoint(self, closed=0):
+        """Write the footer so a reader knows how far the data is good."""
+        if self.streaming:
+            # The footer lies outside the open multi-block write
+            self.sd.stream_end()
+            self._write_footer(closed)
+            if not closed:
+                self.sd.stream_begin(self.first_block + self.next_sector,
+                                     self.footer_sector - self.next_sector)
+        else:
+            self.f.flush()
+            self._write_footer(closed)
+
+    def _write_footer(self, closed):
+        recformat.pack_footer(self.sector, self.recording_id, self.chunks,
+                              self.samples, self.next_sector, closed)
+        if self.f is None:
+            self.sd.writeblocks(self.first_block + self.footer_sector,
+                                self.sector)
+        else:
+            self.f.seek(self.footer_sector * _SECTOR)
+            self.f.write(self.sector)
+            self.f.seek(self.next_sector * _SECTOR)
+            self.f.flush()
+
+    def close(self):
+        try:
+            self.checkpoint(closed=1)
+        finally:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+            self.streaming = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        """Release the card after an error without another write."""
+        if self.streaming:
+            self.sd.stream_end()
+            self.streaming = False
+        if self.f is not None:
+            self.f.close()
+            self.f = None
@@ -0,0 +1,136 @@
+"""
+Filename: telemetry.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Live, decimated force telemetry published over MQTT while the full
+    rate recording continues on the SD card.
+
+    The sampler feeds every sample to a ForceDecimator, which reduces each
+    block of 'factor' samples (e.g. 5 samples at 50 Hz -> 10 Hz) to the
+    min, max and mean of each channel. Records are packed into preallocated
+    batches; a full batch is handed to the publisher task, which sends it
+    only while the byte budget allows so TLS publishing never starves the
+    sampler. Batches that do not fit the budget are dropped and counted.
+
+    Batch payload layout (little endian):
+        version     B   1
+        channels    B
+        records     B
+        units       B   0 = ADC counts, 1 = force in 0.1 lb (forcelut.py)
+        sequence    H   batch counter, wraps at 65536
+        then 'records' times:
+            ticks   I   ticks_ms of the first sample in the block
+            channels x (min h, max h, mean h)
+"""
+
+import struct
+from array import array
+from utime import ticks_ms, ticks_diff
+from micropython import const
+
+_VERSION = const(1)
+_HEADER_FMT = "<BBBBH"
+_HEADER_SIZE = const(6)
+
+
+class ForceDecimator:
+    def __init__(self, channels, factor, records_per_batch, units=0):
+        self.channels = channels
+        self.units = units
+        self.factor = factor
+        self.records_per_batch = records_per_batch
+        self.record_size = 4 + 6 * channels
+
+        self.mins = array('i', (0 for _ in range(channels)))
+        self.maxs = array('i', (0 for _ in range(channels)))
+        self.sums = array('i', (0 for _ in range(channels)))
+
+        # Two batches: one being filled, one waiting to be published
+        size = _HEADER_SIZE + records_per_batch * self.record_size
+        self.batches = (bytearray(size), bytearray(size))
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.block_ticks = 0
+        self.records = 0
+        self.filling = 0
+        self.ready = None
+        self.sequence = 0
+        self.dropped = 0
+
+    def add(self, frame, offset, timestamp):
+        """Add one sample whose channel values start at frame[offset]."""
+        mins = self.mins
+        maxs = self.maxs
+        sums = self.sums
+        if self.count == 0:
+            self.block_ticks = timestamp
+            for ch in range(self.channels):
+                v = frame[offset + ch]
+                mins[ch] = v
+                maxs[ch] = v
+                sums[ch] = v
+        else:
+            for ch in range(self.channels):
+                v = frame[offset + ch]
+                if v < mins[ch]:
+                    mins[ch] = v
+                if v > maxs[ch]:
+                    maxs[ch] = v
+                sums[ch] += v
+        self.count += 1
+        if self.count == self.factor:
+            self._emit_record()
+            self.count = 0
+
+    def _emit_record(self):
+        batch = self.batches[self.filling]
+        pos = _HEADER_SIZE + self.records * self.record_size
+        struct.pack_into("<I", batch, pos, self.block_ticks)
+        pos += 4
+        for ch in range(self.channels):
+            struct.pack_into("<hhh", batch, pos, self.mins[ch], self.maxs[ch],
+                             self.sums[ch] // self.factor)
+            pos += 6
+        self.records += 1
+        if self.records == self.records_per_batch:
+            if self.ready is not None:
+                # Publisher has not taken the previous batch yet
+                self.dropped += 1
+            struct.pack_into(_HEADER_FMT, batch, 0, _VERSION, self.channels,
+                             self.records, self.units,
+                             self.sequence & 0xFFFF)
+            self.sequence += 1
+            self.ready = batch
+            self.filling ^= 1
+            self.records = 0
+
+    def take(self):
+        """Return the next full batch to publish, or None."""
+        batch = self.ready
+        self.ready = None
+        return batch
+
+
+class ByteBudget:
+    """Token bucket limiting how many bytes per second may be published.
+       Tokens are kept in milli-bytes so frequent polls do not lose the
+       fractional refill."""
+
+    def __init__(self, bytes_per_s, burst):
+        self.rate = bytes_per_s
+        self.burst_mb = burst * 1000
+        self.tokens_mb = self.burst_mb
+        self.last = ticks_ms()
+
+    def allow(self, nbytes):
+        now = ticks_ms()
+        self.tokens_mb = min(self.burst_mb, self.tokens_mb +
+                             self.rate * ticks_diff(now, self.last))
+        self.last = now
+        if nbytes * 1000 > self.tokens_mb:
+            return False
+        self.tokens_mb -= nbytes * 1000
+        return True
@@ -0,0 +1,258 @@
+"""
+Filename: timebase.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Shared time base for the fleet: maps ticks_us()/ticks_ms() to Unix
+    epoch microseconds, so a start_recording command can name an absolute
+    start instant and every chunk of a recording can carry a (ticks,
+    epoch) anchor that the host aligns the holds with.
+
+    sync() runs several SNTP exchanges with the servers in
+    config_time.py, by default host/time_server.py on the hub PC, since
+    the gym often has no internet. For each exchange
+
+        delay  = (t4 - t1) - (t3 - t2)
+        offset = ((t2 - t1) + (t3 - t4)) / 2
+
+    where t1/t4 are the Pico's send/receive times and t2/t3 the server's
+    receive/transmit times. Wi-Fi delays are asymmetric now and then, so
+    only the exchanges with the smallest delay are kept and the median of
+    their offsets is used.
+
+    A sync never blocks the uasyncio loop for long: the socket is
+    non-blocking and polled between other tasks until the reply or a
+    timeout, and server names are resolved once and cached, so an
+    offline hub only costs the timeouts. Polling adds the time other
+    tasks hold the loop to t4 now and then; the lowest-delay filter drops
+    those exchanges.
+
+    Every sync is also a measurement of the crystal: the offsets of the
+    last few syncs against local time give the drift (a least squares
+    slope, in ppb), which is applied until the next sync. Resyncs only
+    happen between recordings, so a recording runs on one model. The
+    residual, the measured offset minus the model's prediction, is how
+    far the clock had wandered since the previous sync.
+
+    Local time is ticks_ms() for range and ticks_us() for resolution: an
+    elapsed time is counted in ms and corrected by the us ticks, which
+    stay valid across their 18 minute wrap. The model is one tuple that
+    is replaced as a whole, so Core 1 can read it while Core 0 resyncs.
+"""
+
+import struct
+import random
+import usocket
+import utime
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_us, ticks_add, ticks_diff
+from micropython import const
+
+_NTP_DELTA_S = 2208988800  # 1900-01-01 to 1970-01-01
+# Ports with a 2000-01-01 epoch (rp2) count RTC seconds from there
+_RTC_UNIX_OFFSET_S = 946684800 if utime.gmtime(0)[0] == 2000 else 0
+_RTC_VALID_YEAR = const(2024)  # an RTC before this was never set
+
+_TICKS_HALF = const(1 << 29)
+_TICKS_MASK = const((1 << 30) - 1)
+
+_TIMEOUT_MS = const(200)
+_SAMPLE_GAP_MS = const(20)
+_BEST = const(3)  # exchanges with the lowest delay that are kept
+_HISTORY = const(8)  # syncs used for the drift estimate
+_MIN_DRIFT_SPAN_US = 30000000
+_MAX_HISTORY_MS = 3 * 24 * 3600 * 1000  # well inside the ticks_ms range
+
+
+def _tick_edge():
+    # (ticks_ms, ticks_us) just after ticks_ms advanced, so converting a
+    # ticks_ms value later carries no sub-ms phase error
+    t = ticks_ms()
+    while ticks_ms() == t:
+        pass
+    return ticks_ms(), ticks_us()
+
+
+def _elapsed_us(ref_ms, ref_us, t_ms, t_us=None):
+    # Time from ref to t in us. The ms ticks give the range, the us ticks
+    # (when given) the exact value modulo their period
+    coarse = ticks_diff(t_ms, ref_ms) * 1000
+    if t_us is None:
+        return coarse
+    fine = ticks_diff(t_us, ref_us) - coarse
+    return coarse + ((fine + _TICKS_HALF) & _TICKS_MASK) - _TICKS_HALF
+
+
+def _ntp_us(buf, offset):
+    secs, frac = struct.unpack_from("!II", buf, offset)
+    return (secs - _NTP_DELTA_S) * 1000000 + (frac * 1000000 >> 32)
+
+
+class TimeBase:
+    def __init__(self):
+        # (ref ticks_ms, ref ticks_us, epoch us at ref, drift ppb)
+        self.model = None
+        self.source = None  # "ntp" or "rtc"
+        self.delay_us = 0
+        self.residual_us = 0
+        self.drift_ppb = 0
+        self.syncs = 0
+        self.last_sync = 0  # ticks_ms
+        self.history = []  # (us since origin, epoch us) per sync
+        self.origin = None
+        self.addrs = {}  # (host, port) -> resolved address
+
+    def synced(self):
+        return self.model is not None
+
+    def epoch_us(self, t_ms=None, t_us=None):
+        """Epoch us at ticks_ms t_ms (and ticks_us t_us for us
+           resolution); now by default. 0 when not synced."""
+        model = self.model
+        if model is None:
+            return 0
+        if t_ms is None:
+            t_ms = ticks_ms()
+            t_us = ticks_us()
+        ref_ms, ref_us, epoch, drift = model
+        dt = _elapsed_us(ref_ms, ref_us, t_ms, t_us)
+        return epoch + dt + dt * drift // 1000000000
+
+    def epoch_ms(self, ticks=None):
+        """Epoch ms at ticks_ms ticks (default now), or 0 when not
+           synced."""
+        return self.epoch_us(ticks) // 1000
+
+    def age_s(self):
+        return ticks_diff(ticks_ms(), self.last_sync) // 1000
+
+    def _resolve(self, host, port):
+        # getaddrinfo blocks, so a name is looked up only until it
+        # resolved once
+        addr = self.addrs.get((host, port))
+        if addr is None:
+            addr = usocket.getaddrinfo(host, port, 0,
+                                       usocket.SOCK_DGRAM)[0][-1]
+            self.addrs[(host, port)] = addr
+        return addr
+
+    async def _exchange(self, sock, addr, query):
+        # One SNTP exchange: (t1, t4) local us after ref, (t2, t3) epoch
+        # us. The transmit field carries a cookie the server echoes, so a
+        # late reply to an earlier exchange is skipped
+        for i in range(48):
+            query[i] = 0
+        query[0] = 0x23  # version 4, client
+        cookie = random.getrandbits(32)
+        struct.pack_into("!I", query, 44, cookie)
+        t1_ms = ticks_ms()
+        t1_us = ticks_us()
+        sock.sendto(query, addr)
+        deadline = ticks_add(t1_ms, _TIMEOUT_MS)
+        while True:
+            try:
+                reply = sock.recv(48)
+            except OSError:  # EAGAIN, nothing received yet
+                reply = None
+            if reply is not None:
+                t4_us = ticks_us()
+                t4_ms = ticks_ms()
+                if (len(reply) >= 48 and reply[0] & 7 == 4 and reply[1] and
+                        struct.unpack_from("!I", reply, 28)[0] == cookie):
+                    break
+            if ticks_diff(deadline, ticks_ms()) <= 0:
+                raise OSError(110)  # ETIMEDOUT
+            await asyncio.sleep_ms(0)
+        return (t1_ms, t1_us, t4_ms, t4_us, _ntp_us(reply, 32),
+                _ntp_us(reply, 40))
+
+    async def sync(self, servers, samples=8, abort=None):
+        """Sync to the first of servers ((host, port), ...) that answers.
+           Other uasyncio tasks run while waiting for a reply; the sync
+           is given up as soon as abort() returns True. Returns True on
+           success."""
+        query = bytearray(48)
+        for host, port in servers:
+            try:
+                addr = self._resolve(host, port)
+                sock = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+            except OSError:
+                continue
+            ref_ms, ref_us = _tick_edge()
+            results = []
+            try:
+                sock.setblocking(False)
+                for _ in range(samples):
+                    # Let the other tasks run between exchanges
+                    await asyncio.sleep_ms(_SAMPLE_GAP_MS)
+                    if abort is not None and abort():
+                        return False
+                    try:
+                        t1_ms, t1_us, t4_ms, t4_us, t2, t3 = (
+                            await self._exchange(sock, addr, query))
+                    except OSError:
+                        continue
+                    t1 = _elapsed_us(ref_ms, ref_us, t1_ms, t1_us)
+                    t4 = _elapsed_us(ref_ms, ref_us, t4_ms, t4_us)
+                    results.append(((t4 - t1) - (t3 - t2),
+                                    ((t2 - t1) + (t3 - t4)) // 2))
+            finally:
+                sock.close()
+            if results:
+                results.sort()
+                best = sorted(r[1] for r in results[:_BEST])
+                self._update(ref_ms, ref_us, best[len(best) // 2],
+                             results[0][0], "ntp")
+                return True
+        return False
+
+    def sync_rtc(self, timeout_ms=1100):
+        """Anchor to the RTC at its next second boundary. Returns False
+           if the RTC was never set."""
+        if utime.gmtime()[0] < _RTC_VALID_YEAR:
+            return False
+        second = utime.time()
+        t_start = ticks_ms()
+        while (utime.time() == second and
+               ticks_diff(ticks_ms(), t_start) < timeout_ms):
+            pass
+        ref_ms, ref_us = ticks_ms(), ticks_us()
+        self._update(ref_ms, ref_us,
+                     (utime.time() + _RTC_UNIX_OFFSET_S) * 1000000, 0, "rtc")
+        return True
+
+    def _update(self, ref_ms, ref_us, epoch, delay_us, source):
+        # New model from a measured epoch at ref; refits the drift
+        self.residual_us = (epoch - self.epoch_us(ref_ms, ref_us)
+                            if self.model is not None else 0)
+        if source != self.source or self.origin is None or (
+                ticks_diff(ref_ms, self.origin[0]) > _MAX_HISTORY_MS):
+            self.history = []
+            self.origin = (ref_ms, ref_us)
+            self.drift_ppb = 0
+        self.history.append((_elapsed_us(self.origin[0], self.origin[1],
+                                         ref_ms, ref_us), epoch))
+        if len(self.history) > _HISTORY:
+            self.history.pop(0)
+        self._fit_drift()
+        self.model = (ref_ms, ref_us, epoch, self.drift_ppb)
+        self.source = source
+        self.delay_us = delay_us
+        self.syncs += 1
+        self.last_sync = ref_ms
+
+    def _fit_drift(self):
+        # Least squares slope of (epoch - local) over local time
+        history = self.history
+        x0, e0 = history[0]
+        if len(history) < 2 or history[-1][0] - x0 < _MIN_DRIFT_SPAN_US:
+            return
+        xs = [float(x - x0) for x, _ in history]
+        ys = [float((e - e0) - (x - x0)) for x, e in history]
+        n = len(xs)
+        mx = sum(xs) / n
+        my = sum(ys) / n
+        sxx = sum((x - mx) ** 2 for x in xs)
+        sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+        if sxx > 0:
+            self.drift_ppb = int(sxy / sxx * 1e9)
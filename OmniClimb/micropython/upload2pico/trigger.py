@@ -0,0 +1,99 @@
+"""
+Filename: trigger.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Load trigger for recordings that keep only the frames around the
+    moments a hold is used, instead of hours of idle baseline.
+
+    Every sample is checked against two thresholds in ADC counts: a
+    capture starts when one of the watched columns reaches 'high' and
+    ends 'holdoff_ms' after all of them fell below 'low'. Going back
+    above 'low' (not necessarily 'high') restarts the hold-off, so a
+    climber shifting weight does not split a capture.
+
+    The sampler fills idle frames straight into the trigger's history
+    buffers, so no frame is copied while nothing happens. The last
+    'pre_frames' idle frames are kept. When a capture starts they are
+    handed out, oldest first, to be queued ahead of the frames of the
+    capture. Frames that fall out of the history are counted in 'skipped'.
+
+    Decisions are made per frame: a frame with any sample inside a
+    capture is recorded whole.
+"""
+
+from array import array
+from utime import ticks_diff
+
+
+class LoadTrigger:
+    def __init__(self, columns, high, low, holdoff_ms, pre_frames,
+                 frame_items, typecode='i'):
+        self.columns = tuple(columns)
+        self.high = high
+        self.low = low
+        self.holdoff_ms = holdoff_ms
+        # History, plus the idle frame being filled
+        self.buffers = [array(typecode, (0 for _ in range(frame_items)))
+                        for _ in range(pre_frames + 1)]
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.hit = False  # a sample of the current frame was in a capture
+        self.quiet = False  # below 'low' and counting the hold-off
+        self.quiet_since = 0
+        self.held = 0
+        self.next = 0
+        self.captures = 0
+        self.skipped = 0
+
+    def start_frame(self):
+        """Called before a frame is filled. Returns True when it goes to
+           the recording directly, as a capture is running."""
+        self.hit = self.active
+        return self.active
+
+    def buffer(self):
+        """Buffer for an idle frame: the one of the oldest frame held."""
+        return self.buffers[self.next]
+
+    def update(self, frame, base_idx, timestamp):
+        """Check the sample at frame[base_idx] (its first ADC column)."""
+        level = -32768
+        for column in self.columns:
+            value = frame[base_idx + column]
+            if value > level:
+                level = value
+        if level >= self.high:
+            if not self.active:
+                self.active = True
+                self.captures += 1
+            self.quiet = False
+        elif self.active:
+            if level >= self.low:
+                self.quiet = False
+            elif not self.quiet:
+                self.quiet = True
+                self.quiet_since = timestamp
+            elif ticks_diff(timestamp, self.quiet_since) >= self.holdoff_ms:
+                self.active = False
+                self.quiet = False
+        if self.active:
+            self.hit = True
+
+    def hold(self):
+        """Keep the idle frame just filled in buffer() in the history."""
+        self.next = (self.next + 1) % len(self.buffers)
+        if self.held < len(self.buffers):
+            self.held += 1
+        else:
+            self.skipped += 1
+
+    def release(self):
+        """The frames held, oldest first; empties the history."""
+        n = len(self.buffers)
+        first = self.next - self.held
+        frames = [self.buffers[(first + i) % n] for i in range(self.held)]
+        self.held = 0
+        return frames
@@ -0,0 +1,226 @@
+"""
+Filename: upload.py
+Date: 2026-10-17
+Version: 1.0
+Description:
+    Store-and-forward upload of finished recordings from /sd to a host
+    collector (OmniClimb/host/collect_uploads.py), started by the
+    'upload_recording' command in main.py while no recording is active.
+
+    A file is sent as a BEGIN frame, CHUNK frames of up to chunk_bytes
+    read in order from the card, and an END frame. Each chunk carries its
+    offset and a CRC-32, so the collector can place it in a partial file
+    and reject a corrupted one. A later upload resumes from any offset:
+    over TCP the collector answers the BEGIN frame with the first byte it
+    is missing, over MQTT the command carries the offset. Chunks pass a
+    ByteBudget first, so an upload from 30 holds does not saturate the
+    access point.
+
+    A binary recording (version 3 and later) is preallocated to its full
+    size, so only the part in use is sent: the header and chunk sectors
+    up to the last valid chunk, then the footer sector. Stored back to
+    back they form a file decode_recording.py reads like the original.
+    Other files are sent whole.
+
+    Transports:
+        MQTT    every frame is a QoS 1 message on pico/<id>/upload, written
+                through the PublishQueue while its depth stays below
+                max_depth, so statuses are not pushed out
+        TCP     frames are prefixed with their length ("<H"); the
+                collector replies "<I" to BEGIN (resume offset) and to END
+                (bytes it holds)
+
+    Frames (little endian):
+        BEGIN   "OCUB", upload id I, pico id 16s, size I, offset I,
+                head crc I (CRC-32 of the first 512 bytes sent, identifies
+                the file on resume), session length B, filename length B,
+                then the session and filename
+        CHUNK   "OCUC", upload id I, offset I, length H, crc32 I (over the
+                14 bytes before it and the data), then the data
+        END     "OCUE", upload id I, size I, chunks sent I
+"""
+
+import struct
+import random
+import uos
+import uasyncio as asyncio
+from micropython import const
+import recformat
+from telemetry import ByteBudget
+
+BEGIN_MAGIC = b"OCUB"
+CHUNK_MAGIC = b"OCUC"
+END_MAGIC = b"OCUE"
+_BEGIN_FMT = "<4sI16sIIIBB"
+_CHUNK_FMT = "<4sIIH"
+CHUNK_HEADER_SIZE = const(18)  # including the CRC
+_END_FMT = "<4sIII"
+
+_SECTOR = const(512)
+_POLL_MS = const(20)
+
+
+class MqttSink:
+    """Upload frames as QoS 1 messages through the MQTT publish queue."""
+
+    def __init__(self, publisher, topic, max_depth):
+        self.publisher = publisher
+        self.topic = topic
+        self.max_depth = max_depth
+
+    async def open(self, begin, offset):
+        await self.send(begin)
+        return offset
+
+    async def send(self, frame):
+        publisher = self.publisher
+        while (publisher.depth() >= self.max_depth or
+               not publisher.publish(self.topic, frame, qos=1)):
+            await asyncio.sleep_ms(_POLL_MS)
+
+    async def close(self, end):
+        """Send END and wait until the broker acknowledged everything.
+           Returns None, the collector's count is not known here."""
+        await self.send(end)
+        publisher = self.publisher
+        while (publisher.depth() or publisher.inflight or
+               publisher.current is not None):
+            await asyncio.sleep_ms(_POLL_MS)
+        return None
+
+    def abort(self):
+        pass  # queued frames are still delivered
+
+
+class TcpSink:
+    """Upload frames over a TCP connection to the collector."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _reply(self):
+        return struct.unpack("<I", await self.reader.readexactly(4))[0]
+
+    async def open(self, begin, offset):
+        """Connect and send BEGIN; returns the collector's resume offset."""
+        self.reader, self.writer = await asyncio.open_connection(self.host,
+                                                                 self.port)
+        await self.send(begin)
+        return await self._reply()
+
+    async def send(self, frame):
+        self.writer.write(struct.pack("<H", len(frame)))
+        self.writer.write(frame)
+        await self.writer.drain()
+
+    async def close(self, end):
+        """Send END; returns the number of bytes the collector holds."""
+        try:
+            await self.send(end)
+            return await self._reply()
+        finally:
+            self.abort()
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class Uploader:
+    def __init__(self, pico_id, chunk_bytes):
+        self.pico_id = pico_id.encode()[:16]
+        self.chunk_bytes = chunk_bytes
+        self.frame = bytearray(CHUNK_HEADER_SIZE + chunk_bytes)
+        self.name = None
+        self.sent = 0
+        self.size = 0
+
+    def _extent(self, f, file_size):
+        # (bytes of chunk data from the file start, footer offset). A
+        # version 3+ recording ends at the last chunk that follows its
+        # predecessor; a checkpoint may lag behind by a few chunks
+        head = f.read(5)
+        if (len(head) < 5 or head[:4] != recformat.MAGIC or head[4] < 3 or
+                file_size < 2 * _SECTOR):
+            return file_size, file_size
+        footer_offset = file_size - _SECTOR
+        f.seek(footer_offset)
+        footer = recformat.unpack_footer(f.read(_SECTOR))
+        if footer is None:
+            return file_size, file_size
+        version = head[4]
+        rec_id, seq, _, sector, _ = footer
+        buf = bytearray(16)
+        while (sector + 1) * _SECTOR <= footer_offset:
+            f.seek(sector * _SECTOR)
+            f.readinto(buf)
+            chunk = recformat.unpack_chunk_header(buf)
+            if chunk is None or chunk[0] != rec_id or chunk[1] != seq:
+                break
+            sector += recformat.chunk_size(chunk[2], version) // _SECTOR
+            seq += 1
+        return min(sector * _SECTOR, footer_offset), footer_offset
+
+    async def run(self, path, session, sink, offset=0, rate=16384):
+        """Send the file at path through sink, starting at offset. Returns
+           the size sent and what the collector confirmed (None when the
+           transport cannot tell)."""
+        self.name = path
+        self.sent = 0
+        self.size = 0
+        budget = ByteBudget(rate, 2 * len(self.frame))
+        upload_id = random.getrandbits(32)
+        frame = self.frame
+        mv = memoryview(frame)
+        chunks = 0
+        file_size = uos.stat(path)[6]
+        with open(path, "rb") as f:
+            data_end, footer_offset = self._extent(f, file_size)
+            size = data_end + file_size - footer_offset
+            self.size = size
+
+            # Stored offset -> file offset, skipping the unused sectors
+            def seek(pos):
+                f.seek(pos if pos < data_end else
+                       footer_offset + pos - data_end)
+
+            seek(0)
+            head_crc = recformat.crc32(f.read(min(_SECTOR, data_end)))
+            name = path.rsplit("/", 1)[-1].encode()
+            session = session.encode()
+            begin = struct.pack(_BEGIN_FMT, BEGIN_MAGIC, upload_id,
+                                self.pico_id, size, offset, head_crc,
+                                len(session), len(name)) + session + name
+            pos = await sink.open(begin, offset)
+            pos = min(pos, size)
+            self.sent = pos
+
+            while pos < size:
+                # A chunk never spans the skipped sectors
+                limit = data_end if pos < data_end else size
+                n = min(self.chunk_bytes, limit - pos)
+                seek(pos)
+                n = f.readinto(mv[CHUNK_HEADER_SIZE:CHUNK_HEADER_SIZE + n])
+                if not n:
+                    raise OSError(5)  # EIO, the file shrank
+                struct.pack_into(_CHUNK_FMT, frame, 0, CHUNK_MAGIC,
+                                 upload_id, pos, n)
+                crc = recformat.crc32(mv[:14])
+                crc = recformat.crc32(
+                    mv[CHUNK_HEADER_SIZE:CHUNK_HEADER_SIZE + n], crc)
+                struct.pack_into("<I", frame, 14, crc)
+
+                total = CHUNK_HEADER_SIZE + n
+                while not budget.allow(total):
+                    await asyncio.sleep_ms(_POLL_MS)
+                await sink.send(frame[:total])
+                pos += n
+                chunks += 1
+                self.sent = pos
+
+        end = struct.pack(_END_FMT, END_MAGIC, upload_id, size, chunks)
+        return size, await sink.close(end)